@@ -4,7 +4,14 @@
 
 import typing as _t
 
-from .node_crop_pad import BestResolutionUpscaledCropPad
+from .node_crop_pad import (
+	BestResolutionUpscaledCropPad,
+	BestResolutionApplyCropPad,
+	BestResolutionApplyCropPadLatent,
+	BestResolutionOutpaintMask,
+)
+from .node_budget import BestResolutionBudget
+from .node_chain import BestResolutionUpscaleChain
 from .node_scale import BestResolutionScale
 from .node_upscale_by import ImageUpscaleByWithModel
 from .nodes_prims import *
@@ -13,33 +20,48 @@
 
 NODE_CLASS_MAPPINGS: _t.Dict[str, type] = {
 	"BestResolutionFromArea": BestResolutionFromArea,
+	"BestResolutionAlternatives": BestResolutionAlternatives,
 	"BestResolutionFromAreaUpscale": BestResolutionFromAreaUpscale,
 	"BestResolutionFromAspectRatio": BestResolutionFromAspectRatio,
 	"BestResolutionSimple": BestResolutionSimple,
+	"BestResolutionBudget": BestResolutionBudget,
 
 	"BestResolutionScale": BestResolutionScale,
+	"BestResolutionUpscaleChain": BestResolutionUpscaleChain,
 
 	"BestResolutionPrimCropPadStrategy": BestResolutionPrimCropPadStrategy,
 	"BestResolutionPrimResPriority": BestResolutionPrimResPriority,
 
 	"BestResolutionUpscaledCropPad": BestResolutionUpscaledCropPad,
+	"BestResolutionApplyCropPad": BestResolutionApplyCropPad,
+	"BestResolutionApplyCropPadLatent": BestResolutionApplyCropPadLatent,
+	"BestResolutionOutpaintMask": BestResolutionOutpaintMask,
 
 	"ImageUpscaleByWithModel": ImageUpscaleByWithModel,
 }
 NODE_DISPLAY_NAME_MAPPINGS: _t.Dict[str, str] = {
 	"BestResolutionFromArea": "Best-Res (area)",
+	"BestResolutionAlternatives": "Best-Res (alternatives)",
 	"BestResolutionFromAreaUpscale": "Best-Res (area+scale)",
 	"BestResolutionFromAspectRatio": "Best-Res (ratio)",
 	"BestResolutionSimple": "Best-Res (simple)",
+	"BestResolutionBudget": "Best-Res (budget)",
 
 	"BestResolutionScale": "Scale (Best-Res)",
+	"BestResolutionUpscaleChain": "Upscale Chain (Best-Res)",
 
 	"BestResolutionPrimCropPadStrategy": "Crop-Pad Strategy (Best-Res)",
 	"BestResolutionPrimResPriority": "Priority (Best-Res)",
 
 	"BestResolutionUpscaledCropPad": "Upscaled Crop/Pad (Best-Res)",
+	"BestResolutionApplyCropPad": "Apply Crop/Pad (Best-Res)",
+	"BestResolutionApplyCropPadLatent": "Apply Crop/Pad to Latent (Best-Res)",
+	"BestResolutionOutpaintMask": "Outpaint Mask (Best-Res)",
 
 	"ImageUpscaleByWithModel": "Upscale Image By (with Model)"
 }
 
-__all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS"]
+# Frontend: displays status reports in UI-report mode (see ``_meta.ui_report``)
+WEB_DIRECTORY = "./web"
+
+__all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
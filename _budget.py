@@ -0,0 +1,68 @@
+# encoding: utf-8
+"""
+The calibrated cost model (see ``best_res_core.budget``) for "Best-Res (budget)" node: stored as JSON
+in ComfyUI's user directory, written by ``benchmarks/budget_calibration.py``.
+
+A custom file can be provided with ``BEST_RESOLUTION_COST_MODEL`` environment variable.
+"""
+
+import typing as _t
+
+from pathlib import Path as _Path
+import json as _json
+import os as _os
+
+from .best_res_core.budget import CostModel as _CostModel
+
+# The part of the device memory the budget may take by default (allocator fragmentation, other processes, etc.):
+safety_ratio: float = 0.9
+
+_file_version = 1
+
+
+def default_path() -> _Path:
+	env_path = _os.environ.get('BEST_RESOLUTION_COST_MODEL', '').strip()
+	if env_path:
+		return _Path(env_path)
+	try:
+		import folder_paths
+		user_dir = _Path(folder_paths.get_user_directory())
+	except (ImportError, AttributeError):
+		user_dir = _Path.home() / '.cache'
+	return user_dir / 'best_resolution' / 'cost_model.json'
+
+
+def save_cost_model(
+	cost_model: _CostModel, path: _t.Union[str, _os.PathLike] = None, info: _t.Dict[str, _t.Any] = None,
+) -> _Path:
+	"""Write the model (with any extra info about the calibration) - atomically, so a reader never sees a partial one."""
+	path = _Path(path) if path is not None else default_path()
+	data = {'version': _file_version, 'cost_model': cost_model._asdict(), 'info': dict(info or {})}
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp_path = path.with_name(path.name + '.tmp')
+	with open(tmp_path, 'w', encoding='utf-8') as f:
+		_json.dump(data, f, indent='\t')
+	_os.replace(tmp_path, path)
+	return path
+
+
+def load_cost_model(path: _t.Union[str, _os.PathLike] = None) -> _t.Optional[_CostModel]:
+	"""The stored model, or ``None`` if there's none (or it's of another version)."""
+	path = _Path(path) if path is not None else default_path()
+	try:
+		with open(path, 'r', encoding='utf-8') as f:
+			data = _json.load(f)
+	except (OSError, ValueError):
+		return None
+	if not isinstance(data, dict) or data.get('version') != _file_version:
+		return None
+	try:
+		return _CostModel(**{k: float(v) for k, v in data['cost_model'].items()})
+	except (KeyError, TypeError, ValueError):
+		return None
+
+
+def default_memory_budget() -> float:
+	"""The budget (bytes) when none is given: most of the total memory of ComfyUI's main device."""
+	from comfy import model_management
+	return model_management.get_total_memory(model_management.get_torch_device()) * safety_ratio
@@ -0,0 +1,108 @@
+# encoding: utf-8
+"""
+Memoization for the resolution nodes.
+
+The same inputs recur constantly across prompts, so both the rounding results and the rendered status reports
+are cached - each in its own bounded LRU cache, since a report isn't always needed (and depends on extra arguments).
+
+The caches are meant to be used from ComfyUI's single worker thread, so there's no locking.
+"""
+
+import typing as _t
+
+from collections import OrderedDict as _OrderedDict
+
+default_max_size: int = 1024
+
+_t_key = _t.Hashable
+_missing = object()
+
+
+class CacheStats(_t.NamedTuple):
+	hits: int
+	misses: int
+	evictions: int
+	size: int
+	max_size: int
+
+
+class LRUCache:
+	"""
+	A bounded dict-like cache, evicting the least recently used item when full. Counts hits, misses and evictions.
+
+	``max_size`` of 0 disables caching entirely (but still counts misses).
+	"""
+	__slots__ = ('_data', '_max_size', 'hits', 'misses', 'evictions')
+
+	def __init__(self, max_size: int = default_max_size):
+		self._data: _t.OrderedDict[_t_key, _t.Any] = _OrderedDict()
+		self._max_size = max(int(max_size), 0)
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __len__(self):
+		return len(self._data)
+
+	@property
+	def max_size(self) -> int:
+		return self._max_size
+
+	@max_size.setter
+	def max_size(self, value: int):
+		self._max_size = max(int(value), 0)
+		self._trim()
+
+	def _trim(self):
+		data = self._data
+		while len(data) > self._max_size:
+			data.popitem(last=False)
+			self.evictions += 1
+
+	def get(self, key: _t_key, default=None):
+		value = self._data.get(key, _missing)
+		if value is _missing:
+			self.misses += 1
+			return default
+		self._data.move_to_end(key)
+		self.hits += 1
+		return value
+
+	def put(self, key: _t_key, value):
+		if self._max_size < 1:
+			return
+		self._data[key] = value
+		self._data.move_to_end(key)
+		self._trim()
+
+	def clear(self, reset_stats: bool = False):
+		self._data.clear()
+		if reset_stats:
+			self.hits = self.misses = self.evictions = 0
+
+	def stats(self) -> CacheStats:
+		return CacheStats(self.hits, self.misses, self.evictions, len(self._data), self._max_size)
+
+
+# The actual rounding results, keyed on normalized math inputs:
+results = LRUCache()
+# Rendered status reports, keyed on the same inputs + the report-only arguments:
+reports = LRUCache()
+
+
+def set_max_size(max_size: int):
+	"""Change the size of both caches (excess items are evicted right away). 0 disables caching."""
+	results.max_size = max_size
+	reports.max_size = max_size
+
+
+def clear(reset_stats: bool = False):
+	results.clear(reset_stats)
+	reports.clear(reset_stats)
+
+
+def stats() -> _t.Dict[str, CacheStats]:
+	return {
+		'results': results.stats(),
+		'reports': reports.stats(),
+	}
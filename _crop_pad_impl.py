@@ -0,0 +1,152 @@
+# encoding: utf-8
+"""
+The heavy (torch-dependent) part of "Apply Crop/Pad" node.
+
+Imported only when the node is actually executed for the first time - so just registering the pack doesn't pull
+the whole torch stack in.
+"""
+
+import typing as _t
+
+import torch
+
+import comfy.utils
+
+from .best_res_core.crop_pad import CropPadLayout
+
+
+def apply_crop_pad(
+	image: torch.Tensor, layout: CropPadLayout, upscale_method: str, pad_value: float = 0.5,
+) -> torch.Tensor:
+	"""
+	Upscale → crop → pad in a single pass. The output is allocated once, and only its padded borders are filled.
+	Each image of the batch is scaled on its own, and its crop (a view, not a copy) is written straight into
+	the output - so the only batch-sized tensor is the output itself.
+	"""
+	n_frames, height, width, n_channels = image.shape
+	out = torch.empty(
+		(n_frames, layout.out_height, layout.out_width, n_channels), dtype=image.dtype, device=image.device
+	)
+
+	x0, y0 = layout.paste_x, layout.paste_y
+	x1, y1 = x0 + layout.crop_width, y0 + layout.crop_height
+	for region in (out[:, :y0], out[:, y1:], out[:, y0:y1, :x0], out[:, y0:y1, x1:]):
+		if region.numel():
+			region.fill_(pad_value)
+
+	do_scale = (layout.scaled_width, layout.scaled_height) != (width, height)
+	crop_y = slice(layout.crop_y, layout.crop_y + layout.crop_height)
+	crop_x = slice(layout.crop_x, layout.crop_x + layout.crop_width)
+	for b in range(n_frames):
+		frame = image[b:b + 1]
+		if do_scale:
+			frame = comfy.utils.common_upscale(
+				frame.movedim(-1, 1), layout.scaled_width, layout.scaled_height, upscale_method, "disabled"
+			).movedim(1, -1)
+		out[b:b + 1, y0:y1, x0:x1] = frame[:, crop_y, crop_x]
+		del frame
+	return out
+
+
+def _paste_region(layout: CropPadLayout) -> _t.Tuple[slice, slice]:
+	return (
+		slice(layout.paste_y, layout.paste_y + layout.crop_height),
+		slice(layout.paste_x, layout.paste_x + layout.crop_width),
+	)
+
+
+def apply_crop_pad_latent(
+	samples: torch.Tensor, layout: CropPadLayout, upscale_method: str, noise_mask: torch.Tensor = None,
+) -> _t.Tuple[torch.Tensor, torch.Tensor]:
+	"""
+	The same single-pass upscale → crop → pad, for latent samples (``[B, C, H, W]``, or ``[B, C, T, H, W]``
+	for video models), with the layout in latent units. Padding is zero latent.
+
+	Also returns the matching noise mask (``[B, 1, H, W]``): 1 in the padded area (to be out-painted),
+	and the input noise mask (if any) - upscaled and cropped the same way - in the rest.
+	"""
+	shape = samples.shape
+	n_frames, height, width = shape[0], shape[-2], shape[-1]
+	# Scaling is done over the last two dims only, so all the others can be merged into channels:
+	flat = samples.reshape(n_frames, -1, height, width)
+	out = torch.zeros(
+		(n_frames, flat.shape[1], layout.out_height, layout.out_width), dtype=samples.dtype, device=samples.device
+	)
+	mask = torch.ones((n_frames, 1, layout.out_height, layout.out_width), dtype=torch.float32, device=samples.device)
+
+	if noise_mask is not None:
+		noise_mask = noise_mask.reshape(-1, 1, noise_mask.shape[-2], noise_mask.shape[-1]).to(samples.device)
+		if noise_mask.shape[0] < n_frames:
+			noise_mask = noise_mask.repeat(-(-n_frames // noise_mask.shape[0]), 1, 1, 1)
+
+	do_scale = (layout.scaled_width, layout.scaled_height) != (width, height)
+	crop_y = slice(layout.crop_y, layout.crop_y + layout.crop_height)
+	crop_x = slice(layout.crop_x, layout.crop_x + layout.crop_width)
+	paste_y, paste_x = _paste_region(layout)
+	for b in range(n_frames):
+		frame = flat[b:b + 1]
+		if do_scale:
+			frame = comfy.utils.common_upscale(frame, layout.scaled_width, layout.scaled_height, upscale_method, "disabled")
+		out[b:b + 1, :, paste_y, paste_x] = frame[:, :, crop_y, crop_x]
+		del frame
+
+		if noise_mask is None:
+			mask[b:b + 1, :, paste_y, paste_x] = 0.0
+			continue
+		# The input mask may be of any resolution (e.g., the pixel one): it's scaled to the scaled latent.
+		frame_mask = torch.nn.functional.interpolate(
+			noise_mask[b:b + 1].float(), size=(layout.scaled_height, layout.scaled_width), mode="bilinear"
+		)
+		mask[b:b + 1, :, paste_y, paste_x] = frame_mask[:, :, crop_y, crop_x]
+		del frame_mask
+
+	return out.reshape((n_frames, ) + tuple(shape[1:-2]) + (layout.out_height, layout.out_width)), mask
+
+
+def _outpaint_axis(size: int, pad_before: int, pad_after: int, feathering: int) -> torch.Tensor:
+	"""
+	Mask values along one axis: 1 in the padding, and the feathering ramp inside - exactly as
+	"Pad Image for Outpainting" computes it for the distance to the padded edges of this axis.
+	"""
+	inner = size - pad_before - pad_after
+	values = torch.zeros(size, dtype=torch.float32)
+	values[:pad_before] = 1.0
+	values[pad_before + inner:] = 1.0
+	if feathering > 0:
+		pos = torch.arange(inner, dtype=torch.float32)
+		# The same distances as the built-in node uses (an edge without padding is never "close"):
+		dist_before = pos if pad_before != 0 else torch.full_like(pos, inner)
+		dist_after = inner - pos if pad_after != 0 else torch.full_like(pos, inner)
+		dist = torch.minimum(dist_before, dist_after)
+		ramp = ((feathering - dist) / feathering).clamp(min=0.0) ** 2
+		values[pad_before:pad_before + inner] = ramp
+	return values
+
+
+def outpaint_mask(layout: CropPadLayout, batch_size: int = 1, feathering: int = 0) -> torch.Tensor:
+	"""
+	Out-paint mask (``[B, H, W]``) for the padding in the layout, with the same values as
+	"Pad Image for Outpainting" gives.
+
+	The feathered mask is the max of a row and a column profile, so it's built from two vectors by broadcasting.
+	A 2D mask is allocated only if there's padding along both axes. If it's along just one of them,
+	the mask is a zero-copy expanded view of a single vector - and so is the batch dimension, always.
+	Thus, treat it as read-only: a consumer modifying it in-place must ``clone()`` it first (as usual for inputs).
+	"""
+	pad_left, pad_top = layout.paste_x, layout.paste_y
+	pad_right = layout.out_width - pad_left - layout.crop_width
+	pad_bottom = layout.out_height - pad_top - layout.crop_height
+	if not (feathering * 2 < layout.crop_width and feathering * 2 < layout.crop_height):
+		# Like the built-in node: no feathering if it doesn't fit.
+		feathering = 0
+	rows = _outpaint_axis(layout.out_height, pad_top, pad_bottom, feathering)
+	columns = _outpaint_axis(layout.out_width, pad_left, pad_right, feathering)
+
+	size = (layout.out_height, layout.out_width)
+	if not columns.any():
+		mask = rows.unsqueeze(1).expand(size)
+	elif not rows.any():
+		mask = columns.unsqueeze(0).expand(size)
+	else:
+		mask = torch.maximum(rows.unsqueeze(1), columns.unsqueeze(0))
+	return mask.unsqueeze(0).expand((max(int(batch_size), 1), ) + size)
@@ -3,4 +3,21 @@
 Metadata-related module.
 """
 
+import os as _os
+
 category: str = "Best Resolution"
+
+# "UI-report" execution mode, enabled with ``BEST_RESOLUTION_UI_REPORT=1`` environment variable.
+# In this mode, nodes aren't output-nodes, and their status report is returned the standard way - in the "ui" part
+# of the node's output. So ComfyUI caches the report together with the result, and doesn't need to re-execute
+# the node (or anything downstream) just to show it again.
+
+
+def _env_flag(name: str) -> bool:
+	return _os.environ.get(name, '').strip().lower() in {'1', 'true', 'yes', 'on'}
+
+
+ui_report: bool = _env_flag('BEST_RESOLUTION_UI_REPORT')
+
+# No status reports at all (``BEST_RESOLUTION_NO_REPORT=1``) - for batch/API servers, where nobody watches the nodes.
+no_report: bool = _env_flag('BEST_RESOLUTION_NO_REPORT')
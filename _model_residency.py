@@ -0,0 +1,217 @@
+# encoding: utf-8
+"""
+Keeping upscale models on the compute device between node runs.
+
+Normally, an upscale model is moved to the device before each upscale, and back to RAM right after it. Under a steady
+queue, that's the same model shuttled back and forth on every prompt. Instead, recently used models stay
+on the device, within a memory budget - evicted in least-recently-used order when it's exceeded.
+
+ComfyUI doesn't know about these models, so its ``model_management.free_memory()`` is wrapped to evict them first:
+whenever anything (ComfyUI itself or another node) needs room on a device, resident upscale models give it up
+before ComfyUI starts unloading its own models.
+"""
+
+import typing as _t
+
+from collections import OrderedDict as _OrderedDict
+from contextlib import contextmanager as _contextmanager
+from threading import RLock as _RLock
+import weakref as _weakref
+
+# The part of the device's total memory, which resident upscale models may take together:
+default_budget_ratio: float = 0.25
+
+_t_device = _t.Any
+
+
+class _Resident:
+	__slots__ = ('ref', 'device', 'size', 'pinned')
+
+	def __init__(self, ref: _t.Callable[[], _t.Any], device: _t_device, size: int):
+		self.ref = ref
+		self.device = device
+		self.size = size
+		self.pinned = 0
+
+
+class ResidencyManager:
+	"""
+	LRU set of models kept on their compute devices. All the environment-specific parts are injectable
+	(so it can be tested without any GPU, with a mock budget):
+
+	* ``size_of(model)`` - the memory the model's weights take on the device;
+	* ``budget_of(device)`` - how much memory all the resident models may take on the device;
+	* ``move(model, device)`` - move the model (``None`` device means "offload", i.e. move to RAM);
+	* ``free_memory_of(device)`` - currently free memory on the device.
+	"""
+
+	def __init__(
+		self,
+		size_of: _t.Callable[[_t.Any], int],
+		budget_of: _t.Callable[[_t_device], float],
+		move: _t.Callable[[_t.Any, _t.Optional[_t_device]], _t.Any],
+		free_memory_of: _t.Callable[[_t_device], float],
+	):
+		self._size_of = size_of
+		self._budget_of = budget_of
+		self._move = move
+		self._free_memory_of = free_memory_of
+		self._residents: _t.OrderedDict[int, _Resident] = _OrderedDict()
+		self._lock = _RLock()
+
+	def _ref(self, model) -> _t.Callable[[], _t.Any]:
+		key = id(model)
+
+		def forget(_):
+			with self._lock:
+				resident = self._residents.get(key)
+				if resident is not None and resident.ref() is None:
+					del self._residents[key]
+
+		try:
+			return _weakref.ref(model, forget)
+		except TypeError:
+			return lambda: model
+
+	def is_resident(self, model, device: _t_device = None) -> bool:
+		with self._lock:
+			resident = self._residents.get(id(model))
+			return (
+				resident is not None and resident.ref() is model
+				and (device is None or str(resident.device) == str(device))
+			)
+
+	def resident_size(self, device: _t_device = None) -> int:
+		with self._lock:
+			return sum(
+				x.size for x in self._residents.values()
+				if device is None or str(x.device) == str(device)
+			)
+
+	def _evict(self, key: int) -> int:
+		resident = self._residents.pop(key)
+		model = resident.ref()
+		if model is not None:
+			self._move(model, None)
+		return resident.size
+
+	def _evictable(self, device: _t_device) -> _t.List[int]:
+		"""Keys of the models which can be evicted from the device, least recently used first."""
+		return [
+			key for key, x in self._residents.items()
+			if not x.pinned and (device is None or str(x.device) == str(device))
+		]
+
+	def make_room(self, memory_required: float, device: _t_device) -> int:
+		"""Evict resident models (LRU first) until the device has at least this much free memory. Returns freed bytes."""
+		freed = 0
+		with self._lock:
+			for key in self._evictable(device):
+				if self._free_memory_of(device) >= memory_required:
+					break
+				freed += self._evict(key)
+		return freed
+
+	def evict_all(self, device: _t_device = None) -> int:
+		with self._lock:
+			return sum(self._evict(key) for key in self._evictable(device))
+
+	def _fit_budget(self, device: _t_device):
+		budget = self._budget_of(device)
+		for key in self._evictable(device):
+			if self.resident_size(device) <= budget:
+				break
+			self._evict(key)
+
+	@_contextmanager
+	def use(self, model, device: _t_device, free_memory: _t.Callable[[float, _t_device], _t.Any], extra_memory: float = 0):
+		"""
+		Have the model on the device for the duration of the block. If it's not there yet, memory is freed
+		with the given ``free_memory(required, device)`` (ComfyUI's function), and the model is moved.
+
+		While in use, the model can't be evicted. After that, it stays resident - unless it doesn't fit
+		into the budget (then, the least recently used models are evicted, up to this one itself).
+		"""
+		key = id(model)
+		with self._lock:
+			resident = self._residents.get(key)
+			if resident is not None and (resident.ref() is not model or str(resident.device) != str(device)):
+				# Either a stale entry for a dead object with a reused id, or the model moved to another device:
+				self._evict(key)
+				resident = None
+			if resident is not None:
+				self._residents.move_to_end(key)
+			else:
+				resident = _Resident(self._ref(model), device, int(self._size_of(model)))
+			resident.pinned += 1
+
+		try:
+			if key in self._residents:
+				free_memory(extra_memory, device)
+				# A no-op if it's still there - but something else (e.g., the built-in upscale node) might've offloaded it:
+				self._move(model, device)
+			else:
+				free_memory(resident.size + extra_memory, device)
+				self._move(model, device)
+				with self._lock:
+					self._residents[key] = resident
+			yield model
+		finally:
+			with self._lock:
+				resident.pinned -= 1
+				if key in self._residents:
+					self._fit_budget(device)
+				elif not resident.pinned:
+					# Failed before registering: don't leave the model on the device.
+					self._move(model, None)
+
+
+def _comfy_manager() -> ResidencyManager:
+	"""The manager for ComfyUI's upscale models (spandrel model descriptors, with the module in ``.model``)."""
+	from comfy import model_management
+
+	def size_of(upscale_model) -> int:
+		return model_management.module_size(upscale_model.model)
+
+	def budget_of(device) -> float:
+		return model_management.get_total_memory(device) * default_budget_ratio
+
+	def move(upscale_model, device):
+		upscale_model.to(device if device is not None else "cpu")
+
+	def free_memory_of(device) -> float:
+		return model_management.get_free_memory(device)
+
+	return ResidencyManager(size_of, budget_of, move, free_memory_of)
+
+
+def _install_free_memory_hook(residency: ResidencyManager):
+	"""Wrap ``model_management.free_memory()``, so resident upscale models are evicted before ComfyUI's own ones."""
+	from comfy import model_management
+
+	original = model_management.free_memory
+	if getattr(original, '_best_resolution_residency', None) is not None:
+		return
+
+	def free_memory(memory_required, device, *args, **kwargs):
+		residency.make_room(memory_required, device)
+		return original(memory_required, device, *args, **kwargs)
+
+	free_memory._best_resolution_residency = residency
+	free_memory.__wrapped__ = original
+	free_memory.__doc__ = original.__doc__
+	model_management.free_memory = free_memory
+
+
+_manager_lock = _RLock()
+_manager: _t.Optional[ResidencyManager] = None
+
+
+def manager() -> ResidencyManager:
+	"""The global manager - created (and hooked into ComfyUI's memory management) on first use."""
+	global _manager
+	with _manager_lock:
+		if _manager is None:
+			_manager = _comfy_manager()
+			_install_free_memory_hook(_manager)
+		return _manager
@@ -0,0 +1,148 @@
+# encoding: utf-8
+"""
+Where the status reports of the nodes go.
+
+A sink is selected once, globally (see ``get_sink()`` / ``set_sink()``). Before formatting a report, nodes check
+whether the sink is listening at all - so a headless server doesn't waste time on text nobody would see.
+"""
+
+import typing as _t
+
+from threading import Lock as _Lock
+
+from . import _meta
+
+if _t.TYPE_CHECKING:
+	from server import PromptServer as _PromptServer
+
+
+class ReportSink:
+	"""The base class for all sinks. As is, it does nothing - but claims it's listening."""
+
+	def is_listening(self, unique_id: str = None) -> bool:
+		"""Whether a report for this node would be seen by anyone (i.e., is it worth formatting it)."""
+		return bool(unique_id)
+
+	def send(self, text: _t.Optional[str], unique_id: str):
+		"""Send the report text for the node. ``None`` or an empty string mean "no report" (clear the text)."""
+		pass
+
+	def node_output(self, result: tuple, unique_id: str = None) -> _t.Union[tuple, _t.Dict[str, _t.Any]]:
+		"""The actual value to return from the node's main function."""
+		return result
+
+
+class NullSink(ReportSink):
+	"""Discards everything. Intended for batch/API servers, where nobody watches the nodes."""
+
+	def is_listening(self, unique_id: str = None) -> bool:
+		return False
+
+
+class UIReportSink(ReportSink):
+	"""
+	"UI-report" mode: the text is kept until the node returns, and then put into the "ui" part of its output.
+	So ComfyUI caches the report together with the result.
+	"""
+
+	def __init__(self):
+		self._pending: _t.Dict[str, str] = dict()
+
+	def send(self, text: _t.Optional[str], unique_id: str):
+		if unique_id:
+			self._pending[unique_id] = text or ''
+
+	def node_output(self, result: tuple, unique_id: str = None) -> _t.Dict[str, _t.Any]:
+		text = self._pending.pop(unique_id, '') if unique_id else ''
+		return {'ui': {'text': [text] if text else []}, 'result': tuple(result)}
+
+
+class PromptServerSink(ReportSink):
+	"""
+	Sends reports as node-progress text through ComfyUI's ``PromptServer``.
+
+	Messages aren't sent from the worker thread right away. Instead, they're coalesced per prompt (and client),
+	so only the latest text for each node is sent, in a single batch, asynchronously - on the server's event loop.
+	When no client is connected, nothing is even formatted.
+	"""
+
+	def __init__(self, server: '_PromptServer' = None):
+		self._server = server
+		self._lock = _Lock()
+		# (prompt_id, client_id) -> {node_id: text}
+		self._pending: _t.Dict[_t.Tuple[_t.Optional[str], _t.Optional[str]], _t.Dict[str, str]] = dict()
+		self._flush_scheduled = False
+
+	@property
+	def server(self) -> _t.Optional['_PromptServer']:
+		if self._server is not None:
+			return self._server
+		# Not imported with the pack: in ComfyUI, ``server`` imports ``nodes`` - and, with them, the whole torch stack.
+		from server import PromptServer
+		return PromptServer.instance
+
+	def is_listening(self, unique_id: str = None) -> bool:
+		if not unique_id:
+			return False
+		server = self.server
+		return server is not None and bool(getattr(server, 'sockets', None))
+
+	@staticmethod
+	def _text_to_send(text: _t.Optional[str]) -> str:
+		if not text:
+			# TODO: Planned for the future - currently, there's no point removing the text since it's box is shown anyway
+			# An odd workaround since `send_progress_text()` doesn't want to update text when '' passed
+			return '<span></span>'
+		return text
+
+	def send(self, text: _t.Optional[str], unique_id: str):
+		server = self.server
+		if server is None or not unique_id:
+			return
+		text = self._text_to_send(text)
+
+		loop = getattr(server, 'loop', None)
+		if loop is None or loop.is_closed():
+			# Snatched from: https://github.com/comfyanonymous/ComfyUI/blob/27870ec3c30e56be9707d89a120eb7f0e2836be1/comfy_extras/nodes_images.py#L581-L582
+			server.send_progress_text(text, unique_id)
+			return
+
+		batch_key = (getattr(server, 'last_prompt_id', None), getattr(server, 'client_id', None))
+		with self._lock:
+			self._pending.setdefault(batch_key, dict())[unique_id] = text
+			if self._flush_scheduled:
+				return
+			self._flush_scheduled = True
+		loop.call_soon_threadsafe(self.flush)
+
+	def flush(self):
+		"""Send all the pending messages. Normally, called on the server's event loop."""
+		with self._lock:
+			pending, self._pending = self._pending, dict()
+			self._flush_scheduled = False
+
+		server = self.server
+		if server is None:
+			return
+		for (_, client_id), texts in pending.items():
+			for unique_id, text in texts.items():
+				server.send_progress_text(text, unique_id, client_id)
+
+
+_sink: ReportSink = (
+	NullSink() if _meta.no_report
+	else UIReportSink() if _meta.ui_report
+	else PromptServerSink()
+)
+
+
+def get_sink() -> ReportSink:
+	return _sink
+
+
+def set_sink(sink: ReportSink):
+	"""Replace the global sink - e.g., with ``NullSink()`` for batch servers, or with a custom one."""
+	global _sink
+	if not isinstance(sink, ReportSink):
+		raise TypeError(f"Report sink must be an instance of {ReportSink.__name__}. Got: {sink!r}")
+	_sink = sink
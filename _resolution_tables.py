@@ -0,0 +1,72 @@
+# encoding: utf-8
+"""
+The precomputed resolution table (see ``best_res_core.tables``), used by "Best-Res (area)" node.
+
+The table for the default presets is generated on first use, into ComfyUI's user directory. A custom one
+(made with ``python -m best_res_core.tables``) can be provided with ``BEST_RESOLUTION_TABLE`` environment variable.
+If there's no table (or it can't be created), the node just computes everything, as usual.
+"""
+
+import typing as _t
+
+from pathlib import Path as _Path
+from threading import Lock as _Lock
+import os as _os
+
+from .best_res_core import tables as _tables
+
+
+def default_path() -> _t.Tuple[_Path, bool]:
+	"""The table file, and whether it's the custom one (i.e., it's not ours to (re)generate)."""
+	env_path = _os.environ.get('BEST_RESOLUTION_TABLE', '').strip()
+	if env_path:
+		return _Path(env_path), True
+	try:
+		import folder_paths
+		user_dir = _Path(folder_paths.get_user_directory())
+	except (ImportError, AttributeError):
+		user_dir = _Path.home() / '.cache'
+	return user_dir / 'best_resolution' / f"area_table.v{_tables.version}.brtb", False
+
+
+_lock = _Lock()
+_table: _t.Optional[_tables.ResolutionTable] = None
+_tried = False
+
+
+def _open() -> _t.Optional[_tables.ResolutionTable]:
+	path, custom = default_path()
+	try:
+		return _tables.ResolutionTable(path)
+	except (OSError, _tables.TableFormatError) as e:
+		if custom:
+			print(f"[Best Resolution] Can't use the resolution table {path}: {e}")
+			return None
+	try:
+		_tables.build_table(path)
+		return _tables.ResolutionTable(path)
+	except (OSError, _tables.TableFormatError) as e:
+		print(f"[Best Resolution] Can't create the resolution table {path}: {e}")
+		return None
+
+
+def table() -> _t.Optional[_tables.ResolutionTable]:
+	"""The table, opened (or generated) on first call. ``None`` if there's none."""
+	global _table, _tried
+	if _tried:
+		return _table
+	with _lock:
+		if not _tried:
+			_table = _open()
+			_tried = True
+	return _table
+
+
+def lookup(
+	square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float,
+) -> _t.Optional[_t.Tuple[int, int, int, int]]:
+	"""The rounded resolution from the table, or ``None`` if these inputs aren't there."""
+	resolution_table = table()
+	if resolution_table is None:
+		return None
+	return resolution_table.lookup(square_size, step, landscape, aspect_a, aspect_b)
@@ -0,0 +1,190 @@
+# encoding: utf-8
+"""
+Learned memory use of upscale models, per tile size.
+
+Each time a model upscales an image, the peak memory actually used by tiled processing (on top of the model weights
+and the input image, which are there anyway) is recorded - per model, device, dtype and tile size. Records are kept
+on disk, in ComfyUI's user directory. So next time, the largest tile which is known to fit into free memory
+is picked up front, instead of starting from the default one and halving it after each out-of-memory error.
+
+No torch here: the caller measures memory and passes plain numbers.
+"""
+
+import typing as _t
+
+from pathlib import Path as _Path
+from threading import Lock as _Lock
+import json as _json
+import os as _os
+
+# Tile sizes to choose from, the largest first. Smaller tiles mean more overhead (overlaps and per-call costs),
+# and 128 is the smallest the built-in "Upscale Image (using Model)" node goes down to.
+tile_candidates: _t.Tuple[int, ...] = (1024, 768, 512, 384, 256, 192, 128)
+# The part of the free memory a tile is allowed to take (allocator fragmentation, other processes, etc.):
+safety_ratio: float = 0.85
+
+_file_version = 1
+_t_records = _t.Dict[str, _t.Dict[str, int]]
+
+
+def default_path() -> _Path:
+	"""
+	The file with records: ``BEST_RESOLUTION_TILE_MEMORY`` environment variable if set,
+	otherwise a file inside ComfyUI's user directory (or the user's home folder, outside of ComfyUI).
+	"""
+	env_path = _os.environ.get('BEST_RESOLUTION_TILE_MEMORY', '').strip()
+	if env_path:
+		return _Path(env_path)
+	try:
+		import folder_paths
+		user_dir = _Path(folder_paths.get_user_directory())
+	except (ImportError, AttributeError):
+		user_dir = _Path.home() / '.cache'
+	return user_dir / 'best_resolution' / 'tile_memory.json'
+
+
+def model_key(upscale_model, device, kind: str = '', dtype=None) -> str:
+	"""
+	A string identifying the model (its architecture, size and dtype - not the file, so renaming it doesn't matter),
+	together with all the other conditions affecting the memory use. ``dtype`` is the one the model will run with,
+	if it's different from the current one.
+	"""
+	module = getattr(upscale_model, 'model', upscale_model)
+	architecture = getattr(getattr(upscale_model, 'architecture', None), 'id', None) or type(module).__name__
+	n_params = 0
+	param_dtype = None
+	try:
+		for param in module.parameters():
+			n_params += param.numel()
+			param_dtype = param_dtype or param.dtype
+	except AttributeError:
+		pass
+	dtype = dtype or param_dtype
+	scale = getattr(upscale_model, 'scale', 1)
+	parts = [f"{architecture}:x{scale}:{n_params}", str(device), str(dtype).replace('torch.', '')]
+	if kind:
+		parts.append(kind)
+	return '|'.join(parts)
+
+
+def _tile_key(tile_w: int, tile_h: int) -> str:
+	return f"{tile_w}x{tile_h}"
+
+
+class TileMemoryStore:
+	"""Peak memory per tile size, for each model key. Loaded lazily, saved after each new record."""
+
+	def __init__(self, path: _t.Union[str, _os.PathLike] = None):
+		self._path: _t.Optional[_Path] = _Path(path) if path is not None else None
+		self._records: _t.Optional[_t_records] = None
+		self._lock = _Lock()
+
+	@property
+	def path(self) -> _Path:
+		if self._path is None:
+			self._path = default_path()
+		return self._path
+
+	def _load(self) -> _t_records:
+		if self._records is not None:
+			return self._records
+		records: _t_records = dict()
+		try:
+			with open(self.path, 'rt', encoding='utf-8') as f:
+				data = _json.load(f)
+			if data.get('version') == _file_version:
+				records = {
+					str(key): {str(tile): int(peak) for tile, peak in tiles.items()}
+					for key, tiles in data.get('records', dict()).items()
+				}
+		except (OSError, ValueError, TypeError, AttributeError):
+			# No file yet, or it's broken/outdated: start from scratch.
+			pass
+		self._records = records
+		return records
+
+	def _save(self):
+		path = self.path
+		tmp_path = path.with_name(path.name + '.tmp')
+		try:
+			path.parent.mkdir(parents=True, exist_ok=True)
+			with open(tmp_path, 'wt', encoding='utf-8') as f:
+				_json.dump({'version': _file_version, 'records': self._records}, f, indent='\t', sort_keys=True)
+			_os.replace(tmp_path, path)
+		except OSError as e:
+			print(f"[Best Resolution] Can't save tile memory records to {path}: {e}")
+
+	def record(self, key: str, tile_w: int, tile_h: int, peak_bytes: int):
+		"""Remember the observed peak. The highest one is kept (the worst case is what matters)."""
+		peak_bytes = int(peak_bytes)
+		if peak_bytes <= 0:
+			return
+		with self._lock:
+			tiles = self._load().setdefault(key, dict())
+			tile_key = _tile_key(tile_w, tile_h)
+			if tiles.get(tile_key, 0) >= peak_bytes:
+				return
+			tiles[tile_key] = peak_bytes
+			self._save()
+
+	def records(self, key: str) -> _t.List[_t.Tuple[int, int]]:
+		"""``(tile_area, peak_bytes)`` pairs, sorted by area."""
+		with self._lock:
+			tiles = self._load().get(key, dict())
+		pairs = list()
+		for tile_key, peak in tiles.items():
+			tile_w, _, tile_h = tile_key.partition('x')
+			pairs.append((int(tile_w) * int(tile_h), peak))
+		return sorted(pairs)
+
+	def estimate(self, key: str, tile_w: int, tile_h: int) -> _t.Optional[int]:
+		"""
+		Expected peak memory for the tile size, or ``None`` if it can't be safely estimated from the records.
+
+		Memory is modelled as ``fixed + per_pixel * tile_area``. With a single record, only tiles no bigger than it
+		are estimated (by the record itself - a smaller tile can't need more).
+		"""
+		pairs = self.records(key)
+		if not pairs:
+			return None
+		area = tile_w * tile_h
+		for rec_area, peak in pairs:
+			if rec_area == area:
+				return peak
+
+		if len(pairs) == 1:
+			rec_area, peak = pairs[0]
+			return peak if area < rec_area else None
+
+		# Least squares over all the records:
+		n = len(pairs)
+		mean_a = sum(a for a, _ in pairs) / n
+		mean_p = sum(p for _, p in pairs) / n
+		var_a = sum((a - mean_a) ** 2 for a, _ in pairs)
+		if var_a <= 0.0:
+			return None
+		per_pixel = max(sum((a - mean_a) * (p - mean_p) for a, p in pairs) / var_a, 0.0)
+		fixed = mean_p - per_pixel * mean_a
+		# A fit is never trusted to go below what was actually observed for any smaller tile:
+		observed_floor = max((p for a, p in pairs if a <= area), default=0)
+		return int(max(fixed + per_pixel * area, observed_floor))
+
+	def pick_tile(
+		self, key: str, free_bytes: float, candidates: _t.Iterable[int] = tile_candidates
+	) -> _t.Optional[int]:
+		"""The largest square tile expected to fit into free memory. ``None`` if there's no data to judge by."""
+		candidates = sorted(candidates, reverse=True)
+		budget = free_bytes * safety_ratio
+		known_any = False
+		for tile in candidates:
+			estimate = self.estimate(key, tile, tile)
+			if estimate is None:
+				continue
+			known_any = True
+			if estimate <= budget:
+				return tile
+		# Even the smallest known tile doesn't fit: let the caller start from the smallest one.
+		return candidates[-1] if known_any else None
+
+
+store = TileMemoryStore()
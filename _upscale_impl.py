@@ -0,0 +1,466 @@
+# encoding: utf-8
+"""
+The heavy (torch-dependent) part of "Upscale Image By (with Model)" node.
+
+Imported only when the node is actually executed for the first time - so just registering the pack doesn't pull
+the whole torch stack in.
+"""
+
+import typing as _t
+
+from contextlib import contextmanager as _contextmanager
+
+import torch
+
+from comfy import model_management
+import comfy.utils
+
+from . import _model_residency
+from . import _tile_memory
+from .best_res_core.tiling import TilePlan, plan_tiles as _plan_tiles, tile_spans as _tile_spans
+from .slot_types import upscale_methods as _upscale_methods
+
+
+# ==========================================================
+# Tile size: learned from previous runs
+
+_default_tile = 512
+_min_tile = 128
+_min_overlap = 32
+
+
+class _PeakMemoryMeter:
+	"""Peak memory allocated by torch on the device since ``start()``. Only CUDA devices report it."""
+
+	def __init__(self, device):
+		self.device = torch.device(device)
+		self.supported = self.device.type == 'cuda' and torch.cuda.is_available()
+		self._base = 0
+
+	def start(self):
+		if self.supported:
+			torch.cuda.synchronize(self.device)
+			torch.cuda.reset_peak_memory_stats(self.device)
+			self._base = torch.cuda.memory_allocated(self.device)
+
+	def peak(self) -> int:
+		if not self.supported:
+			return 0
+		torch.cuda.synchronize(self.device)
+		return torch.cuda.max_memory_allocated(self.device) - self._base
+
+
+def _memory_for_tiles(upscale_model, image, memory_key: str) -> float:
+	"""How much memory tiled processing needs: as learned for the default tile, or a rough guess with no data yet."""
+	learned = _tile_memory.store.estimate(memory_key, _default_tile, _default_tile)
+	if learned is not None:
+		return learned
+	# The 384.0 is an estimate of how much some of these models take (from the built-in node):
+	return (512 * 512 * 3) * image.element_size() * max(upscale_model.scale, 1.0) * 384.0
+
+
+def _max_tile(memory_key: str, free_memory: int) -> int:
+	"""The side of the largest square tile known to fit into free memory (the default one, with no data yet)."""
+	return _tile_memory.store.pick_tile(memory_key, free_memory) or _default_tile
+
+
+def _run_tiled(run: _t.Callable[[TilePlan], _t.Any], memory_key: str, device, width: int, height: int):
+	"""
+	Call ``run(tile_plan)`` with tiles fitting the image best, each no bigger than the largest square tile known
+	to fit into free memory. With no data yet, the limit starts from the default tile, and it's halved
+	after each out-of-memory error. Observed peak memory is recorded for the next time.
+
+	Returns both the result and the tile plan it was achieved with.
+	"""
+	free_memory = model_management.get_free_memory(device)
+	tile = _max_tile(memory_key, free_memory)
+	meter = _PeakMemoryMeter(device)
+	while True:
+		plan = _plan_tiles(width, height, tile * tile, _min_overlap)
+		meter.start()
+		try:
+			result = run(plan)
+		except model_management.OOM_EXCEPTION as e:
+			# Other upscale models kept on the device are the first to go (the one in use is pinned):
+			_model_residency.manager().evict_all(device)
+			if meter.supported:
+				# It needs more than there was - not the actual peak, but still a useful lower bound:
+				_tile_memory.store.record(memory_key, plan.tile_w, plan.tile_h, free_memory)
+			tile //= 2
+			if tile < _min_tile:
+				raise e
+			continue
+		if meter.supported:
+			_tile_memory.store.record(memory_key, plan.tile_w, plan.tile_h, meter.peak())
+		return result, plan
+
+
+# ==========================================================
+# Inference precision and memory layout
+
+_dtypes: _t.Dict[str, torch.dtype] = {'fp32': torch.float32, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+
+class InferenceFormat(_t.NamedTuple):
+	"""The dtype (``None`` - as the model is loaded) and memory layout an upscale model runs with."""
+	dtype: _t.Optional[torch.dtype] = None
+	channels_last: bool = False
+	# Set if the reduced precision overflowed (see ``_model_call()``), and it was re-done in fp32:
+	fallback: bool = False
+
+	@property
+	def reduced(self) -> bool:
+		return self.dtype is not None and self.dtype != torch.float32
+
+	def memory_kind(self, kind: str = '') -> str:
+		"""The ``kind`` part of the tile memory key: the layout affects the memory use, too."""
+		return '+'.join(x for x in (kind, 'channels_last' if self.channels_last else '') if x)
+
+	def __str__(self):
+		names = {dtype: name for name, dtype in _dtypes.items()}
+		parts = [names.get(self.dtype, 'as loaded') if self.dtype is not None else 'as loaded']
+		if self.fallback:
+			parts[0] = f"{parts[0]} (fallback: overflow in reduced precision)"
+		if self.channels_last:
+			parts.append('channels last')
+		return ', '.join(parts)
+
+
+def inference_format(
+	upscale_model, precision: str = 'as loaded', channels_last: bool = False, device=None,
+) -> InferenceFormat:
+	"""
+	Resolve the user's choice to the actual format. Reduced precisions are used only if the model architecture
+	(as reported by spandrel) supports them - otherwise, it's fp32. The ``auto`` one also checks the device.
+	"""
+	if device is None:
+		device = model_management.get_torch_device()
+	supports_half = bool(getattr(upscale_model, 'supports_half', True))
+	supports_bf16 = bool(getattr(upscale_model, 'supports_bfloat16', True))
+	if precision == 'auto':
+		if supports_half and model_management.should_use_fp16(device):
+			precision = 'fp16'
+		elif supports_bf16 and model_management.should_use_bf16(device):
+			precision = 'bf16'
+		else:
+			precision = 'fp32'
+	elif (precision == 'fp16' and not supports_half) or (precision == 'bf16' and not supports_bf16):
+		precision = 'fp32'
+	return InferenceFormat(_dtypes.get(precision), bool(channels_last))
+
+
+def max_tile_area(upscale_model, fmt: InferenceFormat, fused: bool = False) -> int:
+	"""The tile area limit the model would be run with now - for planning ahead (e.g., pre-downscale)."""
+	device = model_management.get_torch_device()
+	memory_key = _tile_memory.model_key(upscale_model, device, fmt.memory_kind('fused' if fused else ''), fmt.dtype)
+	tile = _max_tile(memory_key, model_management.get_free_memory(device))
+	return tile * tile
+
+
+# An upscale model's output is clamped to [0, 1] afterwards - and even before that, it barely overshoots it.
+# In reduced precision, anything outside of this range is considered an overflow (even if it's finite):
+reduced_precision_output_range: _t.Tuple[float, float] = (-1.0, 2.0)
+
+
+class _NonFiniteOutput(ArithmeticError):
+	"""The model's output in reduced precision is inf/NaN, or way out of range."""
+
+
+def _model_dtype(upscale_model) -> _t.Optional[torch.dtype]:
+	for param in upscale_model.model.parameters():
+		return param.dtype
+	return None
+
+
+@_contextmanager
+def _model_in_format(upscale_model, fmt: InferenceFormat):
+	"""
+	Temporarily convert the model's weights to the format - other nodes use the same model. Afterwards, the original
+	weight tensors themselves are put back, rather than converted back: a round trip through a reduced precision
+	would degrade them for every later run (and the model stays loaded between prompts).
+	"""
+	module = upscale_model.model
+	convert_dtype = fmt.dtype is not None and fmt.dtype != _model_dtype(upscale_model)
+	if not (convert_dtype or fmt.channels_last):
+		yield
+		return
+
+	# Both the tensor objects and their data: depending on torch settings, ``.to()`` either replaces
+	# the parameter objects in the module, or their data.
+	originals = [
+		(tensors, name, tensor, tensor.data)
+		for sub in module.modules()
+		for tensors in (sub._parameters, sub._buffers)
+		for name, tensor in tensors.items()
+		if tensor is not None
+	]
+	try:
+		if convert_dtype:
+			module.to(dtype=fmt.dtype)
+		if fmt.channels_last:
+			module.to(memory_format=torch.channels_last)
+		yield
+	finally:
+		for tensors, name, tensor, data in originals:
+			tensor.data = data
+			tensors[name] = tensor
+
+
+def _model_call(upscale_model, fmt: InferenceFormat) -> _t.Callable[[torch.Tensor], torch.Tensor]:
+	"""The model as a function of a tile: the tile is converted to the format, and the output - back."""
+	if fmt.dtype is None and not fmt.channels_last:
+		return lambda a: upscale_model(a)
+
+	memory_format = torch.channels_last if fmt.channels_last else torch.contiguous_format
+
+	def call(a: torch.Tensor) -> torch.Tensor:
+		out_dtype = a.dtype
+		a = a.to(dtype=fmt.dtype or a.dtype, memory_format=memory_format)
+		out = upscale_model(a)
+		if fmt.reduced:
+			# A single pass over the tile: inf is out of range, and NaN fails any comparison.
+			low, high = torch.aminmax(out)
+			min_value, max_value = reduced_precision_output_range
+			if not bool((low >= min_value) & (high <= max_value)):
+				raise _NonFiniteOutput()
+		return out.to(dtype=out_dtype, memory_format=torch.contiguous_format)
+
+	return call
+
+
+def _run_in_format(upscale_model, fmt: InferenceFormat, run: _t.Callable[[InferenceFormat], _t.Any]):
+	"""
+	Call ``run(fmt)`` with the model converted to the format. If the reduced precision overflows,
+	it's re-done in fp32. Returns the result and the format actually used.
+	"""
+	try:
+		with _model_in_format(upscale_model, fmt):
+			return run(fmt), fmt
+	except _NonFiniteOutput:
+		fmt = fmt._replace(dtype=torch.float32, fallback=True)
+		with _model_in_format(upscale_model, fmt):
+			return run(fmt), fmt
+
+
+# ==========================================================
+# Copy of built-in ComfyUI nodes with v1 schema,
+# as a temporary workaround
+
+
+class _ImageUpscaleWithModel:
+	@classmethod
+	def INPUT_TYPES(s):
+		return {"required": {
+			"upscale_model": ("UPSCALE_MODEL",), "image": ("IMAGE",),
+		}}
+	RETURN_TYPES = ("IMAGE",)
+	FUNCTION = "upscale"
+
+	CATEGORY = "image/upscaling"
+
+	def upscale(self, upscale_model, image):
+		return self.upscale_with_plan(upscale_model, image)[:1]
+
+	def upscale_with_plan(
+		self, upscale_model, image, fmt: InferenceFormat = InferenceFormat(),
+	) -> _t.Tuple[torch.Tensor, TilePlan, InferenceFormat]:
+		device = model_management.get_torch_device()
+		memory_key = _tile_memory.model_key(upscale_model, device, fmt.memory_kind(), fmt.dtype)
+
+		# The model itself stays on the device between calls (see ``_model_residency``):
+		memory_required = _memory_for_tiles(upscale_model, image, memory_key)
+		memory_required += image.nelement() * image.element_size()
+
+		with _model_residency.manager().use(upscale_model, device, model_management.free_memory, memory_required):
+			in_img = image.movedim(-1,-3).to(device)
+
+			def run_in_format(fmt: InferenceFormat):
+				model_call = _model_call(upscale_model, fmt)
+
+				def run(plan: TilePlan):
+					steps = in_img.shape[0] * comfy.utils.get_tiled_scale_steps(in_img.shape[3], in_img.shape[2], tile_x=plan.tile_w, tile_y=plan.tile_h, overlap=plan.overlap)
+					pbar = comfy.utils.ProgressBar(steps)
+					return comfy.utils.tiled_scale(in_img, model_call, tile_x=plan.tile_w, tile_y=plan.tile_h, overlap=plan.overlap, upscale_amount=upscale_model.scale, pbar=pbar)
+
+				return _run_tiled(
+					run, _tile_memory.model_key(upscale_model, device, fmt.memory_kind(), fmt.dtype),
+					device, in_img.shape[3], in_img.shape[2]
+				)
+
+			(s, plan), fmt = _run_in_format(upscale_model, fmt, run_in_format)
+			del in_img
+
+		s = torch.clamp(s.movedim(-3,-1), min=0, max=1.0)
+		return s, plan, fmt
+
+
+class _ImageScaleBy:
+	upscale_methods = list(_upscale_methods)
+
+	@classmethod
+	def INPUT_TYPES(s):
+		return {"required": {
+			"image": ("IMAGE",), "upscale_method": (s.upscale_methods,),
+			"scale_by": ("FLOAT", {"default": 1.0, "min": 0.01, "max": 8.0, "step": 0.01}),
+		}}
+	RETURN_TYPES = ("IMAGE",)
+	FUNCTION = "upscale"
+
+	CATEGORY = "image/upscaling"
+
+	def upscale(self, image, upscale_method, scale_by):
+		samples = image.movedim(-1,1)
+		width = round(samples.shape[3] * scale_by)
+		height = round(samples.shape[2] * scale_by)
+		s = comfy.utils.common_upscale(samples, width, height, upscale_method, "disabled")
+		s = s.movedim(1,-1)
+		return (s,)
+
+
+# ==========================================================
+# Fused model-upscale + scale
+
+
+def _feather_ramp(size: int, feather: int) -> torch.Tensor:
+	"""1D blending weights for a tile side: linear ramps at both ends (also the same as in ``tiled_scale()``)."""
+	ramp = torch.ones(size)
+	if 0 < feather < size:
+		a = torch.arange(1, feather + 1, dtype=ramp.dtype) / feather
+		ramp[:feather] *= a
+		ramp[size - feather:] *= a.flip(0)
+	return ramp
+
+
+class _ImageUpscaleByWithModelFused:
+	"""
+	Model-upscale and scale in one pass: each tile is scaled to the final size right after inference,
+	and then blended into the output. So the full-size model output (x4 for most models) never exists in memory -
+	only the final image, one single-channel weight-map of the same size, and the current tile.
+	"""
+
+	@staticmethod
+	def _tiled(
+		model_call: _t.Callable[[torch.Tensor], torch.Tensor], in_img: torch.Tensor,
+		upscale_method: str, out_w: int, out_h: int, plan: TilePlan,
+	):
+		n_b, n_c, in_h, in_w = in_img.shape
+		scale_x = out_w / in_w
+		scale_y = out_h / in_h
+		spans_x = [
+			(pos, size, round(pos * scale_x), round((pos + size) * scale_x))
+			for pos, size in _tile_spans(in_w, plan.tile_w, plan.overlap)
+		]
+		spans_y = [
+			(pos, size, round(pos * scale_y), round((pos + size) * scale_y))
+			for pos, size in _tile_spans(in_h, plan.tile_h, plan.overlap)
+		]
+		feather_x = round(plan.overlap * scale_x)
+		feather_y = round(plan.overlap * scale_y)
+
+		out = torch.zeros((n_b, n_c, out_h, out_w))
+		out_weight = torch.zeros((1, 1, out_h, out_w))
+		pbar = comfy.utils.ProgressBar(n_b * len(spans_x) * len(spans_y))
+		for b in range(n_b):
+			for y, h, out_y0, out_y1 in spans_y:
+				for x, w, out_x0, out_x1 in spans_x:
+					if out_x1 > out_x0 and out_y1 > out_y0:
+						ps = model_call(in_img[b:b + 1, :, y:y + h, x:x + w])
+						ps = torch.clamp(ps, min=0, max=1.0)
+						ps = comfy.utils.common_upscale(ps, out_x1 - out_x0, out_y1 - out_y0, upscale_method, "disabled")
+						mask = (
+							_feather_ramp(out_y1 - out_y0, feather_y).unsqueeze(1) *
+							_feather_ramp(out_x1 - out_x0, feather_x).unsqueeze(0)
+						)
+						out[b:b + 1, :, out_y0:out_y1, out_x0:out_x1] += ps.to(out.device, out.dtype) * mask
+						if b == 0:
+							# Tiles are the same for all the images in batch, so are the weights:
+							out_weight[:, :, out_y0:out_y1, out_x0:out_x1] += mask
+					pbar.update(1)
+		out /= out_weight
+		return out
+
+	def upscale(self, upscale_model, image, upscale_method, scale_by):
+		return self.upscale_with_plan(upscale_model, image, upscale_method, scale_by)[:1]
+
+	def upscale_with_plan(
+		self, upscale_model, image, upscale_method, scale_by: float = None, out_size: _t.Tuple[int, int] = None,
+		fmt: InferenceFormat = InferenceFormat(),
+	) -> _t.Tuple[torch.Tensor, TilePlan, InferenceFormat]:
+		"""The output size is either given explicitly as ``(width, height)``, or by scale of the model output."""
+		device = model_management.get_torch_device()
+		memory_key = _tile_memory.model_key(upscale_model, device, fmt.memory_kind('fused'), fmt.dtype)
+
+		memory_required = _memory_for_tiles(upscale_model, image, memory_key)
+		memory_required += image.nelement() * image.element_size()
+
+		with _model_residency.manager().use(upscale_model, device, model_management.free_memory, memory_required):
+			in_img = image.movedim(-1,-3).to(device)
+
+			if out_size is not None:
+				out_w, out_h = out_size
+			else:
+				# The final size is exactly the same as when scaling the whole model output afterwards:
+				out_w = round(round(in_img.shape[3] * upscale_model.scale) * scale_by)
+				out_h = round(round(in_img.shape[2] * upscale_model.scale) * scale_by)
+
+			def run_in_format(fmt: InferenceFormat):
+				model_call = _model_call(upscale_model, fmt)
+				return _run_tiled(
+					lambda tile_plan: self._tiled(model_call, in_img, upscale_method, out_w, out_h, tile_plan),
+					_tile_memory.model_key(upscale_model, device, fmt.memory_kind('fused'), fmt.dtype),
+					device, in_img.shape[3], in_img.shape[2]
+				)
+
+			(s, plan), fmt = _run_in_format(upscale_model, fmt, run_in_format)
+			del in_img
+
+		s = s.movedim(-3,-1)
+		return s, plan, fmt
+
+
+# ==========================================================
+
+
+# The part of free RAM a single chunk of the batch may take:
+_batch_memory_ratio = 0.5
+
+
+def auto_batch_chunk(frame_bytes: float) -> int:
+	"""How many images of the batch to process at once, for them to fit into the free host memory."""
+	free_memory = model_management.get_free_memory(torch.device("cpu"))
+	return max(int(free_memory * _batch_memory_ratio // max(frame_bytes, 1)), 1)
+
+
+def process_in_chunks(
+	image: torch.Tensor, chunk_size: int, process: _t.Callable[[torch.Tensor], _t.Tuple[torch.Tensor, _t.Any]]
+) -> _t.Tuple[torch.Tensor, _t.Any]:
+	"""
+	Apply ``process()`` to the batch, part by part: each result is written into a single preallocated output tensor
+	right away, so intermediate memory depends only on the chunk size. ``process()`` returns the processed images
+	and something else (the same for all the chunks), which is returned as is.
+	"""
+	n_frames = image.shape[0]
+	if chunk_size >= n_frames:
+		return process(image)
+
+	out: _t.Optional[torch.Tensor] = None
+	extra = None
+	for start in range(0, n_frames, chunk_size):
+		part, extra = process(image[start:start + chunk_size])
+		if out is None:
+			out = torch.empty((n_frames, ) + tuple(part.shape[1:]), dtype=part.dtype, device=part.device)
+		out[start:start + part.shape[0]] = part
+		del part
+	return out, extra
+
+
+def scale_to_size(image: torch.Tensor, upscale_method: str, width: int, height: int) -> torch.Tensor:
+	"""Like ``ImageScaleBy``, but to the exact size."""
+	samples = image.movedim(-1,1)
+	s = comfy.utils.common_upscale(samples, width, height, upscale_method, "disabled")
+	return s.movedim(1,-1)
+
+
+ImageUpscaleWithModel_instance = _ImageUpscaleWithModel()
+ImageScaleBy_instance = _ImageScaleBy()
+ImageUpscaleByWithModelFused_instance = _ImageUpscaleByWithModelFused()
@@ -0,0 +1,106 @@
+# encoding: utf-8
+"""
+Minimal stand-ins for ComfyUI modules, so the pack's internals can be imported (and benchmarked) without ComfyUI.
+
+The pack itself is registered as a bare package - i.e., its ``__init__.py`` (with all the node imports) isn't run,
+and each internal module is imported only when explicitly requested.
+"""
+
+import typing as _t
+
+from enum import Enum as _Enum
+from importlib import import_module as _import_module
+from importlib.util import module_from_spec as _module_from_spec, spec_from_file_location as _spec_from_file_location
+from pathlib import Path as _Path
+import sys as _sys
+import types as _types
+
+pack_dir = _Path(__file__).resolve().parent.parent
+package_name = 'best_resolution'
+
+
+class _StrEnum(str, _Enum):
+	def __str__(self):
+		return str(self.value)
+
+
+class _IO(_StrEnum):
+	INT = 'INT'
+	FLOAT = 'FLOAT'
+	STRING = 'STRING'
+	BOOLEAN = 'BOOLEAN'
+	IMAGE = 'IMAGE'
+	LATENT = 'LATENT'
+	MASK = 'MASK'
+	UPSCALE_MODEL = 'UPSCALE_MODEL'
+	ANY = '*'
+
+
+class _PromptServer:
+	instance: '_PromptServer' = None
+
+	def __init__(self):
+		self.sent: _t.List[_t.Tuple[str, str]] = list()
+
+	def send_progress_text(self, text: str, node_id: str, sid: str = None):
+		self.sent.append((node_id, text))
+
+
+def _new_module(name: str, **attrs) -> _types.ModuleType:
+	module = _types.ModuleType(name)
+	module.__dict__.update(attrs)
+	_sys.modules[name] = module
+	return module
+
+
+def install_comfy_stubs(server: bool = True):
+	"""
+	Register stub ``server`` and ``comfy`` modules - only those not importable for real.
+	With ``server`` off, the ``server`` module is left alone (neither stubbed nor imported).
+	"""
+	if server:
+		try:
+			_import_module('server')
+		except ImportError:
+			_PromptServer.instance = _PromptServer()
+			_new_module('server', PromptServer=_PromptServer)
+
+	try:
+		_import_module('comfy.comfy_types.node_typing')
+	except ImportError:
+		_new_module('comfy', __path__=[])
+		_new_module('comfy.comfy_types', __path__=[])
+		_new_module('comfy.comfy_types.node_typing', IO=_IO, StrEnum=_StrEnum)
+
+
+def install():
+	"""Register stub ComfyUI modules and the bare pack-package (without running its ``__init__.py``)."""
+	install_comfy_stubs()
+	if package_name not in _sys.modules:
+		_new_module(package_name, __path__=[str(pack_dir)])
+
+
+def import_pack_module(name: str) -> _types.ModuleType:
+	"""Import an internal module of the pack (e.g., ``_funcs``), with stubs installed first."""
+	install()
+	return _import_module(f"{package_name}.{name}")
+
+
+def import_core() -> _types.ModuleType:
+	"""Import the standalone ``best_res_core`` package directly - it needs neither ComfyUI nor any stubs."""
+	if str(pack_dir) not in _sys.path:
+		_sys.path.insert(0, str(pack_dir))
+	return _import_module('best_res_core')
+
+
+def import_pack(server: bool = True) -> _types.ModuleType:
+	"""
+	Import the whole pack, the way ComfyUI does it: with its ``__init__.py`` (and all the nodes) executed.
+	Must be called in a fresh process, before any ``import_pack_module()``.
+	"""
+	install_comfy_stubs(server)
+	spec = _spec_from_file_location(package_name, pack_dir / '__init__.py', submodule_search_locations=[str(pack_dir)])
+	module = _module_from_spec(spec)
+	_sys.modules[package_name] = module
+	spec.loader.exec_module(module)
+	return module
@@ -0,0 +1,124 @@
+# encoding: utf-8
+"""
+Calibrates the memory/time cost model for "Best-Res (budget)" node on this machine, and saves it.
+
+Needs torch; ComfyUI itself - only to save the model into its user directory (by default). A stand-in denoiser
+(a small conv net working in latent space, 8x smaller than the image) is used, so no model files are needed:
+
+	python benchmarks/budget_calibration.py --comfy /path/to/ComfyUI
+
+Each batch size / resolution pair is measured in its own fresh process: peak memory (CUDA allocator's peak
+if a GPU is available, otherwise peak RSS of the whole process) and the median time of a single forward pass.
+A linear model is fitted to these samples, and its error is printed: an actual model would have other
+coefficients, but the same (linear) shape of the costs.
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from statistics import median as _median
+from time import perf_counter as _perf_counter
+import resource as _resource
+import subprocess as _subprocess
+import sys as _sys
+
+batch_sizes = (1, 2, 4)
+square_sizes = (512, 768, 1024)
+latent_scale = 8
+
+
+def _max_rss_bytes() -> int:
+	max_rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS:
+	return max_rss if _sys.platform == 'darwin' else max_rss * 1024
+
+
+def _measure(batch_size: int, square_size: int, channels: int, repeats: int) -> str:
+	import torch
+
+	device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+	torch.manual_seed(0)
+	model = torch.nn.Sequential(
+		torch.nn.Conv2d(4, channels, 3, padding=1),
+		torch.nn.SiLU(),
+		torch.nn.Conv2d(channels, channels, 3, padding=1),
+		torch.nn.SiLU(),
+		torch.nn.Conv2d(channels, channels, 3, padding=1),
+		torch.nn.SiLU(),
+		torch.nn.Conv2d(channels, 4, 3, padding=1),
+	).to(device)
+	side = square_size // latent_scale
+	latent = torch.randn(batch_size, 4, side, side, device=device)
+
+	def run():
+		with torch.no_grad():
+			model(latent)
+		if device.type == 'cuda':
+			torch.cuda.synchronize()
+
+	run()  # Warm-up
+	if device.type == 'cuda':
+		torch.cuda.reset_peak_memory_stats()
+	durations = list()
+	for _ in range(repeats):
+		start_time = _perf_counter()
+		run()
+		durations.append(_perf_counter() - start_time)
+	memory = torch.cuda.max_memory_allocated() if device.type == 'cuda' else _max_rss_bytes()
+	return f"{memory} {_median(durations)!r}"
+
+
+def main(args: _t.Sequence[str] = None) -> int:
+	parser = _ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--comfy', help="Path to ComfyUI folder (unless it's already importable).")
+	parser.add_argument('--out', help="Where to save the cost model (by default, where the node looks for it).")
+	parser.add_argument('--channels', type=int, default=64, help="Width of the stand-in model.")
+	parser.add_argument('--repeats', type=int, default=5, help="Timed forward passes per sample.")
+	parser.add_argument('--child', help="(internal) Measure a single `batch_size,square_size` sample in this process.")
+	parsed = parser.parse_args(args)
+
+	if parsed.comfy:
+		_sys.path.insert(0, parsed.comfy)
+
+	if parsed.child:
+		batch_size, square_size = (int(x) for x in parsed.child.split(','))
+		print(_measure(batch_size, square_size, parsed.channels, parsed.repeats))
+		return 0
+
+	import torch
+	from _stubs import import_core, import_pack_module
+
+	core = import_core()
+	device = 'cuda: ' + torch.cuda.get_device_name() if torch.cuda.is_available() else 'cpu'
+	print(f"Stand-in model: {parsed.channels} channels, on {device}")
+
+	samples: _t.List[_t.Any] = list()
+	for square_size in square_sizes:
+		for batch_size in batch_sizes:
+			child_args = [
+				_sys.executable, __file__, '--child', f"{batch_size},{square_size}",
+				'--channels', str(parsed.channels), '--repeats', str(parsed.repeats),
+			]
+			output = _subprocess.run(child_args, check=True, capture_output=True, text=True).stdout
+			memory, duration = (float(x) for x in output.split())
+			samples.append(core.CalibrationSample(batch_size, square_size * square_size, memory, duration))
+			print(f"{square_size:>5}² × {batch_size}: {memory / (1 << 20):8.1f} MB, {duration * 1000:8.2f} ms")
+
+	cost_model = core.fit_cost_model(samples)
+	max_errors = [
+		max(abs(getattr(cost_model, kind)(s.batch_size, s.pixels) / getattr(s, kind) - 1.0) for s in samples)
+		for kind in ('memory', 'time')
+	]
+	print(f"Fit max error: memory {max_errors[0]:.1%}, time {max_errors[1]:.1%}")
+
+	info = {
+		'device': device, 'stand_in_channels': parsed.channels,
+		'samples': [s._asdict() for s in samples],
+	}
+	path = import_pack_module('_budget').save_cost_model(cost_model, parsed.out, info)
+	print(f"Saved to: {path}")
+	return 0
+
+
+if __name__ == '__main__':
+	_sys.exit(main())
@@ -0,0 +1,102 @@
+# encoding: utf-8
+"""
+Peak memory (CPU) of "Upscale Image By (with Model)": the regular model-upscale + scale vs the fused per-tile one.
+
+Needs torch and ComfyUI itself (its ``comfy`` package is used for tiling/scaling). A stand-in x4 model is used,
+so no model files are needed:
+
+	python benchmarks/fused_upscale_memory.py --comfy /path/to/ComfyUI
+
+Each mode is measured in its own fresh process: peak RSS growth while the node does its job.
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from time import perf_counter as _perf_counter
+import resource as _resource
+import subprocess as _subprocess
+import sys as _sys
+
+modes = ('regular', 'fused')
+
+
+def _max_rss_mb() -> float:
+	max_rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS:
+	return max_rss / (1024 * 1024) if _sys.platform == 'darwin' else max_rss / 1024
+
+
+def _measure(mode: str, width: int, height: int, batch: int, scale: float) -> str:
+	import torch
+	from _stubs import import_pack_module
+
+	impl = import_pack_module('_upscale_impl')
+	model_scale = 4
+
+	class _StandInModel:
+		"""Mimics the interface of an upscale model from ComfyUI (which is a ``spandrel`` model descriptor)."""
+
+		def __init__(self):
+			self.scale = model_scale
+			self.model = torch.nn.Sequential(
+				torch.nn.Conv2d(3, 3 * model_scale * model_scale, 3, padding=1),
+				torch.nn.PixelShuffle(model_scale),
+				torch.nn.Sigmoid(),
+			)
+
+		def to(self, device):
+			self.model.to(device)
+			return self
+
+		def __call__(self, x):
+			with torch.no_grad():
+				return self.model(x)
+
+	model = _StandInModel()
+	image = torch.rand(batch, height, width, 3)
+	second_scale = scale / model_scale
+
+	rss_before = _max_rss_mb()
+	start_time = _perf_counter()
+	if mode == 'fused':
+		out = impl.ImageUpscaleByWithModelFused_instance.upscale(model, image, 'bicubic', second_scale)[0]
+	else:
+		out = impl.ImageUpscaleWithModel_instance.upscale(model, image)[0]
+		out = impl.ImageScaleBy_instance.upscale(out, 'bicubic', second_scale)[0]
+	duration = _perf_counter() - start_time
+	peak = _max_rss_mb() - rss_before
+	output_mb = out.nelement() * out.element_size() / (1024 * 1024)
+	return f"{mode:>8}: peak +{peak:8.1f} MB ({peak / output_mb:5.2f}x output), {duration:6.2f} s, output {tuple(out.shape)}"
+
+
+def main(args: _t.Sequence[str] = None):
+	parser = _ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--comfy', help="Path to ComfyUI folder (unless it's already importable).")
+	parser.add_argument('--width', type=int, default=1536)
+	parser.add_argument('--height', type=int, default=1024)
+	parser.add_argument('--batch', type=int, default=1)
+	parser.add_argument('--scale', type=float, default=1.5)
+	parser.add_argument('--child', choices=modes, help="(internal) Measure a single mode in this process.")
+	parsed = parser.parse_args(args)
+
+	if parsed.child:
+		if parsed.comfy:
+			_sys.path.insert(0, parsed.comfy)
+		print(_measure(parsed.child, parsed.width, parsed.height, parsed.batch, parsed.scale))
+		return
+
+	print(f"Input: {parsed.batch} x {parsed.width}x{parsed.height}, x{parsed.scale} with a x4 model")
+	for mode in modes:
+		child_args = [
+			_sys.executable, __file__, '--child', mode,
+			'--width', str(parsed.width), '--height', str(parsed.height),
+			'--batch', str(parsed.batch), '--scale', str(parsed.scale),
+		]
+		if parsed.comfy:
+			child_args.extend(['--comfy', parsed.comfy])
+		_subprocess.run(child_args, check=True)
+
+
+if __name__ == '__main__':
+	main()
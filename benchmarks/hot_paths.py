@@ -0,0 +1,193 @@
+# encoding: utf-8
+"""
+Micro-benchmarks for the resolution hot paths.
+
+Runs against stub ComfyUI modules (see ``_stubs.py``), so neither ComfyUI nor GPU is needed.
+Every case processes the same fixed set of inputs each run, so the results are comparable between versions:
+
+	python benchmarks/hot_paths.py --output before.json
+	... (switch to another version) ...
+	python benchmarks/hot_paths.py --output after.json --compare before.json
+
+Results are reported in nanoseconds per call (the best and the median of all the repeats).
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from datetime import datetime as _datetime, timezone as _timezone
+from itertools import product as _product
+from statistics import median as _median
+from timeit import Timer as _Timer
+import json as _json
+import platform as _platform
+import re as _re
+import sys as _sys
+
+from _stubs import import_pack_module, pack_dir
+
+_cache = import_pack_module('_cache')
+_enums = import_pack_module('best_res_core.enums')
+_funcs = import_pack_module('_funcs')
+_rounding = import_pack_module('best_res_core.rounding')
+_funcs_crop_pad = import_pack_module('_funcs_crop_pad')
+_report_sink = import_pack_module('_report_sink')
+
+_t_case = _t.Tuple[str, _t.Callable[[], _t.Any], int]
+
+square_sizes = (512, 1024, 1536)
+steps = (8, 48, 144)
+aspects = ((1, 1), (4, 3), (16, 9), (21, 9))
+upscales = (1.25, 1.5, 2.0)
+hd_step = 144
+
+
+def _area_inputs() -> _t.List[_t.Tuple[int, bool, float, float]]:
+	return [
+		(size, landscape, float(a), float(b))
+		for size, landscape, (a, b) in _product(square_sizes, (True, False), aspects)
+	]
+
+
+def _approx_wh_inputs() -> _t.List[_t.Tuple[float, float, int]]:
+	return [
+		_rounding.float_width_height_from_area(size, landscape, a, b) + (step, )
+		for (size, landscape, a, b), step in _product(_area_inputs(), steps)
+	]
+
+
+def _batch_case(name: str, func: _t.Callable, args_list: _t.Sequence[tuple], **kwargs) -> _t_case:
+	args_list = list(args_list)
+	return name, lambda: [func(*args, **kwargs) for args in args_list], len(args_list)
+
+
+def _crop_pad_inputs() -> _t.List[tuple]:
+	"""Init/HD resolution pairs, which can't be uniformly upscaled."""
+	inputs = list()
+	for width_f, height_f, step in _approx_wh_inputs():
+		for upscale in upscales:
+			result = _funcs.upscale_result_from_approx_wh(
+				width_f, height_f, step, _enums.RoundingPriority.DESIRED, upscale, hd_step
+			)
+			inputs.append((upscale, result.init_width, result.init_height, result.hd_width, result.hd_height))
+	return inputs
+
+
+def all_cases() -> _t.List[_t_case]:
+	approx_wh = _approx_wh_inputs()
+	rounded = [
+		(width_f, height_f, step) + _rounding.round_width_and_height_closest_to_the_ratio(width_f, height_f, step)
+		for width_f, height_f, step in approx_wh
+	]
+
+	cases: _t.List[_t_case] = [
+		_batch_case('round_abs_to_step', _rounding.round_abs_to_step, [
+			(x, step) for width_f, height_f, step in approx_wh for x in (width_f, height_f)
+		]),
+		_batch_case('float_width_height_from_area', _rounding.float_width_height_from_area, _area_inputs()),
+		_batch_case(
+			'round_width_and_height_closest_to_the_ratio', _rounding.round_width_and_height_closest_to_the_ratio, approx_wh
+		),
+		_batch_case('round_width_and_height_optimal', _rounding.round_width_and_height_optimal, approx_wh),
+		_batch_case('format_report_simple', _funcs.format_report_simple, rounded),
+	]
+
+	for priority, mode, report in _product(_enums.RoundingPriority, _enums.RoundingMode, (False, True)):
+		args_list = [(width_f, height_f, step, priority, upscale, hd_step) for (width_f, height_f, step), upscale in _product(approx_wh, upscales)]
+		name = f"upscale_result_from_approx_wh[priority={priority.value},mode={mode.value}{',report' if report else ''}]"
+		cases.append(_batch_case(
+			name, _funcs.upscale_result_from_approx_wh, args_list, mode=mode, unique_id='1' if report else None
+		))
+
+	crop_pad_inputs = _crop_pad_inputs()
+	for strategy, report in _product(_enums.UpscaledCropPadStrategy, (False, True)):
+		args_list = [
+			(upscale, init_w, init_h, hd_w, hd_h, strategy, 0.5, 0.5)
+			for upscale, init_w, init_h, hd_w, hd_h in crop_pad_inputs
+		]
+		name = f"upscaled_crop_pad[strategy={strategy.value}{',report' if report else ''}]"
+		cases.append(_batch_case(name, _funcs_crop_pad.upscaled_crop_pad, args_list, unique_id='1' if report else None))
+
+	return cases
+
+
+def run_case(func: _t.Callable[[], _t.Any], n_calls: int, repeat: int) -> _t.Dict[str, float]:
+	timer = _Timer(func)
+	n_loops, _ = timer.autorange()
+	times_ns = [x * 1e9 / (n_loops * n_calls) for x in timer.repeat(repeat, n_loops)]
+	return {
+		'ns_per_call_min': min(times_ns),
+		'ns_per_call_median': _median(times_ns),
+		'calls_per_loop': n_calls,
+		'loops': n_loops,
+		'repeat': repeat,
+	}
+
+
+def _pack_version() -> str:
+	match = _re.search(r'^version\s*=\s*"(.*?)"', (pack_dir / 'pyproject.toml').read_text(encoding='utf-8'), _re.M)
+	return match.group(1) if match else ''
+
+
+def run(name_filter: str = None, repeat: int = 7) -> _t.Dict[str, _t.Any]:
+	# Measure the computation itself, not the cache:
+	_cache.set_max_size(0)
+	# A sink which is "listening" (so reports are formatted), but sends nothing anywhere:
+	_report_sink.set_sink(_report_sink.ReportSink())
+
+	results: _t.Dict[str, _t.Dict[str, float]] = dict()
+	for name, func, n_calls in all_cases():
+		if name_filter and name_filter not in name:
+			continue
+		results[name] = run_case(func, n_calls, repeat)
+		print(f"{results[name]['ns_per_call_min']:>12.0f} ns  {name}", file=_sys.stderr)
+
+	return {
+		'meta': {
+			'pack_version': _pack_version(),
+			'python': _platform.python_version(),
+			'implementation': _platform.python_implementation(),
+			'platform': _platform.platform(),
+			'timestamp': _datetime.now(_timezone.utc).isoformat(timespec='seconds'),
+		},
+		'results': results,
+	}
+
+
+def compare(current: _t.Dict[str, _t.Any], baseline: _t.Dict[str, _t.Any]) -> _t.List[str]:
+	"""Human-readable lines with the ratio of the current time to the baseline one (for cases present in both)."""
+	lines = list()
+	base_results: _t.Dict[str, _t.Dict[str, float]] = baseline.get('results', dict())
+	for name, cur in current['results'].items():
+		base = base_results.get(name)
+		if not base:
+			continue
+		ratio = cur['ns_per_call_min'] / base['ns_per_call_min']
+		lines.append(f"{ratio:>7.3f}x  {base['ns_per_call_min']:>10.0f} -> {cur['ns_per_call_min']:>10.0f} ns  {name}")
+	return lines
+
+
+def main(args: _t.Sequence[str] = None):
+	parser = _ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--output', '-o', help="Write JSON results to this file (default: stdout).")
+	parser.add_argument('--compare', '-c', help="Baseline JSON file (from a previous run) to compare against.")
+	parser.add_argument('--filter', '-k', help="Only run the cases with this substring in their name.")
+	parser.add_argument('--repeat', '-r', type=int, default=7)
+	parsed = parser.parse_args(args)
+
+	current = run(parsed.filter, max(parsed.repeat, 1))
+	json_text = _json.dumps(current, indent='\t', ensure_ascii=False)
+	if parsed.output:
+		with open(parsed.output, 'wt', encoding='utf-8') as f:
+			f.write(json_text + '\n')
+	else:
+		print(json_text)
+
+	if parsed.compare:
+		with open(parsed.compare, 'rt', encoding='utf-8') as f:
+			baseline = _json.load(f)
+		print('\n'.join(compare(current, baseline)), file=_sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,75 @@
+# encoding: utf-8
+"""
+Import-time check: importing the whole pack (i.e., registering its nodes) must not import torch,
+and must stay under a fixed time budget.
+
+Each measurement is done in a fresh interpreter, with torch (and the torch-dependent ComfyUI modules) blocked -
+so an accidental top-level import fails loudly instead of just being slow. That includes ``server``: it's not
+stubbed here, since the real one imports ``nodes`` (and torch with them).
+
+	python benchmarks/import_time.py [--budget-ms 250] [--runs 5]
+
+Exits with non-zero code if the budget is exceeded.
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from pathlib import Path as _Path
+import json as _json
+import subprocess as _subprocess
+import sys as _sys
+
+_blocked_modules = ('torch', 'server', 'comfy.model_management', 'comfy.utils')
+
+_child_code = f"""
+import importlib.abc, json, sys, time
+
+blocked = {_blocked_modules!r}
+
+class _Blocker(importlib.abc.MetaPathFinder):
+	def find_spec(self, name, path=None, target=None):
+		if any(name == x or name.startswith(x + '.') for x in blocked):
+			raise ImportError(f"{{name!r}} is blocked during import-time benchmark")
+		return None
+
+sys.path.insert(0, {str(_Path(__file__).resolve().parent)!r})
+from _stubs import import_pack, install_comfy_stubs
+
+install_comfy_stubs(server=False)
+sys.meta_path.insert(0, _Blocker())
+start = time.perf_counter()
+pack = import_pack(server=False)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+	'seconds': elapsed,
+	'n_nodes': len(pack.NODE_CLASS_MAPPINGS),
+	'torch_loaded': 'torch' in sys.modules,
+	'server_loaded': 'server' in sys.modules,
+}}))
+"""
+
+
+def measure_once() -> _t.Dict[str, _t.Any]:
+	out = _subprocess.run([_sys.executable, '-c', _child_code], check=True, capture_output=True, text=True).stdout
+	return _json.loads(out.strip().splitlines()[-1])
+
+
+def main(args: _t.Sequence[str] = None) -> int:
+	parser = _ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--budget-ms', type=float, default=250.0)
+	parser.add_argument('--runs', type=int, default=5)
+	parsed = parser.parse_args(args)
+
+	results = [measure_once() for _ in range(max(parsed.runs, 1))]
+	best_ms = min(x['seconds'] for x in results) * 1000.0
+	ok = best_ms <= parsed.budget_ms and not any(x['torch_loaded'] or x['server_loaded'] for x in results)
+	print(
+		f"Pack import: {best_ms:.1f} ms (best of {len(results)}), budget: {parsed.budget_ms:.0f} ms, "
+		f"nodes: {results[0]['n_nodes']} - {'OK' if ok else 'FAILED'}"
+	)
+	return 0 if ok else 1
+
+
+if __name__ == '__main__':
+	_sys.exit(main())
@@ -0,0 +1,84 @@
+# encoding: utf-8
+"""
+Compare "optimal" rounding mode against the default "3-pass" heuristic: both speed and quality of the answers.
+
+Run from anywhere:
+	python benchmarks/optimal_rounding.py
+"""
+
+import typing as _t
+
+from itertools import product as _product
+from timeit import Timer as _Timer
+
+from _stubs import import_core
+
+_core = import_core()
+
+square_sizes = (512, 768, 1024, 1536, 2048)
+steps = (8, 16, 48, 64, 144)
+aspects = ((1, 1), (5, 4), (4, 3), (3, 2), (16, 10), (16, 9), (2, 1), (21, 9), (3, 1), (1.85, 1), (2.39, 1))
+
+
+def _cases() -> _t.List[_t.Tuple[float, float, int]]:
+	return [
+		_core.float_width_height_from_area(size, landscape, a, b) + (step, )
+		for size, step, landscape, (a, b) in _product(square_sizes, steps, (True, False), aspects)
+	]
+
+
+def _errors(width_f: float, height_f: float, width: int, height: int) -> _t.Tuple[float, float]:
+	"""Relative errors of the aspect ratio and the area."""
+	aspect_error = abs((float(width) / height) / (width_f / height_f) - 1.0)
+	area_error = abs(float(width * height) / (width_f * height_f) - 1.0)
+	return aspect_error, area_error
+
+
+def _time_per_call(func, cases, repeat: int = 5) -> float:
+	timer = _Timer(lambda: [func(*args) for args in cases])
+	n_loops, _ = timer.autorange()
+	return min(timer.repeat(repeat, n_loops)) / (n_loops * len(cases))
+
+
+def main():
+	cases = _cases()
+	heuristic = _core.round_width_and_height_closest_to_the_ratio
+	optimal = _core.round_width_and_height_optimal
+
+	t_heuristic = _time_per_call(heuristic, cases)
+	t_optimal = _time_per_call(optimal, cases)
+
+	n_better_aspect = n_better_area = n_same = 0
+	sum_aspect_h = sum_aspect_o = sum_area_h = sum_area_o = 0.0
+	max_aspect_h = max_aspect_o = 0.0
+	for width_f, height_f, step in cases:
+		w_h, _, h_h, _ = heuristic(width_f, height_f, step)
+		w_o, _, h_o, _ = optimal(width_f, height_f, step)
+		aspect_h, area_h = _errors(width_f, height_f, w_h, h_h)
+		aspect_o, area_o = _errors(width_f, height_f, w_o, h_o)
+		assert aspect_o <= aspect_h + 1e-12 and area_o <= area_h + 1e-12, (width_f, height_f, step)
+
+		if (w_h, h_h) == (w_o, h_o):
+			n_same += 1
+		elif aspect_o < aspect_h:
+			n_better_aspect += 1
+		else:
+			n_better_area += 1
+		sum_aspect_h += aspect_h
+		sum_aspect_o += aspect_o
+		sum_area_h += area_h
+		sum_area_o += area_o
+		max_aspect_h = max(max_aspect_h, aspect_h)
+		max_aspect_o = max(max_aspect_o, aspect_o)
+
+	n = len(cases)
+	print(f"Cases: {n} (square sizes x steps x orientation x aspect ratios)")
+	print(f"Time per call: {_core.RoundingMode.HEURISTIC} {t_heuristic * 1e6:.2f} us, {_core.RoundingMode.OPTIMAL} {t_optimal * 1e6:.2f} us")
+	print(f"Same answer: {n_same}, better aspect: {n_better_aspect}, same aspect but closer area: {n_better_area}")
+	print(f"Mean aspect error, %: {sum_aspect_h / n * 100:.4f} -> {sum_aspect_o / n * 100:.4f}")
+	print(f"Max aspect error, %:  {max_aspect_h * 100:.4f} -> {max_aspect_o * 100:.4f}")
+	print(f"Mean area error, %:   {sum_area_h / n * 100:.4f} -> {sum_area_o / n * 100:.4f}")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,62 @@
+# encoding: utf-8
+"""
+How many pixels an upscale model processes: fixed 512px tiles (with 32px overlap) vs planned tile geometry.
+
+Images are the typical outputs of "Best-Res (area)" node: a range of square sizes, aspect ratios and steps.
+No ComfyUI/torch needed:
+
+	python benchmarks/tile_pixels.py
+"""
+
+import typing as _t
+
+from itertools import product as _product
+from timeit import Timer as _Timer
+
+from _stubs import import_core
+
+_core = import_core()
+from best_res_core import tiling as _tiling
+
+square_sizes = (512, 768, 1024, 1536, 2048)
+steps = (8, 16, 48, 64)
+aspects = ((1, 1), (5, 4), (4, 3), (3, 2), (16, 9), (2, 1), (21, 9))
+max_tiles = (256, 384, 512)
+
+
+def _image_sizes() -> _t.List[_t.Tuple[int, int]]:
+	sizes = set()
+	for size, step, landscape, (a, b) in _product(square_sizes, steps, (True, False), aspects):
+		width_f, height_f = _core.float_width_height_from_area(size, landscape, a, b)
+		sizes.add(tuple(_core.simple_result_from_approx_wh(width_f, height_f, step)))
+	return sorted(sizes)
+
+
+def main():
+	sizes = _image_sizes()
+	print(f"{len(sizes)} image sizes, min overlap {_tiling.default_overlap}")
+	for max_tile in max_tiles:
+		fixed_total = planned_total = 0
+		fixed_tiles = planned_tiles = 0
+		worst_saving = 1.0
+		for width, height in sizes:
+			fixed = _tiling.fixed_tile_plan(width, height, max_tile)
+			planned = _tiling.plan_tiles(width, height, max_tile * max_tile)
+			fixed_total += fixed.pixels
+			planned_total += planned.pixels
+			fixed_tiles += fixed.n_tiles
+			planned_tiles += planned.n_tiles
+			worst_saving = min(worst_saving, 1.0 - planned.pixels / fixed.pixels)
+
+		n_calls = 10
+		timer = _Timer(lambda: [_tiling.plan_tiles(w, h, max_tile * max_tile) for w, h in sizes])
+		plan_time = min(timer.repeat(3, n_calls)) / (n_calls * len(sizes))
+		print(
+			f"tile {max_tile}: pixels {fixed_total / 1e6:.1f}M -> {planned_total / 1e6:.1f}M "
+			f"({1.0 - planned_total / fixed_total:.1%} less, worst case {worst_saving:.1%}), "
+			f"tiles {fixed_tiles} -> {planned_tiles}, planning {plan_time * 1e3:.2f} ms/image"
+		)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,158 @@
+# encoding: utf-8
+"""
+Speed, peak memory (CPU) and accuracy of "Upscale Image By (with Model)" per inference precision and memory layout.
+
+Needs torch and ComfyUI itself (its ``comfy`` package is used for tiling). A stand-in x4 model is used,
+so no model files are needed:
+
+	python benchmarks/upscale_precision.py --comfy /path/to/ComfyUI
+
+Each setting is measured in its own fresh process: throughput and peak RSS growth while the model upscales
+the image. Then, the outputs are compared to the fp32 one - the exit code is 1 if any of them is further off
+than the guardrails allow.
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from pathlib import Path as _Path
+from tempfile import TemporaryDirectory as _TemporaryDirectory
+from time import perf_counter as _perf_counter
+import math as _math
+import resource as _resource
+import subprocess as _subprocess
+import sys as _sys
+
+precisions = ('fp32', 'bf16', 'fp16')
+# The max allowed difference from fp32 (for pixel values in 0..1 range): max abs error, and the min PSNR.
+guardrails: _t.Dict[str, _t.Tuple[float, float]] = {
+	'fp32': (1e-5, 90.0),
+	'bf16': (8 / 255, 35.0),
+	'fp16': (2 / 255, 50.0),
+}
+
+
+def _settings() -> _t.List[_t.Tuple[str, bool]]:
+	return [(precision, channels_last) for precision in precisions for channels_last in (False, True)]
+
+
+def _setting_name(precision: str, channels_last: bool) -> str:
+	return f"{precision}{'+cl' if channels_last else ''}"
+
+
+def _max_rss_mb() -> float:
+	max_rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS:
+	return max_rss / (1024 * 1024) if _sys.platform == 'darwin' else max_rss / 1024
+
+
+def _measure(precision: str, channels_last: bool, width: int, height: int, out_path: str) -> str:
+	import torch
+	from _stubs import import_pack_module
+
+	impl = import_pack_module('_upscale_impl')
+	model_scale = 4
+
+	class _StandInModel:
+		"""Mimics the interface of an upscale model from ComfyUI (which is a ``spandrel`` model descriptor)."""
+		supports_half = True
+		supports_bfloat16 = True
+
+		def __init__(self):
+			torch.manual_seed(0)
+			self.scale = model_scale
+			self.model = torch.nn.Sequential(
+				torch.nn.Conv2d(3, 32, 3, padding=1),
+				torch.nn.LeakyReLU(0.2),
+				torch.nn.Conv2d(32, 32, 3, padding=1),
+				torch.nn.LeakyReLU(0.2),
+				torch.nn.Conv2d(32, 3 * model_scale * model_scale, 3, padding=1),
+				torch.nn.PixelShuffle(model_scale),
+				torch.nn.Sigmoid(),
+			)
+
+		def to(self, device):
+			self.model.to(device)
+			return self
+
+		def __call__(self, x):
+			with torch.no_grad():
+				return self.model(x)
+
+	model = _StandInModel()
+	torch.manual_seed(1)
+	image = torch.rand(1, height, width, 3)
+	fmt = impl.inference_format(model, precision, channels_last)
+
+	rss_before = _max_rss_mb()
+	start_time = _perf_counter()
+	out, plan, used_fmt = impl.ImageUpscaleWithModel_instance.upscale_with_plan(model, image, fmt)
+	duration = _perf_counter() - start_time
+	peak = _max_rss_mb() - rss_before
+	torch.save(out, out_path)
+	mpix = width * height / 1e6
+	return (
+		f"{_setting_name(precision, channels_last):>9}: {mpix / duration:6.3f} MPix/s ({duration:6.2f} s), "
+		f"peak +{peak:7.1f} MB [{used_fmt}; {plan}]"
+	)
+
+
+def _compare(reference, out) -> _t.Tuple[float, float]:
+	"""Max abs error and PSNR (dB)."""
+	diff = (out.double() - reference.double()).abs()
+	mse = float((diff ** 2).mean())
+	psnr = 10.0 * _math.log10(1.0 / mse) if mse > 0.0 else float('inf')
+	return float(diff.max()), psnr
+
+
+def main(args: _t.Sequence[str] = None) -> int:
+	parser = _ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--comfy', help="Path to ComfyUI folder (unless it's already importable).")
+	parser.add_argument('--width', type=int, default=768)
+	parser.add_argument('--height', type=int, default=512)
+	parser.add_argument('--child', help="(internal) Measure a single setting in this process.")
+	parser.add_argument('--out', help="(internal) Where the child saves its output.")
+	parsed = parser.parse_args(args)
+
+	if parsed.comfy:
+		_sys.path.insert(0, parsed.comfy)
+
+	if parsed.child:
+		precision, _, layout = parsed.child.partition('+')
+		print(_measure(precision, bool(layout), parsed.width, parsed.height, parsed.out))
+		return 0
+
+	import torch
+
+	print(f"Input: {parsed.width}x{parsed.height}, a x4 stand-in model, {torch.get_num_threads()} CPU threads")
+	failed = False
+	with _TemporaryDirectory() as tmp_dir:
+		outputs: _t.Dict[str, _Path] = dict()
+		for precision, channels_last in _settings():
+			name = _setting_name(precision, channels_last)
+			outputs[name] = _Path(tmp_dir) / f"{name}.pt"
+			child_args = [
+				_sys.executable, __file__, '--child', name, '--out', str(outputs[name]),
+				'--width', str(parsed.width), '--height', str(parsed.height),
+			]
+			if parsed.comfy:
+				child_args.extend(['--comfy', parsed.comfy])
+			_subprocess.run(child_args, check=True)
+
+		print("Accuracy vs fp32:")
+		reference = torch.load(outputs['fp32'])
+		for precision, channels_last in _settings():
+			name = _setting_name(precision, channels_last)
+			max_error, psnr = _compare(reference, torch.load(outputs[name]))
+			max_allowed, min_psnr = guardrails[precision]
+			ok = max_error <= max_allowed and psnr >= min_psnr
+			failed = failed or not ok
+			print(
+				f"{name:>9}: max error {max_error * 255:6.3f}/255, PSNR {psnr:6.1f} dB "
+				f"{'ok' if ok else f'FAILED (allowed: {max_allowed * 255:.3f}/255, {min_psnr:.0f} dB)'}"
+			)
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	_sys.exit(main())
@@ -0,0 +1,41 @@
+# encoding: utf-8
+"""
+The resolution math of Best Resolution pack, as a standalone package: no ComfyUI, torch, or any other dependency.
+
+It's shipped inside the node pack, so to use it outside of ComfyUI, put the pack's folder on ``sys.path``:
+
+	import sys
+	sys.path.insert(0, '/path/to/ComfyUI/custom_nodes/ComfyUI-BestResolution')
+
+	import best_res_core
+	best_res_core.upscale_result_from_approx_wh(1024.0, 576.0, 16, 'desired', 1.5, 64)
+
+The NumPy-backed batch versions of the functions live in ``best_res_core.batch`` - they aren't imported here,
+so NumPy stays an optional dependency.
+"""
+
+from .enums import *
+from .return_tuples import *
+from .rounding import (
+	aspect_ratios_sorted,
+	number_to_int,
+	round_pos_int,
+	round_abs_to_step,
+	round_width_and_height_closest_to_the_ratio,
+	round_width_and_height_optimal,
+	round_width_and_height,
+	float_width_height_from_area,
+	need_post_resize,
+	upscale_rounded_pair,
+	simple_result_from_approx_wh,
+	upscale_result_from_approx_wh,
+)
+from .crop_pad import (
+	upscaled_crop_pad, CropPadCosts, crop_pad_pixels, crop_pad_cost, CropPadLayout, crop_pad_layout, latent_crop_pad_layout,
+)
+from .tiling import TilePlan, plan_tiles, fixed_tile_plan, tile_spans, PreDownscalePlan, plan_pre_downscale
+from .chain import ChainStage, ChainPlan, parse_stages, plan_chain
+from .budget import CostModel, CalibrationSample, BudgetResult, fit_cost_model, solve_budget
+from .lattice import (
+	LatticeCandidate, ResolutionLattice, iter_lattice, lattice_for_area, lattice_max_aspect, nearest_resolutions,
+)
@@ -0,0 +1,11 @@
+# encoding: utf-8
+"""
+Batch planning from the command line: ``python -m best_res_core --help`` (see ``cli.py``).
+"""
+
+import sys as _sys
+
+from .cli import main
+
+if __name__ == '__main__':
+	_sys.exit(main())
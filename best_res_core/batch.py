@@ -0,0 +1,191 @@
+# encoding: utf-8
+"""
+NumPy-backed batch versions of the resolution math from ``rounding``.
+
+Each function here takes arrays (or anything broadcastable to them) instead of scalars and processes all the elements
+at once, while following the scalar logic operation-by-operation - so the results are bit-identical
+to calling the scalar function for each element individually.
+
+Not used by the nodes themselves. Intended for tools sweeping lots of aspect/area/step combinations at once.
+"""
+
+import typing as _t
+
+import numpy as _np
+
+from .enums import *
+from .return_tuples import *
+from .rounding import upscale_rounded_pair as _upscale_rounded_pair
+
+
+_t_array_like = _t.Union[_np.ndarray, _t.Sequence[_t.Union[int, float]], int, float]
+
+_float = _np.float64
+_int = _np.int64
+
+
+def _as_float_array(values: _t_array_like) -> _np.ndarray:
+	return _np.asarray(values, dtype=_float)
+
+
+def number_to_int_batch(values: _t_array_like, min: int = 1) -> _np.ndarray:
+	"""Batch version of ``number_to_int()``: floats are rounded half-away-from-zero, then clamped to ``min``."""
+	values = _np.asarray(values)
+	if not _np.issubdtype(values.dtype, _np.integer):
+		values = _as_float_array(values)
+		values = _np.where(values < 0.0, -_np.floor(-values + 0.5), _np.floor(values + 0.5))
+	return _np.maximum(values.astype(_int), min)
+
+
+def round_pos_int_batch(values: _t_array_like) -> _np.ndarray:
+	"""Batch version of ``round_pos_int()``. Just like the scalar one, assumes all the values are positive."""
+	return _np.floor(_as_float_array(values) + 0.5).astype(_int)
+
+
+def round_abs_to_step_batch(abs_values: _t_array_like, step: _t_array_like) -> _t.Tuple[_np.ndarray, _np.ndarray]:
+	"""Batch version of ``round_abs_to_step()``. Returns two int arrays: rounded values and number of steps in them."""
+	step = _np.asarray(step, dtype=_int)
+	n_steps = round_pos_int_batch(_as_float_array(abs_values) / step)
+	n_steps = _np.maximum(n_steps, 1)
+	return step * n_steps, n_steps
+
+
+def round_width_and_height_closest_to_the_ratio_batch(
+	width_f: _t_array_like, height_f: _t_array_like, step: _t_array_like
+) -> _t.Tuple[_np.ndarray, _np.ndarray, _np.ndarray, _np.ndarray]:
+	"""
+	Batch version of ``round_width_and_height_closest_to_the_ratio()``.
+
+	All three of the candidates from the scalar 3-pass detection are calculated for every element,
+	and then the same strict "is closer" comparisons are done in the same order, with ``numpy.where()``.
+	"""
+	width_f, height_f, step = _np.broadcast_arrays(_as_float_array(width_f), _as_float_array(height_f), step)
+	step = step.astype(_int)
+	desired_width_to_height_ratio = width_f / height_f
+
+	# First pass: directly from width_f and height_f
+	width, n_steps_x = round_abs_to_step_batch(width_f, step)
+	height, n_steps_y = round_abs_to_step_batch(height_f, step)
+
+	# Second pass: one side from already rounded another one:
+	height_from_width, n_steps_y_from_x = round_abs_to_step_batch(
+		width.astype(_float) / desired_width_to_height_ratio, step
+	)
+	width_from_height, n_steps_x_from_y = round_abs_to_step_batch(
+		height.astype(_float) * desired_width_to_height_ratio, step
+	)
+
+	# ... and the selection, with exactly the same order of comparisons:
+	closest_delta = _np.abs((width.astype(_float) / height) - desired_width_to_height_ratio)
+	out_width, out_n_steps_x, out_height, out_n_steps_y = width, n_steps_x, height, n_steps_y
+	for w, n_x, h, n_y in [
+		(width, n_steps_x, height_from_width, n_steps_y_from_x),
+		(width_from_height, n_steps_x_from_y, height, n_steps_y),
+	]:
+		cur_delta = _np.abs((w.astype(_float) / h) - desired_width_to_height_ratio)
+		is_closer = cur_delta < closest_delta
+		closest_delta = _np.where(is_closer, cur_delta, closest_delta)
+		out_width = _np.where(is_closer, w, out_width)
+		out_n_steps_x = _np.where(is_closer, n_x, out_n_steps_x)
+		out_height = _np.where(is_closer, h, out_height)
+		out_n_steps_y = _np.where(is_closer, n_y, out_n_steps_y)
+
+	return out_width, out_n_steps_x, out_height, out_n_steps_y
+
+
+def aspect_ratios_sorted_batch(
+	aspect_a: _t_array_like, aspect_b: _t_array_like, min_clamp: float = 1.0
+) -> _t.Tuple[_np.ndarray, _np.ndarray]:
+	"""Batch version of ``aspect_ratios_sorted()``."""
+	aspect_a = _np.maximum(_np.abs(_as_float_array(aspect_a)), float(min_clamp))
+	aspect_b = _np.maximum(_np.abs(_as_float_array(aspect_b)), float(min_clamp))
+	b_is_bigger = aspect_b > aspect_a
+	return _np.where(b_is_bigger, aspect_b, aspect_a), _np.where(b_is_bigger, aspect_a, aspect_b)
+
+
+def float_width_height_from_area_batch(
+	square_size: _t_array_like, landscape: _t_array_like, aspect_a: _t_array_like, aspect_b: _t_array_like
+) -> _t.Tuple[_np.ndarray, _np.ndarray]:
+	"""Batch version of ``float_width_height_from_area()``."""
+	aspect_big, aspect_small = aspect_ratios_sorted_batch(aspect_a, aspect_b)
+	landscape = _np.asarray(landscape, dtype=bool)
+	aspect_x = _np.where(landscape, aspect_big, aspect_small)
+	aspect_y = _np.where(landscape, aspect_small, aspect_big)
+
+	aspect_area = aspect_x * aspect_y
+	aspect_norm_scale = 1.0 / _np.sqrt(aspect_area)
+	aspect_x = aspect_x * aspect_norm_scale
+	aspect_y = aspect_y * aspect_norm_scale
+
+	square_size = _as_float_array(square_size)
+	return aspect_x * square_size, aspect_y * square_size
+
+
+def _need_post_resize_batch(
+	width: _np.ndarray, height: _np.ndarray, hd_width: _np.ndarray, hd_height: _np.ndarray
+) -> _t.Tuple[_np.ndarray, _np.ndarray, _np.ndarray, _np.ndarray]:
+	"""Batch version of ``need_post_resize()``."""
+	real_upscale_x = hd_width.astype(_float) / width
+	real_upscale_y = hd_height.astype(_float) / height
+	real_upscale_avg = (real_upscale_x + real_upscale_y) * 0.5
+
+	needs_resize = (
+		(round_pos_int_batch(real_upscale_avg * width) != hd_width) |
+		(round_pos_int_batch(real_upscale_avg * height) != hd_height)
+	)
+	return needs_resize, real_upscale_avg, real_upscale_x, real_upscale_y
+
+
+def upscale_result_from_approx_wh_batch(
+	width_f: _t_array_like, height_f: _t_array_like, step: _t_array_like,
+	priority: _t.Union[RoundingPriority, str], upscale: _t_array_like, hd_step: _t_array_like,
+	area_tolerance: float = None, aspect_tolerance: float = None,
+) -> ResultUpscaled:
+	"""
+	Batch version of the math part of ``upscale_result_from_approx_wh()`` (i.e., without any status report).
+
+	``priority`` (and tolerances, for ``exact-uniform`` one) is a single value for the whole batch.
+	Returns ``ResultUpscaled`` tuple, but with each field being an array.
+	"""
+	width_f, height_f, step, upscale, hd_step = _np.broadcast_arrays(
+		_as_float_array(width_f), _as_float_array(height_f), step, upscale, hd_step
+	)
+	upscale = _np.maximum(_as_float_array(upscale), 1.0)
+	hd_width_f = upscale * width_f
+	hd_height_f = upscale * height_f
+
+	step = number_to_int_batch(step)
+	hd_step = number_to_int_batch(hd_step)
+
+	round_batch = round_width_and_height_closest_to_the_ratio_batch
+
+	if priority == RoundingPriority.DESIRED:
+		width, _, height, _ = round_batch(width_f, height_f, step)
+		hd_width, _, hd_height, _ = round_batch(hd_width_f, hd_height_f, hd_step)
+	elif priority == RoundingPriority.ORIGINAL:
+		width, _, height, _ = round_batch(width_f, height_f, step)
+		hd_width, _, hd_height, _ = round_batch(upscale * width, upscale * height, hd_step)
+	elif priority == RoundingPriority.UPSCALED:
+		hd_width, _, hd_height, _ = round_batch(hd_width_f, hd_height_f, hd_step)
+		width, _, height, _ = round_batch(hd_width.astype(_float) / upscale, hd_height.astype(_float) / upscale, step)
+	elif priority == RoundingPriority.EXACT_UNIFORM:
+		# A search, not an arithmetic formula: done element by element, with the scalar function.
+		rounded = [
+			_upscale_rounded_pair(
+				float(w_f), float(h_f), int(s), priority, float(up), int(hd_s),
+				area_tolerance=area_tolerance, aspect_tolerance=aspect_tolerance,
+			)
+			for w_f, h_f, s, up, hd_s in zip(
+				width_f.ravel(), height_f.ravel(), step.ravel(), upscale.ravel(), hd_step.ravel()
+			)
+		]
+		width, height, hd_width, hd_height = (
+			_np.array([x[i_pair][i_side] for x in rounded], dtype=step.dtype).reshape(step.shape)
+			for i_pair, i_side in ((0, 0), (0, 2), (1, 0), (1, 2))
+		)
+	else:
+		raise ValueError(f"Invalid value for resolution priority: {priority!r}")
+
+	needs_resize, real_upscale_avg, _, _ = _need_post_resize_batch(width, height, hd_width, hd_height)
+
+	return ResultUpscaled(_np.where(needs_resize, upscale, real_upscale_avg), width, height, hd_width, hd_height)
@@ -0,0 +1,164 @@
+# encoding: utf-8
+"""
+Resolution and batch size for a memory budget: the largest batch of the step-aligned resolution which fits,
+and - if the resolution is allowed to deviate from the desired one - the resolution giving the most images per second.
+
+Memory and time are estimated with a linear cost model, each as ``fixed + batch * (per_image + pixels * per_pixel)``.
+Its coefficients are fitted (least squares) to measurements of an actual model, e.g. with
+``benchmarks/budget_calibration.py``.
+"""
+
+import typing as _t
+
+from math import floor as _floor, log as _log, sqrt as _sqrt
+import sys as _sys
+
+from .enums import *
+from .rounding import (
+	float_width_height_from_area as _float_width_height_from_area,
+	number_to_int as _number_to_int,
+	round_width_and_height as _round_width_and_height,
+)
+
+
+class CostModel(_t.NamedTuple):
+	"""Linear memory (bytes) and time (seconds) model of processing a batch of images."""
+	memory_fixed: float
+	memory_per_image: float
+	memory_per_pixel: float
+	time_fixed: float
+	time_per_image: float
+	time_per_pixel: float
+
+	def memory(self, batch_size: int, pixels: int) -> float:
+		return self.memory_fixed + batch_size * (self.memory_per_image + pixels * self.memory_per_pixel)
+
+	def time(self, batch_size: int, pixels: int) -> float:
+		return self.time_fixed + batch_size * (self.time_per_image + pixels * self.time_per_pixel)
+
+	def max_batch_size(self, pixels: int, memory_budget: float) -> int:
+		"""The largest batch fitting into the budget (0 if even a single image doesn't)."""
+		per_image = self.memory_per_image + pixels * self.memory_per_pixel
+		available = memory_budget - self.memory_fixed
+		if available < 0.0:
+			return 0
+		if per_image <= 0.0:
+			return _sys.maxsize
+		return _floor(available / per_image)
+
+
+class CalibrationSample(_t.NamedTuple):
+	"""A single measurement: a batch of images of this many pixels took this much memory (bytes) and time (seconds)."""
+	batch_size: int
+	pixels: int
+	memory: float
+	time: float
+
+
+class BudgetResult(_t.NamedTuple):
+	width: int
+	height: int
+	batch_size: int
+	images_per_second: float
+	memory: float
+
+
+def _least_squares(rows: _t.Sequence[_t.Sequence[float]], values: _t.Sequence[float]) -> _t.List[float]:
+	"""
+	Coefficients minimizing the squared error of ``rows @ coefficients ≈ values`` - with all the coefficients
+	non-negative (a negative one is dropped, and the rest are re-fitted).
+	"""
+	n = len(rows[0])
+	active = list(range(n))
+	while True:
+		# Normal equations, solved by Gaussian elimination (a few unknowns - no need in NumPy for this):
+		matrix = [[sum(r[i] * r[j] for r in rows) for j in active] for i in active]
+		rhs = [sum(r[i] * v for r, v in zip(rows, values)) for i in active]
+		m = len(active)
+		for col in range(m):
+			pivot = max(range(col, m), key=lambda i_row: abs(matrix[i_row][col]))
+			if abs(matrix[pivot][col]) < 1e-300:
+				raise ValueError("Not enough distinct calibration samples to fit the cost model.")
+			matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+			rhs[col], rhs[pivot] = rhs[pivot], rhs[col]
+			for i_row in range(m):
+				if i_row != col:
+					ratio = matrix[i_row][col] / matrix[col][col]
+					matrix[i_row] = [a - ratio * b for a, b in zip(matrix[i_row], matrix[col])]
+					rhs[i_row] -= ratio * rhs[col]
+		solution = [rhs[i] / matrix[i][i] for i in range(m)]
+		negative = [i for i, x in enumerate(solution) if x < 0.0]
+		if not negative:
+			coefficients = [0.0] * n
+			for i, x in zip(active, solution):
+				coefficients[i] = x
+			return coefficients
+		del active[min(negative, key=lambda i: solution[i])]
+		if not active:
+			return [0.0] * n
+
+
+def fit_cost_model(samples: _t.Iterable[CalibrationSample]) -> CostModel:
+	"""Fit the cost model to measurements (least squares, with relative errors - so small batches matter, too)."""
+	samples = list(samples)
+	if len(samples) < 3:
+		raise ValueError(f"At least 3 calibration samples are needed to fit the cost model, got {len(samples)}.")
+
+	def fit(values: _t.List[float]) -> _t.List[float]:
+		# Each row (and value) is divided by the value: it's the relative error that's minimized.
+		rows = [
+			(1.0 / v, s.batch_size / v, s.batch_size * s.pixels / v)
+			for s, v in zip(samples, values)
+		]
+		return _least_squares(rows, [1.0] * len(values))
+
+	return CostModel(*fit([max(s.memory, 1.0) for s in samples]), *fit([max(s.time, 1e-9) for s in samples]))
+
+
+def solve_budget(
+	square_size: float, landscape: bool, aspect_a: float, aspect_b: float, step: int,
+	memory_budget: float, cost_model: CostModel,
+	area_tolerance: float = 0.0, max_batch_size: int = 64,
+	mode: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+) -> _t.Optional[BudgetResult]:
+	"""
+	The step-aligned resolution (of the given aspect ratio) and the batch size giving the most images per second,
+	within the memory budget. With zero ``area_tolerance``, the resolution is just the one of "area" node;
+	otherwise, all the distinct rounded resolutions with the area within ``±area_tolerance`` are considered.
+	Between equally fast options, the one closer to the desired area wins.
+	``None`` if not even a single image fits.
+	"""
+	step = _number_to_int(step)
+	target_area = float(square_size) * square_size
+	tolerance = min(max(float(area_tolerance), 0.0), 0.99)
+
+	# Square sizes in between are walked with a sub-step increment, so no rounded resolution is missed:
+	min_size = square_size * _sqrt(1.0 - tolerance)
+	max_size = square_size * _sqrt(1.0 + tolerance)
+	n_sizes = int((max_size - min_size) / (step * 0.25)) + 1 if tolerance > 0.0 else 0
+	sizes = [float(square_size)] + [min_size + (max_size - min_size) * i / max(n_sizes, 1) for i in range(n_sizes + 1)]
+
+	seen: _t.Set[_t.Tuple[int, int]] = set()
+	best: _t.Optional[BudgetResult] = None
+	best_key = None
+	for size in sizes:
+		width, _, height, _ = _round_width_and_height(
+			*_float_width_height_from_area(size, landscape, aspect_a, aspect_b), step, mode
+		)
+		if (width, height) in seen:
+			continue
+		seen.add((width, height))
+		pixels = width * height
+		if size != square_size and abs(pixels / target_area - 1.0) > tolerance + 1e-12:
+			continue
+
+		batch_size = min(cost_model.max_batch_size(pixels, memory_budget), max(int(max_batch_size), 1))
+		if batch_size < 1:
+			continue
+		duration = cost_model.time(batch_size, pixels)
+		images_per_second = batch_size / duration if duration > 0.0 else float('inf')
+		key = (-images_per_second, abs(_log(pixels / target_area)))
+		if best_key is None or key < best_key:
+			best_key = key
+			best = BudgetResult(width, height, batch_size, images_per_second, cost_model.memory(batch_size, pixels))
+	return best
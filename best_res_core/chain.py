@@ -0,0 +1,123 @@
+# encoding: utf-8
+"""
+Planning a chain of upscales: initial resolution → stage 1 → ... → the final one, where each stage (hop) has its own
+allowed upscale factors, its own step and its own per-pixel cost (e.g., latent x1.5 + sampling, then model x2,
+then tiled sampling).
+
+The final resolution is rounded to the last stage's step. From it, each stage is back-tracked: the previous
+resolution is the current one divided by an allowed factor, rounded to the previous stage's step (the initial
+resolution - to the initial step). Identical resolutions reached in different ways are merged, keeping only the
+cheapest way (dynamic programming) - so the search doesn't grow exponentially with the number of stages.
+
+The objective is the total number of pixels processed, each stage's pixels weighted by its cost. The initial
+resolution must stay within the tolerance of the model's native area - otherwise, the cheapest chain would
+always be the one starting from the tiniest image.
+"""
+
+import typing as _t
+
+from math import log as _log, sqrt as _sqrt
+
+from .rounding import (
+	number_to_int as _number_to_int,
+	round_width_and_height_closest_to_the_ratio as _round_width_and_height_closest_to_the_ratio,
+)
+
+
+class ChainStage(_t.NamedTuple):
+	"""A single upscale in the chain: allowed factors, the step for the resulting resolution, cost per its pixel."""
+	factors: _t.Tuple[float, ...]
+	step: int
+	cost: float = 1.0
+
+
+class ChainPlan(_t.NamedTuple):
+	"""The planned chain: resolutions (the initial one first, the final one last), factors chosen for each stage."""
+	resolutions: _t.Tuple[_t.Tuple[int, int], ...]
+	factors: _t.Tuple[float, ...]
+	cost: float
+
+
+def parse_stages(text: str) -> _t.Tuple[ChainStage, ...]:
+	"""
+	Stages from text: one per line, as ``factors; step; cost`` - factors separated by commas/spaces, cost optional
+	(1 by default). Empty lines and ``#`` comments are ignored. E.g.:
+
+		1.5, 1.25; 16; 4   # latent upscale + sampling
+		2; 8; 0.5          # upscale model
+	"""
+	stages: _t.List[ChainStage] = list()
+	for i_line, line in enumerate(text.splitlines(), start=1):
+		line = line.split('#', 1)[0].strip()
+		if not line:
+			continue
+		fields = [x.strip() for x in line.split(';')]
+		try:
+			if not 2 <= len(fields) <= 3:
+				raise ValueError("expected 'factors; step; cost'")
+			factors = tuple(float(x) for x in fields[0].replace(',', ' ').split())
+			if not factors or any(x < 1.0 for x in factors):
+				raise ValueError("factors must be 1+")
+			step = int(fields[1])
+			if step < 1:
+				raise ValueError("step must be positive")
+			cost = float(fields[2]) if len(fields) > 2 and fields[2] else 1.0
+			if cost < 0.0:
+				raise ValueError("cost can't be negative")
+		except ValueError as e:
+			raise ValueError(f"Invalid upscale stage at line {i_line} ({line!r}): {e}") from None
+		stages.append(ChainStage(factors, step, cost))
+	return tuple(stages)
+
+
+def plan_chain(
+	final_width_f: float, final_height_f: float, init_step: int, stages: _t.Sequence[ChainStage],
+	init_square_size: float, init_area_tolerance: float = 0.25, init_cost: float = 1.0,
+) -> _t.Optional[ChainPlan]:
+	"""
+	The cheapest chain of step-aligned resolutions, from the initial one (within ``±init_area_tolerance``
+	of ``init_square_size²``) to the final one - or ``None`` if no combination of factors gets there.
+	Between equally cheap chains, the one with the initial area closer to the native one wins.
+	"""
+	init_step = _number_to_int(init_step)
+	target_ratio = float(final_width_f) / final_height_f
+	native_area = float(init_square_size) * init_square_size
+	tolerance = min(max(float(init_area_tolerance), 0.0), 0.99)
+
+	def rounded(width_f: float, height_f: float, step: int) -> _t.Tuple[int, int]:
+		# Each stage aims for the target aspect ratio (with the same area), not the one of the rounded neighbour:
+		area_f = width_f * height_f
+		width, _, height, _ = _round_width_and_height_closest_to_the_ratio(
+			_sqrt(area_f * target_ratio), _sqrt(area_f / target_ratio), step
+		)
+		return width, height
+
+	final = rounded(final_width_f, final_height_f, stages[-1].step if stages else init_step)
+
+	# resolution -> (cost of it and all the following stages, the following resolutions, factors)
+	states: _t.Dict[_t.Tuple[int, int], _t.Tuple[float, tuple, tuple]] = {final: (0.0, (), ())}
+	for i_stage in range(len(stages) - 1, -1, -1):
+		stage = stages[i_stage]
+		prev_step = stages[i_stage - 1].step if i_stage > 0 else init_step
+		prev_states: _t.Dict[_t.Tuple[int, int], _t.Tuple[float, tuple, tuple]] = dict()
+		for (width, height), (cost, following, factors) in states.items():
+			cost += stage.cost * width * height
+			for factor in sorted(set(stage.factors)):
+				prev = rounded(width / factor, height / factor, prev_step)
+				known = prev_states.get(prev)
+				if known is None or cost < known[0]:
+					prev_states[prev] = (cost, ((width, height), ) + following, (factor, ) + factors)
+		states = prev_states
+
+	best: _t.Optional[ChainPlan] = None
+	best_key = None
+	for (width, height), (cost, following, factors) in states.items():
+		area = width * height
+		if abs(area / native_area - 1.0) > tolerance + 1e-12:
+			continue
+		cost += init_cost * area
+		key = (cost, abs(_log(area / native_area)))
+		if best_key is None or key < best_key:
+			best_key = key
+			best = ChainPlan(((width, height), ) + following, factors, cost)
+	return best
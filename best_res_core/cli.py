@@ -0,0 +1,391 @@
+# encoding: utf-8
+"""
+Command-line batch planner: the logic of "area", "area+scale" and "Upscaled Crop/Pad" nodes
+applied to every record of a JSONL/CSV manifest (or to every image in a folder).
+
+Records are streamed: they're read, processed (in chunks, across a process pool) and written one window at a time,
+so the memory use doesn't depend on the size of the manifest. The output keeps the order of the input.
+
+Each input record is a JSON object (or a CSV row) with the same fields as the node's inputs
+(``square_size``, ``step``, ``landscape``, ``aspect_a``, ``aspect_b``, ``rounding``, ``priority``, ``upscale``,
+``HD_step``, ``area_tolerance``, ``aspect_tolerance``, ``init_width``, ``init_height``, ``HD_width``, ``HD_height``,
+``strategy``, ``align_x``, ``align_y``, ``crop_cost``, ``pad_cost``, ``operation_cost``).
+Missing fields are taken from ``--set`` options, then from node defaults. Some are derived from others:
+
+	• With no aspect ratio given, ``init_width`` / ``init_height`` define it (and orientation), if present.
+	• For "crop-pad", with no HD size given, it's ``upscale`` * init size, rounded to ``HD_step``.
+
+So a whole folder can be planned at once:
+
+	python -m best_res_core crop-pad --images ./inputs --set upscale=2 --set HD_step=64 -o plan.csv
+
+The output record is the input one, plus the node's outputs (or an ``error`` field, if the record is invalid).
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from collections import deque as _deque
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from contextlib import ExitStack as _ExitStack, nullcontext as _nullcontext
+from itertools import islice as _islice
+from pathlib import Path as _Path
+import csv as _csv
+import json as _json
+import os as _os
+import sys as _sys
+import time as _time
+
+from .crop_pad import (
+	CropPadCosts as _CropPadCosts,
+	crop_pad_cost as _crop_pad_cost,
+	upscaled_crop_pad as _upscaled_crop_pad,
+)
+from .enums import *
+from .image_size import ImageSizeError as _ImageSizeError, image_size as _image_size, iter_image_files as _iter_image_files
+from .rounding import (
+	float_width_height_from_area as _float_width_height_from_area,
+	number_to_int as _number_to_int,
+	round_width_and_height as _round_width_and_height,
+	simple_result_from_approx_wh as _simple_result_from_approx_wh,
+	upscale_result_from_approx_wh as _upscale_result_from_approx_wh,
+)
+
+_t_record = _t.Dict[str, _t.Any]
+
+
+def _to_bool(value) -> bool:
+	if isinstance(value, str):
+		normalized = value.strip().lower()
+		if normalized in ('1', 'true', 'yes', 'on', 'landscape'):
+			return True
+		if normalized in ('0', 'false', 'no', 'off', 'portrait', ''):
+			return False
+		raise ValueError(f"Not a boolean: {value!r}")
+	return bool(value)
+
+
+def _to_int(value) -> int:
+	return _number_to_int(float(value) if isinstance(value, str) else value)
+
+
+# Field name -> (converter, default). The same defaults as on the nodes.
+_fields: _t.Dict[str, _t.Tuple[_t.Callable[[_t.Any], _t.Any], _t.Any]] = {
+	'square_size': (_to_int, 1024),
+	'step': (_to_int, 8*2*3),
+	'landscape': (_to_bool, True),
+	'aspect_a': (float, 16.0),
+	'aspect_b': (float, 9.0),
+	'rounding': (RoundingMode, RoundingMode.HEURISTIC),
+	'priority': (RoundingPriority, RoundingPriority.ORIGINAL),
+	'upscale': (float, 1.5),
+	'HD_step': (_to_int, 8*2*3*3),
+	'area_tolerance': (float, 10.0),
+	'aspect_tolerance': (float, 2.0),
+	'init_width': (_to_int, None),
+	'init_height': (_to_int, None),
+	'HD_width': (_to_int, None),
+	'HD_height': (_to_int, None),
+	'strategy': (UpscaledCropPadStrategy, UpscaledCropPadStrategy.PAD),
+	'align_x': (float, 0.5),
+	'align_y': (float, 0.0),
+	'crop_cost': (float, _CropPadCosts._field_defaults['crop_pixel']),
+	'pad_cost': (float, _CropPadCosts._field_defaults['pad_pixel']),
+	'operation_cost': (float, _CropPadCosts._field_defaults['operation']),
+}
+
+
+class _Args:
+	"""Converted node arguments for a single record: explicit values, then ``--set`` ones, then defaults."""
+	__slots__ = ('_record', '_overrides')
+
+	def __init__(self, record: _t_record, overrides: _t_record):
+		self._record = record
+		self._overrides = overrides
+
+	def has(self, name: str) -> bool:
+		return self._raw(name) is not None
+
+	def _raw(self, name: str):
+		value = self._record.get(name)
+		if value is None or value == '':
+			value = self._overrides.get(name)
+		return value
+
+	def __getitem__(self, name: str):
+		converter, default = _fields[name]
+		value = self._raw(name)
+		if value is None:
+			if default is None:
+				raise KeyError(f"Missing field: {name}")
+			return default
+		try:
+			return converter(value)
+		except ValueError as e:
+			raise ValueError(f"Invalid {name}: {e}")
+
+
+def _approx_wh_from_area(args: _Args) -> _t.Tuple[float, float]:
+	if not (args.has('aspect_a') or args.has('aspect_b')) and args.has('init_width') and args.has('init_height'):
+		init_w, init_h = args['init_width'], args['init_height']
+		return _float_width_height_from_area(args['square_size'], init_w >= init_h, init_w, init_h)
+	return _float_width_height_from_area(args['square_size'], args['landscape'], args['aspect_a'], args['aspect_b'])
+
+
+def _op_area(args: _Args) -> _t_record:
+	width_f, height_f = _approx_wh_from_area(args)
+	result = _simple_result_from_approx_wh(width_f, height_f, args['step'], args['rounding'])
+	return {'width': result.width, 'height': result.height}
+
+
+def _op_area_upscale(args: _Args) -> _t_record:
+	width_f, height_f = _approx_wh_from_area(args)
+	result = _upscale_result_from_approx_wh(
+		width_f, height_f, args['step'], args['priority'], args['upscale'], args['HD_step'], args['rounding'],
+		args['area_tolerance'] / 100.0, args['aspect_tolerance'] / 100.0,
+	)
+	return {
+		'upscale': result.upscale,
+		'init_width': result.init_width, 'init_height': result.init_height,
+		'HD_width': result.hd_width, 'HD_height': result.hd_height,
+	}
+
+
+def _op_crop_pad(args: _Args) -> _t_record:
+	init_w, init_h = args['init_width'], args['init_height']
+	upscale = max(args['upscale'], 1.0)
+	out: _t_record = dict()
+	if args.has('HD_width') and args.has('HD_height'):
+		hd_w, hd_h = args['HD_width'], args['HD_height']
+	else:
+		hd_w, _, hd_h, _ = _round_width_and_height(
+			upscale * init_w, upscale * init_h, args['HD_step'], args['rounding']
+		)
+		out.update(HD_width=hd_w, HD_height=hd_h)
+
+	costs = _CropPadCosts(args['crop_cost'], args['pad_cost'], args['operation_cost'])
+	result = _upscaled_crop_pad(
+		upscale, init_w, init_h, hd_w, hd_h, args['strategy'], args['align_x'], args['align_y'], costs
+	)
+	out.update(
+		upscale=result.upscale,
+		do_crop=result.do_crop,
+		crop_width=result.crop_width, crop_height=result.crop_height,
+		crop_x=result.crop_x_origin, crop_y=result.crop_y_origin,
+		do_padding=result.do_padding,
+		pad_left=result.pad_left, pad_top=result.pad_top, pad_right=result.pad_right, pad_bottom=result.pad_bottom,
+		cost=_crop_pad_cost(init_w, init_h, result, costs),
+	)
+	return out
+
+
+operations: _t.Dict[str, _t.Callable[[_Args], _t_record]] = {
+	'area': _op_area,
+	'area-upscale': _op_area_upscale,
+	'crop-pad': _op_crop_pad,
+}
+
+# The output fields of each operation, in order (for CSV header):
+_output_fields: _t.Dict[str, _t.Tuple[str, ...]] = {
+	'area': ('width', 'height'),
+	'area-upscale': ('upscale', 'init_width', 'init_height', 'HD_width', 'HD_height'),
+	'crop-pad': (
+		'HD_width', 'HD_height', 'upscale',
+		'do_crop', 'crop_width', 'crop_height', 'crop_x', 'crop_y',
+		'do_padding', 'pad_left', 'pad_top', 'pad_right', 'pad_bottom', 'cost',
+	),
+}
+
+
+def process_record(operation: str, record: _t_record, overrides: _t_record = None) -> _t_record:
+	"""Apply the operation to a single record. Errors don't raise, but are reported in the ``error`` field."""
+	out = dict(record)
+	if out.get('error'):
+		# Already failed upstream (e.g., an unreadable image):
+		return out
+	try:
+		out.update(operations[operation](_Args(record, overrides or dict())))
+	except (KeyError, ValueError, TypeError, ZeroDivisionError) as e:
+		out['error'] = str(e.args[0]) if isinstance(e, KeyError) and e.args else str(e)
+	return out
+
+
+def process_chunk(operation: str, records: _t.List[_t_record], overrides: _t_record = None) -> _t.List[_t_record]:
+	return [process_record(operation, x, overrides) for x in records]
+
+
+def _chunked(records: _t.Iterable[_t_record], chunk_size: int) -> _t.Iterator[_t.List[_t_record]]:
+	records = iter(records)
+	while True:
+		chunk = list(_islice(records, chunk_size))
+		if not chunk:
+			return
+		yield chunk
+
+
+def process_stream(
+	operation: str, records: _t.Iterable[_t_record], overrides: _t_record = None,
+	jobs: int = 1, chunk_size: int = 1024,
+) -> _t.Iterator[_t_record]:
+	"""
+	Lazily process records, keeping their order. With ``jobs > 1``, chunks are processed in a process pool,
+	with at most ``2 * jobs`` chunks in flight - so the memory stays bounded for an input of any size.
+	"""
+	if operation not in operations:
+		raise ValueError(f"Unknown operation: {operation!r}. Expected one of: {', '.join(operations)}")
+	chunks = _chunked(records, max(chunk_size, 1))
+	if jobs < 2:
+		for chunk in chunks:
+			yield from process_chunk(operation, chunk, overrides)
+		return
+
+	with _ProcessPoolExecutor(jobs) as pool:
+		in_flight = _deque()
+		for chunk in chunks:
+			in_flight.append(pool.submit(process_chunk, operation, chunk, overrides))
+			if len(in_flight) >= 2 * jobs:
+				yield from in_flight.popleft().result()
+		while in_flight:
+			yield from in_flight.popleft().result()
+
+
+# ----------------------------------------------------------
+# Input / output
+
+
+def _detect_format(path: str, explicit: str = None) -> str:
+	if explicit:
+		return explicit
+	return 'csv' if path and path != '-' and _Path(path).suffix.lower() in ('.csv', '.tsv') else 'jsonl'
+
+
+def read_jsonl(f: _t.TextIO) -> _t.Iterator[_t_record]:
+	for line_i, line in enumerate(f, start=1):
+		line = line.strip()
+		if not line:
+			continue
+		try:
+			record = _json.loads(line)
+		except ValueError as e:
+			yield {'line': line_i, 'error': f"Invalid JSON: {e}"}
+			continue
+		if not isinstance(record, dict):
+			yield {'line': line_i, 'error': "A record must be a JSON object"}
+			continue
+		yield record
+
+
+def read_csv(f: _t.TextIO) -> _t.Iterator[_t_record]:
+	yield from _csv.DictReader(f)
+
+
+def read_images(folder: str, recursive: bool = False) -> _t.Iterator[_t_record]:
+	"""A record per image in the folder: its path and size (read from the header only)."""
+	for path in _iter_image_files(folder, recursive):
+		record: _t_record = {'path': str(path)}
+		try:
+			record['init_width'], record['init_height'] = _image_size(path)
+		except (OSError, _ImageSizeError) as e:
+			record['error'] = f"Can't read image size: {e}"
+		yield record
+
+
+class _CsvWriter:
+	"""Writes dicts as CSV rows. The header is built from the first record + the operation's output fields."""
+
+	def __init__(self, f: _t.TextIO, output_fields: _t.Sequence[str]):
+		self._f = f
+		self._output_fields = output_fields
+		self._writer: _t.Optional[_csv.DictWriter] = None
+
+	def write(self, record: _t_record):
+		if self._writer is None:
+			fieldnames = list(record.keys())
+			fieldnames.extend(x for x in self._output_fields if x not in record)
+			if 'error' not in fieldnames:
+				fieldnames.append('error')
+			self._writer = _csv.DictWriter(self._f, fieldnames, restval='', extrasaction='ignore')
+			self._writer.writeheader()
+		self._writer.writerow(record)
+
+
+class _JsonlWriter:
+	def __init__(self, f: _t.TextIO):
+		self._f = f
+
+	def write(self, record: _t_record):
+		self._f.write(_json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _open_text(path: str, mode: str) -> _t.ContextManager[_t.TextIO]:
+	if not path or path == '-':
+		# Don't let the caller close the standard stream:
+		return _nullcontext(_sys.stdin if 'r' in mode else _sys.stdout)
+	return open(path, mode, encoding='utf-8', newline='')
+
+
+def _parse_overrides(pairs: _t.Sequence[str]) -> _t_record:
+	overrides: _t_record = dict()
+	for pair in pairs or ():
+		name, sep, value = pair.partition('=')
+		name = name.strip()
+		if not sep or name not in _fields:
+			raise ValueError(f"Invalid --set value: {pair!r}. Expected: FIELD=VALUE, with FIELD one of: {', '.join(_fields)}")
+		converter, _ = _fields[name]
+		converter(value)  # Validate right away, not for each record
+		overrides[name] = value
+	return overrides
+
+
+def main(args: _t.Sequence[str] = None) -> int:
+	parser = _ArgumentParser(
+		prog='python -m best_res_core',
+		description=__doc__.strip().split('\n\n')[0],
+	)
+	parser.add_argument('operation', choices=tuple(operations))
+	source = parser.add_mutually_exclusive_group()
+	source.add_argument('--input', '-i', default='-', help="JSONL/CSV manifest (default: stdin).")
+	source.add_argument('--images', help="Folder with images: a record per image, with its size read from the header.")
+	parser.add_argument('--recursive', '-r', action='store_true', help="With --images: look into sub-folders, too.")
+	parser.add_argument('--output', '-o', default='-', help="JSONL/CSV output (default: stdout).")
+	parser.add_argument('--input-format', choices=('jsonl', 'csv'), help="Default: by file extension, JSONL otherwise.")
+	parser.add_argument('--output-format', choices=('jsonl', 'csv'), help="Default: by file extension, JSONL otherwise.")
+	parser.add_argument(
+		'--set', '-s', action='append', metavar='FIELD=VALUE', dest='overrides',
+		help="Value for the field missing in a record (instead of node default). Can be used multiple times."
+	)
+	parser.add_argument('--jobs', '-j', type=int, default=_os.cpu_count() or 1, help="Worker processes (1: no pool).")
+	parser.add_argument('--chunk-size', type=int, default=1024, help="Records per task sent to a worker.")
+	parsed = parser.parse_args(args)
+
+	try:
+		overrides = _parse_overrides(parsed.overrides)
+	except ValueError as e:
+		parser.error(str(e))
+
+	start_time = _time.perf_counter()
+	n_total = n_errors = 0
+	with _ExitStack() as stack:
+		if parsed.images:
+			records = read_images(parsed.images, parsed.recursive)
+		else:
+			in_f = stack.enter_context(_open_text(parsed.input, 'rt'))
+			records = read_csv(in_f) if _detect_format(parsed.input, parsed.input_format) == 'csv' else read_jsonl(in_f)
+
+		out_f = stack.enter_context(_open_text(parsed.output, 'wt'))
+		writer = (
+			_CsvWriter(out_f, _output_fields[parsed.operation])
+			if _detect_format(parsed.output, parsed.output_format) == 'csv'
+			else _JsonlWriter(out_f)
+		)
+		for record in process_stream(parsed.operation, records, overrides, parsed.jobs, parsed.chunk_size):
+			writer.write(record)
+			n_total += 1
+			if record.get('error'):
+				n_errors += 1
+
+	print(
+		f"{n_total} records, {n_errors} errors, {_time.perf_counter() - start_time:.2f} s",
+		file=_sys.stderr
+	)
+	return 1 if n_errors else 0
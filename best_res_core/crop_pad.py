@@ -0,0 +1,326 @@
+# encoding: utf-8
+"""
+Planning for "Upscaled Crop/Pad" node: how to crop/pad the upscaled image to get the exact HD resolution.
+"""
+
+import typing as _t
+
+from ._dataclass import dataclass_with_slots_if_possible as _dataclass_with_slots_if_possible
+from .enums import *
+from .return_tuples import *
+from .rounding import round_pos_int as _round_pos_int, need_post_resize as _need_post_resize
+
+
+class CropPadCosts(_t.NamedTuple):
+	"""
+	Cost model for ``min cost`` strategy: the cost of each cropped (i.e., generated, then discarded) pixel,
+	of each padded (out-painted) pixel, and the fixed cost of doing a crop / a pad at all. Only the ratios matter.
+	"""
+	crop_pixel: float = 1.0
+	pad_pixel: float = 50.0
+	operation: float = 0.0
+
+
+@_dataclass_with_slots_if_possible
+class _CropPadInput:
+	"""
+	For the ease of passing between the functions, the entire set of inputs for "Upscaled Crop/Pad" node
+	is internally turned into a dataclass.
+	"""
+	upscale: float
+
+	init_w: int
+	init_h: int
+	hd_w: int
+	hd_h: int
+
+	strategy: str
+	align_x: float
+	align_y: float
+
+	costs: CropPadCosts = CropPadCosts()
+
+
+def _upscaled_crop_xy_offset(extra_w: int, extra_h: int, align_x: float, align_y: float):
+	crop_x_origin = _round_pos_int(align_x * extra_w)
+	crop_y_origin = _round_pos_int((1.0 - align_y) * extra_h)
+	return crop_x_origin, crop_y_origin
+
+
+def _upscaled_crop(_in: _CropPadInput, real_upscale: float) -> ResultUpscaledCropPad:
+	raw_upscaled_w = _round_pos_int(real_upscale * _in.init_w)
+	raw_upscaled_h = _round_pos_int(real_upscale * _in.init_h)
+	extra_w = max(raw_upscaled_w - _in.hd_w, 0)
+	extra_h = max(raw_upscaled_h - _in.hd_h, 0)
+	crop_x_offset, crop_y_offset = _upscaled_crop_xy_offset(extra_w, extra_h, _in.align_x, _in.align_y)
+	return ResultUpscaledCropPad(
+		real_upscale,
+		True, _in.hd_w, _in.hd_h, crop_x_offset, crop_y_offset,
+		False, 0, 0, 0, 0,
+	)
+
+
+def _upscaled_pad_side_values(extra_w: int, extra_h: int, align_x: float, align_y: float):
+	pad_left = _round_pos_int(align_x * extra_w)
+	pad_right = extra_w - pad_left
+	pad_bottom = _round_pos_int(align_y * extra_h)
+	pad_top = extra_h - pad_bottom
+	return pad_left, pad_top, pad_right, pad_bottom
+
+
+def _upscaled_pad(_in: _CropPadInput, real_upscale: float) -> ResultUpscaledCropPad:
+	raw_upscaled_w = _round_pos_int(real_upscale * _in.init_w)
+	raw_upscaled_h = _round_pos_int(real_upscale * _in.init_h)
+	pad_w = max(_in.hd_w - raw_upscaled_w, 0)
+	pad_h = max(_in.hd_h - raw_upscaled_h, 0)
+	return ResultUpscaledCropPad(
+		real_upscale,
+		False, raw_upscaled_w, raw_upscaled_h, 0, 0,
+		True, *_upscaled_pad_side_values(pad_w, pad_h, _in.align_x, _in.align_y),
+	)
+
+
+def _upscaled_crop_delta_pixels(_in: _CropPadInput, result: ResultUpscaledCropPad) -> int:
+	"""Calculate the area of total cropped patch for crop-only mode."""
+	raw_upscaled_w = _round_pos_int(result.upscale * _in.init_w)
+	raw_upscaled_h = _round_pos_int(result.upscale * _in.init_h)
+	cropped_w = min(result.crop_width, raw_upscaled_w)
+	cropped_h = min(result.crop_height, raw_upscaled_h)
+	return abs(raw_upscaled_w * raw_upscaled_h - cropped_w * cropped_h)
+
+
+def _upscaled_pad_delta_pixels(_in: _CropPadInput, result: ResultUpscaledCropPad) -> int:
+	"""Calculate the area of total out-painted patch for pad-only mode."""
+	raw_upscaled_w = _round_pos_int(result.upscale * _in.init_w)
+	raw_upscaled_h = _round_pos_int(result.upscale * _in.init_h)
+	padded_w = raw_upscaled_w + max(result.pad_left, 0) + max(result.pad_right, 0)
+	padded_h = raw_upscaled_h + max(result.pad_top, 0) + max(result.pad_bottom, 0)
+	return abs(padded_w * padded_h - raw_upscaled_w * raw_upscaled_h)
+
+
+def _upscaled_crop_pad(_in: _CropPadInput) -> ResultUpscaledCropPad:
+	"""The actual function for "Upscaled Crop/Pad" node, with all the inputs packed into a single dataclass."""
+	needs_resize, real_upscale_avg, real_upscale_x, real_upscale_y = _need_post_resize(_in.init_w, _in.init_h, _in.hd_w, _in.hd_h)
+	if not needs_resize:
+		return ResultUpscaledCropPad(
+			real_upscale_avg,
+			False, _in.hd_w, _in.hd_h, 0, 0,
+			False, 0, 0, 0, 0,
+		)
+
+	_in.align_x = min(max(_in.align_x, 0.0), 1.0)
+	_in.align_y = min(max(_in.align_y, 0.0), 1.0)
+
+	if _in.strategy == UpscaledCropPadStrategy.CROP:
+		return _upscaled_crop(_in, max(real_upscale_x, real_upscale_y))
+
+	if _in.strategy == UpscaledCropPadStrategy.PAD:
+		return _upscaled_pad(_in, min(real_upscale_x, real_upscale_y))
+
+	if _in.strategy == UpscaledCropPadStrategy.NEAREST:
+		crop_result = _upscaled_crop(_in, max(real_upscale_x, real_upscale_y))
+		pad_result = _upscaled_pad(_in, min(real_upscale_x, real_upscale_y))
+		return (
+			pad_result
+			if _upscaled_pad_delta_pixels(_in, pad_result) < _upscaled_crop_delta_pixels(_in, crop_result)
+			else crop_result
+		)
+
+	if _in.strategy == UpscaledCropPadStrategy.MIN_COST:
+		return _upscaled_min_cost(_in, min(real_upscale_x, real_upscale_y), max(real_upscale_x, real_upscale_y))
+
+	assert _in.strategy == UpscaledCropPadStrategy.EXACT_UPSCALE
+	return _upscaled_exact(_in, _in.upscale)
+
+
+def _upscaled_exact(_in: _CropPadInput, upscale: float) -> ResultUpscaledCropPad:
+	"""Follow the given upscale precisely, then crop and/or pad - whatever is needed to get the HD resolution."""
+	raw_upscaled_w = _round_pos_int(upscale * _in.init_w)
+	raw_upscaled_h = _round_pos_int(upscale * _in.init_h)
+	# We're in the most complex case. These ^ can be both below and above the target up-res.
+	# So, we need to follow the whole upscale->crop->pad chain: we'll just get zeroes where there will be nothing to do.
+
+	cropped_w = min(_in.hd_w, raw_upscaled_w)
+	cropped_h = min(_in.hd_h, raw_upscaled_h)
+	crop_extra_w = raw_upscaled_w - cropped_w
+	crop_extra_h = raw_upscaled_h - cropped_h
+	crop_x_offset, crop_y_offset = _upscaled_crop_xy_offset(crop_extra_w, crop_extra_h, _in.align_x, _in.align_y)
+
+	pad_extra_w = _in.hd_w - cropped_w
+	pad_extra_h = _in.hd_h - cropped_h
+	pad_side_values = _upscaled_pad_side_values(pad_extra_w, pad_extra_h, _in.align_x, _in.align_y)
+	return ResultUpscaledCropPad(
+		upscale,
+		crop_extra_w > 0 or crop_extra_h > 0, cropped_w, cropped_h, crop_x_offset, crop_y_offset,
+		pad_extra_w > 0 or pad_extra_h > 0, *pad_side_values,
+	)
+
+
+def crop_pad_pixels(init_w: int, init_h: int, result: ResultUpscaledCropPad) -> _t.Tuple[int, int]:
+	"""The number of pixels the plan crops away and out-paints, respectively."""
+	raw_upscaled_w = _round_pos_int(result.upscale * init_w)
+	raw_upscaled_h = _round_pos_int(result.upscale * init_h)
+	kept_w = min(result.crop_width, raw_upscaled_w) if result.do_crop else raw_upscaled_w
+	kept_h = min(result.crop_height, raw_upscaled_h) if result.do_crop else raw_upscaled_h
+	kept = kept_w * kept_h
+	if not result.do_padding:
+		return raw_upscaled_w * raw_upscaled_h - kept, 0
+	out_w = kept_w + max(result.pad_left, 0) + max(result.pad_right, 0)
+	out_h = kept_h + max(result.pad_top, 0) + max(result.pad_bottom, 0)
+	return raw_upscaled_w * raw_upscaled_h - kept, out_w * out_h - kept
+
+
+def crop_pad_cost(init_w: int, init_h: int, result: ResultUpscaledCropPad, costs: CropPadCosts = None) -> float:
+	"""The estimated cost of the plan, by the cost model."""
+	costs = CropPadCosts() if costs is None else costs
+	cropped, padded = crop_pad_pixels(init_w, init_h, result)
+	return (
+		costs.crop_pixel * cropped + costs.pad_pixel * padded
+		+ costs.operation * (int(cropped > 0) + int(padded > 0))
+	)
+
+
+def _upscaled_min_cost(_in: _CropPadInput, upscale_min: float, upscale_max: float) -> ResultUpscaledCropPad:
+	"""
+	Try each uniform upscale from the pad-only one to the crop-only one, and pick the cheapest plan.
+
+	Plans only change where a rounded side of the upscaled image does: at ``(size ± 0.5) / init_size``.
+	So it's enough to check a single upscale between each two such thresholds - preferably, the one which gives
+	an integer side exactly.
+	"""
+	thresholds = [upscale_min, upscale_max]
+	exact = list()
+	for init_size in (_in.init_w, _in.init_h):
+		for size in range(_round_pos_int(upscale_min * init_size), _round_pos_int(upscale_max * init_size) + 1):
+			thresholds.append((size + 0.5) / init_size)
+			exact.append(size / init_size)
+	thresholds = sorted(x for x in thresholds if upscale_min <= x <= upscale_max)
+	exact = sorted(x for x in exact if upscale_min <= x <= upscale_max)
+
+	candidates = [upscale_min, upscale_max]
+	i_exact = 0
+	for low, high in zip(thresholds, thresholds[1:]):
+		while i_exact < len(exact) and exact[i_exact] < low:
+			i_exact += 1
+		has_exact = i_exact < len(exact) and exact[i_exact] < high
+		candidates.append(exact[i_exact] if has_exact else (low + high) * 0.5)
+
+	best, best_cost = None, None
+	# Sorted: between equally cheap plans, the smallest upscale (i.e., the least pixels to sample) wins.
+	for upscale in sorted(set(candidates)):
+		result = _upscaled_exact(_in, upscale)
+		cost = crop_pad_cost(_in.init_w, _in.init_h, result, _in.costs)
+		if best_cost is None or cost < best_cost:
+			best, best_cost = result, cost
+	return best
+
+
+def upscaled_crop_pad(
+	upscale: float,
+	init_w: int, init_h: int, hd_w: int, hd_h: int,
+	strategy: _t.Union[UpscaledCropPadStrategy, str],
+	align_x: float, align_y: float,
+	costs: CropPadCosts = None,
+) -> ResultUpscaledCropPad:
+	"""
+	Detect, whether some cropping/out-painting needs to be done after upscaling the original image.
+	And if so - what are the values for them.
+
+	``costs`` are only used by ``min cost`` strategy.
+	"""
+	# noinspection PyArgumentList
+	return _upscaled_crop_pad(_CropPadInput(
+		upscale,
+		init_w, init_h, hd_w, hd_h,
+		strategy,
+		align_x, align_y,
+		CropPadCosts() if costs is None else CropPadCosts(*costs),
+	))
+
+
+class CropPadLayout(_t.NamedTuple):
+	"""
+	Pixel geometry of applying a crop/pad plan to an actual image: the size it's scaled to, the crop region
+	within the scaled image, and where this region goes in the output.
+	"""
+	scaled_width: int
+	scaled_height: int
+	crop_x: int
+	crop_y: int
+	crop_width: int
+	crop_height: int
+	out_width: int
+	out_height: int
+	paste_x: int
+	paste_y: int
+
+
+def crop_pad_layout(plan: ResultUpscaledCropPad, width: int, height: int) -> CropPadLayout:
+	"""
+	Turn the plan (from ``upscaled_crop_pad()``) into the pixel geometry for the actual image.
+
+	The scaled size is the same as the plan expects for the initial image. Only if the crop region doesn't fit
+	into it (the scaled size is a pixel short, due to rounding - or the image isn't the initial size),
+	the image is scaled just enough to contain it.
+	"""
+	crop_w = max(int(plan.crop_width), 1)
+	crop_h = max(int(plan.crop_height), 1)
+	crop_x = max(int(plan.crop_x_origin), 0) if plan.do_crop else 0
+	crop_y = max(int(plan.crop_y_origin), 0) if plan.do_crop else 0
+	scaled_w = max(_round_pos_int(plan.upscale * width), crop_x + crop_w)
+	scaled_h = max(_round_pos_int(plan.upscale * height), crop_y + crop_h)
+
+	pad_left, pad_top, pad_right, pad_bottom = (
+		(max(plan.pad_left, 0), max(plan.pad_top, 0), max(plan.pad_right, 0), max(plan.pad_bottom, 0))
+		if plan.do_padding else (0, 0, 0, 0)
+	)
+	return CropPadLayout(
+		scaled_w, scaled_h,
+		crop_x, crop_y, crop_w, crop_h,
+		crop_w + pad_left + pad_right, crop_h + pad_top + pad_bottom,
+		pad_left, pad_top,
+	)
+
+
+def latent_crop_pad_layout(
+	plan: ResultUpscaledCropPad, latent_width: int, latent_height: int, factor: int = 8, snap: bool = True,
+) -> _t.Tuple[CropPadLayout, bool]:
+	"""
+	The same as ``crop_pad_layout()``, but in latent units: for a latent of the given size, with the VAE
+	downsampling the image by ``factor``. Returns the layout and whether it had to be snapped.
+
+	If ``HD_step`` (and ``step``, for the initial resolution) are multiples of the factor, the HD size is divisible,
+	but crop offsets and paddings might still be not. Then, with ``snap``, each value is rounded to the latent grid
+	(keeping the output size as close to HD as the grid allows) - otherwise, it's an error.
+	"""
+	factor = max(int(factor), 1)
+	px = crop_pad_layout(plan, latent_width * factor, latent_height * factor)
+	if all(
+		x % factor == 0 for x in (
+			px.scaled_width, px.scaled_height, px.crop_x, px.crop_y, px.crop_width, px.crop_height,
+			px.out_width, px.out_height, px.paste_x, px.paste_y,
+		)
+	):
+		return CropPadLayout(*(x // factor for x in px)), False
+
+	if not snap:
+		raise ValueError(
+			f"The crop/pad plan isn't divisible by the latent factor {factor}: {px}\n"
+			f"Use `HD_step` (and `step`) which are multiples of {factor}, or enable snapping."
+		)
+
+	def snap_axis(scaled: int, crop_pos: int, crop_size: int, out_size: int, paste_pos: int):
+		out_l = max(_round_pos_int(out_size / factor), 1)
+		crop_size_l = min(max(_round_pos_int(crop_size / factor), 1), out_l)
+		paste_l = min(_round_pos_int(paste_pos / factor), out_l - crop_size_l)
+		crop_pos_l = _round_pos_int(crop_pos / factor)
+		scaled_l = max(_round_pos_int(scaled / factor), crop_pos_l + crop_size_l)
+		return scaled_l, crop_pos_l, crop_size_l, out_l, paste_l
+
+	scaled_w, crop_x, crop_w, out_w, paste_x = snap_axis(
+		px.scaled_width, px.crop_x, px.crop_width, px.out_width, px.paste_x
+	)
+	scaled_h, crop_y, crop_h, out_h, paste_y = snap_axis(
+		px.scaled_height, px.crop_y, px.crop_height, px.out_height, px.paste_y
+	)
+	return CropPadLayout(scaled_w, scaled_h, crop_x, crop_y, crop_w, crop_h, out_w, out_h, paste_x, paste_y), True
@@ -5,10 +5,15 @@
 
 import typing as _t
 
+from enum import Enum as _Enum
+
 try:
 	from enum import StrEnum as _StrEnum
 except ImportError:
-	from comfy.comfy_types.node_typing import StrEnum as _StrEnum
+	# Python < 3.11. Not taken from ComfyUI to keep the core importable without it.
+	class _StrEnum(str, _Enum):
+		def __str__(self):
+			return self.value
 
 
 class __BaseEnum(_StrEnum):
@@ -30,10 +35,29 @@ class RoundingPriority(__BaseEnum):
 	initial size as much as possible.
 	• upscaled - vice versa: first, the rounded upscaled resolution is calculated;
 	then, the initial one back-tracked from it.
+	• exact-uniform - both resolutions are searched together, so that the upscaled one is EXACTLY the initial one
+	scaled uniformly (no crop/out-paint is ever needed). The upscale factor, area and aspect ratio may deviate
+	from the desired ones - within the given tolerances. If there's no such pair, it works as 'desired'.
 	"""
 	DESIRED = 'desired'
 	ORIGINAL = 'original'
 	UPSCALED = 'upscaled'
+	EXACT_UNIFORM = 'exact-uniform'
+
+
+class RoundingMode(__BaseEnum):
+	"""
+	How the approximate resolution is rounded to the step:
+
+
+	• 3-pass - the default fast heuristic: direct rounding of both sides, plus two attempts to calculate each side
+	from another one, already rounded. The option closest to the desired aspect ratio wins.
+	• optimal - search through all the step-multiples in a small window around the desired resolution.
+	The one closest to the desired aspect ratio wins, and between equally close ones - the one closest
+	to the desired area. Never worse than 3-pass.
+	"""
+	HEURISTIC = '3-pass'
+	OPTIMAL = 'optimal'
 
 
 class UpscaledCropPadStrategy(__BaseEnum):
@@ -48,6 +72,9 @@ class UpscaledCropPadStrategy(__BaseEnum):
 	• nearest - automatically choose one of the above, to crop/pad the least number of pixels (by area).
 	• exact-upscale - follow the provided upscale-value precisely. This is the only option
 	that uses it. Also, it's the only one that might require both outpainting and crop.
+	• min cost - try every uniform upscale between the crop-only and pad-only ones, and pick the cheapest plan
+	by the given costs: of a cropped pixel, of an out-painted pixel, and of each operation (crop/pad) itself.
+	Might also require both crop and outpainting.
 
 	In case when both are required, the output values assume this order: upscale -> crop -> pad.
 	"""
@@ -55,3 +82,4 @@ class UpscaledCropPadStrategy(__BaseEnum):
 	CROP = 'crop only'
 	NEAREST = 'nearest'
 	EXACT_UPSCALE = 'exact-upscale'
+	MIN_COST = 'min cost'
@@ -0,0 +1,173 @@
+# encoding: utf-8
+"""
+Image dimensions, read from file headers only - without decoding (or even reading) the pixel data.
+
+Supported formats: PNG, JPEG, GIF, BMP, WebP. For JPEG, EXIF orientation is respected (width and height are swapped
+for rotated images), the same way ComfyUI's "Load Image" node does it.
+"""
+
+import typing as _t
+
+from pathlib import Path as _Path
+import os as _os
+import struct as _struct
+
+image_extensions: _t.FrozenSet[str] = frozenset((
+	'.png', '.apng', '.jpg', '.jpeg', '.jpe', '.jfif', '.gif', '.bmp', '.dib', '.webp',
+))
+
+_t_path = _t.Union[str, _os.PathLike]
+_t_file = _t.BinaryIO
+
+# How many bytes to read at once when looking for JPEG's SOF segment:
+_head_size = 64
+
+
+class ImageSizeError(ValueError):
+	"""The file isn't an image in any of the supported formats, or its header is broken."""
+	pass
+
+
+def _read_exact(f: _t_file, size: int) -> bytes:
+	data = f.read(size)
+	if len(data) != size:
+		raise ImageSizeError("Unexpected end of file")
+	return data
+
+
+def _png_size(head: bytes, f: _t_file) -> _t.Tuple[int, int]:
+	# 8-byte signature, then IHDR chunk: length (4), type (4), width (4), height (4)
+	if head[12:16] != b'IHDR':
+		raise ImageSizeError("PNG without IHDR chunk")
+	return _struct.unpack('>II', head[16:24])
+
+
+def _gif_size(head: bytes, f: _t_file) -> _t.Tuple[int, int]:
+	return _struct.unpack('<HH', head[6:10])
+
+
+def _bmp_size(head: bytes, f: _t_file) -> _t.Tuple[int, int]:
+	header_size = _struct.unpack('<I', head[14:18])[0]
+	if header_size == 12:
+		# OS/2 BITMAPCOREHEADER
+		return _struct.unpack('<HH', head[18:22])
+	width, height = _struct.unpack('<ii', head[18:26])
+	# Negative height means top-down bitmap:
+	return abs(width), abs(height)
+
+
+def _webp_size(head: bytes, f: _t_file) -> _t.Tuple[int, int]:
+	chunk = head[12:16]
+	if chunk == b'VP8 ':
+		# Lossy: frame tag (3), start code (3), then 14-bit width and height
+		width, height = _struct.unpack('<HH', head[26:30])
+		return width & 0x3FFF, height & 0x3FFF
+	if chunk == b'VP8L':
+		# Lossless: signature byte, then 14-bit width-1 and height-1, packed
+		bits = _struct.unpack('<I', head[21:25])[0]
+		return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+	if chunk == b'VP8X':
+		# Extended: flags (4), then 24-bit canvas width-1 and height-1
+		width = int.from_bytes(head[24:27], 'little') + 1
+		height = int.from_bytes(head[27:30], 'little') + 1
+		return width, height
+	raise ImageSizeError(f"Unknown WebP chunk: {chunk!r}")
+
+
+def _exif_orientation(exif: bytes) -> int:
+	"""Orientation tag from APP1 segment payload (or 1 if there's none)."""
+	if exif[:6] != b'Exif\x00\x00':
+		return 1
+	tiff = exif[6:]
+	byte_order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+	if byte_order is None or len(tiff) < 8:
+		return 1
+	ifd_offset = _struct.unpack(byte_order + 'I', tiff[4:8])[0]
+	if ifd_offset + 2 > len(tiff):
+		return 1
+	n_entries = _struct.unpack(byte_order + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+	for i in range(n_entries):
+		entry_start = ifd_offset + 2 + i * 12
+		entry = tiff[entry_start:entry_start + 12]
+		if len(entry) < 12:
+			break
+		tag, value_type = _struct.unpack(byte_order + 'HH', entry[:4])
+		if tag == 0x0112 and value_type == 3:  # Orientation, SHORT
+			return _struct.unpack(byte_order + 'H', entry[8:10])[0]
+	return 1
+
+
+# SOF markers, carrying the frame size (all of C0..CF, except DHT, JPG and DAC):
+_jpeg_sof_markers = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a payload:
+_jpeg_standalone_markers = frozenset(range(0xD0, 0xDA)) | {0x01}
+
+
+def _jpeg_size(head: bytes, f: _t_file) -> _t.Tuple[int, int]:
+	f.seek(2)
+	orientation = 1
+	while True:
+		byte = _read_exact(f, 1)
+		if byte != b'\xFF':
+			raise ImageSizeError("Broken JPEG segment")
+		marker = _read_exact(f, 1)[0]
+		while marker == 0xFF:  # fill bytes
+			marker = _read_exact(f, 1)[0]
+		if marker in _jpeg_standalone_markers:
+			continue
+		if marker == 0xDA:  # Start of scan, without any SOF before it
+			raise ImageSizeError("JPEG without SOF segment")
+		segment_size = _struct.unpack('>H', _read_exact(f, 2))[0]
+		if segment_size < 2:
+			raise ImageSizeError("Broken JPEG segment")
+		if marker in _jpeg_sof_markers:
+			# Precision (1), height (2), width (2)
+			height, width = _struct.unpack('>xHH', _read_exact(f, 5))
+			# Orientations 5-8 are rotated by 90 degrees:
+			return (height, width) if orientation >= 5 else (width, height)
+		if marker == 0xE1 and orientation == 1:
+			orientation = _exif_orientation(_read_exact(f, segment_size - 2))
+			continue
+		f.seek(segment_size - 2, _os.SEEK_CUR)
+
+
+_detectors: _t.Tuple[_t.Tuple[_t.Callable[[bytes], bool], _t.Callable[[bytes, _t_file], _t.Tuple[int, int]]], ...] = (
+	(lambda head: head[:8] == b'\x89PNG\r\n\x1a\n', _png_size),
+	(lambda head: head[:3] == b'\xFF\xD8\xFF', _jpeg_size),
+	(lambda head: head[:6] in (b'GIF87a', b'GIF89a'), _gif_size),
+	(lambda head: head[:2] == b'BM', _bmp_size),
+	(lambda head: head[:4] == b'RIFF' and head[8:12] == b'WEBP', _webp_size),
+)
+
+
+def image_size_from_file(f: _t_file) -> _t.Tuple[int, int]:
+	"""``(width, height)`` of an image from an opened binary file (it must be seekable)."""
+	head = f.read(_head_size)
+	for matches, get_size in _detectors:
+		if matches(head):
+			try:
+				width, height = get_size(head, f)
+			except _struct.error as e:
+				raise ImageSizeError(f"Broken image header: {e}")
+			if width < 1 or height < 1:
+				raise ImageSizeError(f"Invalid image size: {width}x{height}")
+			return int(width), int(height)
+	raise ImageSizeError("Unsupported image format")
+
+
+def image_size(path: _t_path) -> _t.Tuple[int, int]:
+	"""``(width, height)`` of an image file, read from its header only."""
+	with open(path, 'rb') as f:
+		return image_size_from_file(f)
+
+
+def iter_image_files(folder: _t_path, recursive: bool = False) -> _t.Iterator[_Path]:
+	"""All the files with known image extensions in the folder, lazily, in a stable (sorted) order."""
+	folder = _Path(folder)
+	for path in sorted(folder.iterdir()):
+		if path.is_dir():
+			if recursive:
+				yield from iter_image_files(path, recursive)
+			continue
+		if path.suffix.lower() in image_extensions:
+			yield path
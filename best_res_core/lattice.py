@@ -0,0 +1,253 @@
+# encoding: utf-8
+"""
+Nearest-neighbour search over the lattice of step-aligned resolutions.
+
+Instead of rounding the desired width/height (to the single best pair), all the step-multiples
+``(width, height)`` with the area within a band are enumerated, and sorted by ``(log aspect, log area)``.
+Then, the closest ones to any desired resolution are found by bisecting, and expanding from there
+in all directions - only as far as needed to prove that nothing closer is left.
+
+Distance between resolutions is measured in log space - i.e., relative: 1% of aspect difference costs about
+the same as 1% of area difference (scaled by ``area_weight``).
+"""
+
+import typing as _t
+
+from array import array as _array
+from bisect import bisect_left as _bisect_left
+from functools import lru_cache as _lru_cache
+from heapq import heappop as _heappop, heappush as _heappush
+from itertools import islice as _islice
+from math import ceil as _ceil, exp as _exp, floor as _floor, log as _log, log2 as _log2, sqrt as _sqrt
+
+from .rounding import number_to_int as _number_to_int
+
+# Resolutions with a more extreme aspect ratio than this aren't even considered:
+default_max_aspect: float = 8.0
+default_area_weight: float = 1.0
+# For a desired aspect ratio beyond the default limit, the one of the lattice is this many times past it:
+aspect_margin: float = 2.0
+
+
+class LatticeCandidate(_t.NamedTuple):
+	"""A step-aligned resolution, and its distance from the desired one."""
+	width: int
+	height: int
+	distance: float
+
+
+def _height_range(width: int, step: int, min_area: float, max_area: float, max_aspect: float) -> range:
+	"""Step-aligned heights which, with the given width, are within both the area band and the aspect limit."""
+	min_height = max(
+		_ceil(min_area / width / step - 1e-9) * step,
+		_ceil(width / max_aspect / step - 1e-9) * step,
+		step,
+	)
+	max_height = min(
+		_floor(max_area / width / step + 1e-9) * step,
+		_floor(width * max_aspect / step + 1e-9) * step,
+	)
+	return range(min_height, max_height + 1, step)
+
+
+def iter_lattice(
+	step: int, min_area: float, max_area: float, max_aspect: float = default_max_aspect,
+) -> _t.Iterator[_t.Tuple[int, int]]:
+	"""
+	Stream all the step-aligned ``(width, height)`` pairs with the area within ``[min_area, max_area]``
+	(and aspect ratio no more extreme than ``max_aspect``) - one by one, nothing is stored.
+	Ordered by width, then height.
+	"""
+	step = _number_to_int(step)
+	max_aspect = max(float(max_aspect), 1.0)
+	max_width = _floor(_sqrt(max_area * max_aspect) / step) * step
+	for width in range(step, max_width + 1, step):
+		for height in _height_range(width, step, min_area, max_area, max_aspect):
+			yield width, height
+
+
+_t_bin = _t.Tuple[_array, _array, _array, _array]
+
+
+class ResolutionLattice:
+	"""
+	The index over the lattice: all the step-aligned resolutions within the area band, kept in compact arrays -
+	split into bins by log aspect, and sorted by log area within each bin.
+
+	Bins are built lazily, on the first query reaching them: a query only ever visits the few ones closest
+	to the desired aspect ratio, so the index is cheap to create even for a huge lattice (small step, wide band).
+
+	A query bisects the area within the bins closest by aspect, and expands best-first: each bin and each
+	direction within it is only visited while its lower bound on the distance is below the next candidate's.
+	"""
+
+	def __init__(self, step: int, min_area: float, max_area: float, max_aspect: float = default_max_aspect):
+		self.step = _number_to_int(step)
+		self.min_area = float(min_area)
+		self.max_area = float(max_area)
+		self.max_aspect = max(float(max_aspect), 1.0)
+		# In (log aspect, area) coordinates, the lattice is (nearly) uniform: ``dw * dh = dA * d(log aspect) / 2``.
+		# Both signs of log aspect are there, so it's ``(max_area - min_area) / step²`` resolutions per unit of it.
+		# About sqrt(n) bins of sqrt(n) entries each: few bins to visit, and a short bisection in each.
+		max_log_aspect = _log(self.max_aspect) + 1e-9
+		aspect_range = 2.0 * max_log_aspect
+		density = max(self.max_area - self.min_area, 0.0) / (self.step * self.step)
+		bin_width = _sqrt(aspect_range / density) if density > 0.0 else aspect_range
+		self._bin_width = bin_width = max(min(bin_width, aspect_range), 1e-6)
+		self._first_bin = first_bin = _floor(-max_log_aspect / bin_width)
+		self._n_bins = _floor(max_log_aspect / bin_width) - first_bin + 1
+		self._bins: _t.Dict[int, _t_bin] = dict()
+
+	def _bin(self, j: int) -> _t_bin:
+		"""Arrays of the ``j``-th bin (counting from the first one): log area, log aspect, width, height."""
+		arrays = self._bins.get(j)
+		if arrays is None:
+			arrays = self._bins.setdefault(j, self._build_bin(j))
+		return arrays
+
+	def _build_bin(self, j: int) -> _t_bin:
+		step, min_area, max_area, max_aspect = self.step, self.min_area, self.max_area, self.max_aspect
+		bin_width = self._bin_width
+		bin_index = j + self._first_bin
+		low = bin_index * bin_width
+		high = low + bin_width
+		# ``width² = area * aspect``, and ``height = width / aspect``. The ranges are a step wider than needed,
+		# to be safe from rounding - the exact bin of each resolution is checked anyway:
+		min_width = max(_floor(_sqrt(min_area * _exp(low)) / step) - 1, 1) * step
+		max_width = (_ceil(_sqrt(max_area * _exp(high)) / step) + 1) * step
+		entries = list()
+		for width in range(min_width, max_width + 1, step):
+			heights = _height_range(width, step, min_area, max_area, max_aspect)
+			min_height = max(heights.start, (_floor(width / _exp(high) / step) - 1) * step)
+			max_height = min(heights.stop - 1, (_ceil(width / _exp(low) / step) + 1) * step)
+			for height in range(min_height, max_height + 1, step):
+				log_aspect = _log(width / height)
+				if _floor(log_aspect / bin_width) == bin_index:
+					entries.append((_log(width * height), log_aspect, width, height))
+		entries.sort()
+		return (
+			_array('d', (x[0] for x in entries)),
+			_array('d', (x[1] for x in entries)),
+			_array('I', (x[2] for x in entries)),
+			_array('I', (x[3] for x in entries)),
+		)
+
+	def __len__(self):
+		"""The total number of resolutions. Builds all the bins."""
+		return sum(len(self._bin(j)[2]) for j in range(self._n_bins))
+
+	def __iter__(self) -> _t.Iterator[_t.Tuple[int, int]]:
+		"""All the resolutions, in the index order: by (binned) aspect, then by area. Builds all the bins."""
+		for j in range(self._n_bins):
+			_, _, widths, heights = self._bin(j)
+			yield from zip(widths, heights)
+
+	def iter_nearest(
+		self, width_f: float, height_f: float, area_weight: float = default_area_weight,
+	) -> _t.Iterator[LatticeCandidate]:
+		"""
+		Stream the resolutions from the closest to the desired one onwards. Lazy: each next one costs
+		only the few index entries it takes to prove there's nothing closer left.
+		"""
+		n_bins = self._n_bins
+		if n_bins < 1:
+			return
+		bin_width, first_bin = self._bin_width, self._first_bin
+		target_aspect = _log(width_f / height_f)
+		target_area = _log(width_f * height_f)
+		area_weight = float(area_weight)
+
+		def aspect_gap(j: int) -> float:
+			low = (j + first_bin) * bin_width
+			return max(low - target_aspect, target_aspect - low - bin_width, 0.0)
+
+		# Heap entries: (lower bound of distance, kind, ...). At equal distance, kinds are ordered:
+		# 0 - a candidate (exact distance), 1 - a cursor within a bin, 2 - a bin yet to be opened.
+		start_bin = min(max(_floor(target_aspect / bin_width) - first_bin, 0), n_bins - 1)
+		heap: list = [(aspect_gap(start_bin), 2, start_bin, 0)]
+		while heap:
+			entry = _heappop(heap)
+			kind = entry[1]
+			if kind == 0:
+				_, _, _, j, i = entry
+				_, _, widths, heights = self._bin(j)
+				yield LatticeCandidate(widths[i], heights[i], entry[0])
+				continue
+
+			if kind == 2:
+				_, _, j, direction = entry
+				for next_direction in ((-1, 1) if direction == 0 else (direction, )):
+					next_j = j + next_direction
+					if 0 <= next_j < n_bins:
+						_heappush(heap, (aspect_gap(next_j), 2, next_j, next_direction))
+				gap = aspect_gap(j)
+				log_area = self._bin(j)[0]
+				pos = _bisect_left(log_area, target_area)
+				cursors = ((pos, 1), (pos - 1, -1))
+			else:
+				_, _, gap, j, i, direction = entry
+				log_area, log_aspect, _, _ = self._bin(j)
+				d_aspect = log_aspect[i] - target_aspect
+				d_area = (log_area[i] - target_area) * area_weight
+				# Ties: the closer area wins.
+				_heappush(heap, (_sqrt(d_aspect * d_aspect + d_area * d_area), 0, abs(d_area), j, i))
+				cursors = ((i + direction, direction), )
+
+			# Within a bin, the area only gets further away in each direction:
+			for i, direction in cursors:
+				if 0 <= i < len(log_area):
+					d_area = (log_area[i] - target_area) * area_weight
+					_heappush(heap, (_sqrt(gap * gap + d_area * d_area), 1, gap, j, i, direction))
+
+	def nearest(
+		self, width_f: float, height_f: float, k: int = 1, area_weight: float = default_area_weight,
+	) -> _t.List[LatticeCandidate]:
+		"""The ``k`` closest resolutions to the desired one, the closest first."""
+		return list(_islice(self.iter_nearest(width_f, height_f, area_weight), max(int(k), 0)))
+
+
+@_lru_cache(maxsize=16)
+def _cached_lattice(step: int, min_area: float, max_area: float, max_aspect: float) -> ResolutionLattice:
+	return ResolutionLattice(step, min_area, max_area, max_aspect)
+
+
+def lattice_for_area(
+	area: float, step: int, area_tolerance: float, max_aspect: float = default_max_aspect,
+) -> ResolutionLattice:
+	"""
+	The index for resolutions within ``±area_tolerance`` (relative, e.g. ``0.1`` for ±10%) of the given area.
+	Indices are cached: the same inputs (e.g., from a node re-executed with other aspect ratio) reuse one.
+	"""
+	area_tolerance = min(max(float(area_tolerance), 0.0), 1.0)
+	return _cached_lattice(
+		_number_to_int(step), float(area) * (1.0 - area_tolerance), float(area) * (1.0 + area_tolerance),
+		float(max_aspect),
+	)
+
+
+def lattice_max_aspect(width_f: float, height_f: float) -> float:
+	"""
+	The aspect limit of the lattice to search for the given desired resolution: the default one - or,
+	for a more extreme desired aspect, ``aspect_margin`` times past it (rounded up to a power of 2,
+	so the nearby ones share a cached index).
+	"""
+	aspect = max(width_f / height_f, height_f / width_f) * aspect_margin
+	if aspect <= default_max_aspect:
+		return default_max_aspect
+	return 2.0 ** _ceil(_log2(aspect))
+
+
+def nearest_resolutions(
+	width_f: float, height_f: float, step: int, area_tolerance: float, k: int = 1,
+	area_weight: float = default_area_weight, max_aspect: float = None,
+) -> _t.List[LatticeCandidate]:
+	"""
+	The ``k`` step-aligned resolutions closest to ``width_f × height_f``, with the area within ``±area_tolerance``
+	of the desired one. Might be fewer than ``k`` (or none at all), if the band is too narrow for the step.
+
+	Unless ``max_aspect`` is given, it's derived from the desired aspect ratio (see ``lattice_max_aspect()``).
+	"""
+	if max_aspect is None:
+		max_aspect = lattice_max_aspect(width_f, height_f)
+	index = lattice_for_area(width_f * height_f, step, area_tolerance, max_aspect)
+	return index.nearest(width_f, height_f, k, area_weight)
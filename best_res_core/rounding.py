@@ -0,0 +1,253 @@
+# encoding: utf-8
+"""
+The resolution math itself: rounding to the step, aspect ratios, area.
+
+Like the rest of the core, the functions here might expect the input arguments to already be pre-validated.
+"""
+
+import typing as _t
+
+from math import sqrt as _sqrt
+
+from .enums import *
+from .return_tuples import *
+
+
+_t_number = _t.Union[int, float]
+
+
+def aspect_ratios_sorted(aspect_a: float, aspect_b: float, min_clamp: float = 1.0):
+	"""Return aspect ratio in a standard form: 2 floats, both 1+, in descending order (16:9, not 9:16)."""
+	aspect_a = float(max(abs(aspect_a), min_clamp))
+	aspect_b = float(max(abs(aspect_b), min_clamp))
+	return (aspect_b, aspect_a) if aspect_b > aspect_a else (aspect_a, aspect_b)
+
+
+def number_to_int(value: _t_number, min: int = 1) -> int:
+	if not isinstance(value, int):
+		if isinstance(value, float):
+			sign = -1 if value < 0.0 else 1
+			value = int(value * sign + 0.5) * sign
+		else:
+			value = int(value)
+	return max(value, min)
+
+
+def round_pos_int(value: float) -> int:
+	"""Assuming a positive float is provided, rounds it to the nearest integer."""
+	return int(value + 0.5)
+
+
+def round_abs_to_step(abs_value: _t_number, step: int):
+	"""
+	Assuming both args are positive and ``step`` is already an int, detect the closest positive (non-zero) value
+	which is also divisible by step.
+	"""
+	n_steps = round_pos_int(float(abs_value) / step)
+	n_steps = max(n_steps, 1)
+	return step * n_steps, n_steps
+
+
+def round_width_and_height_closest_to_the_ratio(width_f: _t_number, height_f: _t_number, step: int):
+	"""3-pass detection of the best rounded resolution. Best = closest to the desired ratio."""
+	desired_width_to_height_ratio = float(width_f) / height_f
+
+	# First pass: directly from width_f and height_f
+	width, n_steps_x = round_abs_to_step(width_f, step)
+	height, n_steps_y = round_abs_to_step(height_f, step)
+
+	# Second pass: try calculating one side from already rounded another one:
+	height_from_width, n_steps_y_from_x = round_abs_to_step(float(width) / desired_width_to_height_ratio, step)
+	width_from_height, n_steps_x_from_y = round_abs_to_step(float(height) * desired_width_to_height_ratio, step)
+
+	# ... and select one of three options, closest to the perfect ratio:
+	closest_delta = abs((float(width) / height) - desired_width_to_height_ratio)
+	for w, n_x, h, n_y in [
+		(width, n_steps_x, height_from_width, n_steps_y_from_x),
+		(width_from_height, n_steps_x_from_y, height, n_steps_y),
+	]:
+		cur_delta = abs((float(w) / h) - desired_width_to_height_ratio)
+		if cur_delta < closest_delta:
+			closest_delta = cur_delta
+			width, n_steps_x = w, n_x
+			height, n_steps_y = h, n_y
+
+	return width, n_steps_x, height, n_steps_y
+
+
+def round_width_and_height_optimal(width_f: _t_number, height_f: _t_number, step: int):
+	"""
+	Exhaustive detection of the best rounded resolution.
+	Among all the step-multiples which are no worse than the 3-pass result - neither by aspect ratio nor by area -
+	best = closest to the desired ratio, and then - closest to the desired area.
+
+	The errors of the 3-pass result bound both the area and the ratio, and thus - the number of steps on each side.
+	So, only a handful of candidates needs to be checked.
+	"""
+	desired_width_to_height_ratio = float(width_f) / height_f
+	desired_area = float(width_f) * height_f
+
+	width, n_steps_x, height, n_steps_y = round_width_and_height_closest_to_the_ratio(width_f, height_f, step)
+	max_delta = abs((float(width) / height) - desired_width_to_height_ratio)
+	max_area_delta = abs(float(width * height) - desired_area)
+	closest_delta, closest_area_delta = max_delta, max_area_delta
+
+	# All the bounds are in the number of steps, with a margin for float imprecision.
+	# The candidates are checked precisely anyway.
+	step_area = float(step * step)
+	min_area_in_steps = (desired_area - max_area_delta) / step_area
+	max_area_in_steps = (desired_area + max_area_delta) / step_area
+	min_ratio = desired_width_to_height_ratio - max_delta
+	max_ratio = desired_width_to_height_ratio + max_delta
+	# n_x^2 = area * ratio:
+	min_n_x = int(_sqrt(min_area_in_steps * min_ratio)) if (min_ratio > 0.0 and min_area_in_steps > 0.0) else 1
+	max_n_x = int(_sqrt(max_area_in_steps * max_ratio)) + 1
+
+	for n_x in range(min_n_x if min_n_x > 1 else 1, max_n_x + 1):
+		# n_y bounds: both from area and from ratio
+		min_n_y = int(min_area_in_steps / n_x)
+		n_y = int(n_x / max_ratio)
+		if n_y > min_n_y:
+			min_n_y = n_y
+		max_n_y = int(max_area_in_steps / n_x) + 1
+		if min_ratio > 0.0:
+			n_y = int(n_x / min_ratio) + 1
+			if n_y < max_n_y:
+				max_n_y = n_y
+		if min_n_y < 1:
+			min_n_y = 1
+		if min_n_y > max_n_y:
+			continue
+
+		# Both sides share the same step, so the rounded ratio is just n_x / n_y. The closest n_y to
+		# (n_x / desired_ratio) might be out of the area bounds, while another one within them isn't - so all of
+		# them are checked (the bounds keep it to a few):
+		for n_y in range(min_n_y, max_n_y + 1):
+			cur_delta = abs(n_x / n_y - desired_width_to_height_ratio)
+			if cur_delta > closest_delta:
+				continue
+			cur_area_delta = abs(n_x * n_y * step_area - desired_area)
+			if cur_area_delta > max_area_delta:
+				continue
+			if cur_delta == closest_delta and cur_area_delta >= closest_area_delta:
+				continue
+			closest_delta, closest_area_delta = cur_delta, cur_area_delta
+			n_steps_x, n_steps_y = n_x, n_y
+
+	return step * n_steps_x, n_steps_x, step * n_steps_y, n_steps_y
+
+
+def round_width_and_height(
+	width_f: _t_number, height_f: _t_number, step: int,
+	mode: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC
+):
+	"""Detect the best rounded resolution with the given rounding mode."""
+	if mode == RoundingMode.OPTIMAL:
+		return round_width_and_height_optimal(width_f, height_f, step)
+	return round_width_and_height_closest_to_the_ratio(width_f, height_f, step)
+
+
+def float_width_height_from_area(square_size: _t_number, landscape: bool, aspect_a: float, aspect_b: float):
+	"""The main function for the regular (non-upscale) ``area``-subtype node."""
+	# square_size = 1024; step = 48; landscape = True; aspect_a = 9.0; aspect_b = 16.0
+	aspect_big, aspect_small = aspect_ratios_sorted(aspect_a, aspect_b)
+	aspect_x, aspect_y = (aspect_big, aspect_small) if landscape else (aspect_small, aspect_big)
+
+	aspect_area = aspect_x * aspect_y
+	aspect_norm_scale = 1.0 / _sqrt(aspect_area)
+	aspect_x *= aspect_norm_scale
+	aspect_y *= aspect_norm_scale
+	# Now the two aspects produce a normalized rectangle - i.e., it's area is 1
+
+	width_f: float = aspect_x * square_size
+	height_f: float = aspect_y * square_size
+	return width_f, height_f
+
+
+def need_post_resize(width: int, height: int, hd_width: int, hd_height: int):
+	"""
+	Detect whether the final init-res CAN NOT be uniformly scaled to the higher res,
+	and thus would require cropping/out-painting.
+	"""
+	real_upscale_x: float = float(hd_width) / width
+	real_upscale_y: float = float(hd_height) / height
+	real_upscale_avg: float = (real_upscale_x + real_upscale_y) * 0.5
+
+	needs_resize: bool = (
+		round_pos_int(real_upscale_avg * width) != hd_width or
+		round_pos_int(real_upscale_avg * height) != hd_height
+	)
+	return needs_resize, real_upscale_avg, real_upscale_x, real_upscale_y
+
+
+def upscale_rounded_pair(
+	width_f: float, height_f: _t_number, step: int,
+	priority: _t.Union[RoundingPriority, str], upscale: float, hd_step: int,
+	mode: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+	area_tolerance: float = None, aspect_tolerance: float = None,
+):
+	"""
+	Rounded initial and HD resolutions (both as ``(width, n_steps_x, height, n_steps_y)``),
+	in the order defined by priority. Expects already pre-processed arguments (see ``upscale_result_from_approx_wh()``).
+
+	Tolerances (relative, ``None`` for defaults) are used only by ``exact-uniform`` priority.
+	"""
+	hd_width_f: float = upscale * width_f
+	hd_height_f: float = upscale * height_f
+
+	if priority == RoundingPriority.EXACT_UNIFORM:
+		# Imported here: the search is built on top of this module.
+		from . import uniform as _uniform
+		pair = _uniform.exact_uniform_pair(
+			width_f, height_f, step, upscale, hd_step,
+			_uniform.default_area_tolerance if area_tolerance is None else area_tolerance,
+			_uniform.default_aspect_tolerance if aspect_tolerance is None else aspect_tolerance,
+		)
+		if pair is not None:
+			return pair
+		priority = RoundingPriority.DESIRED
+
+	if priority == RoundingPriority.DESIRED:
+		width, n_steps_x, height, n_steps_y = round_width_and_height(width_f, height_f, step, mode)
+		hd_width, hd_steps_x, hd_height, hd_steps_y = round_width_and_height(
+			hd_width_f, hd_height_f, hd_step, mode
+		)
+	elif priority == RoundingPriority.ORIGINAL:
+		width, n_steps_x, height, n_steps_y = round_width_and_height(width_f, height_f, step, mode)
+		hd_width, hd_steps_x, hd_height, hd_steps_y = round_width_and_height(
+			upscale * width, upscale * height, hd_step, mode
+		)
+	else:
+		hd_width, hd_steps_x, hd_height, hd_steps_y = round_width_and_height(
+			hd_width_f, hd_height_f, hd_step, mode
+		)
+		width, n_steps_x, height, n_steps_y = round_width_and_height(
+			float(hd_width) / upscale, float(hd_height) / upscale, step, mode
+		)
+
+	return (width, n_steps_x, height, n_steps_y), (hd_width, hd_steps_x, hd_height, hd_steps_y)
+
+
+def simple_result_from_approx_wh(
+	width_f: float, height_f: _t_number, step: int,
+	mode: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+) -> ResultSimple:
+	"""The result of simple (non-upscale) nodes - when desired width/height are already calculated."""
+	width, _, height, _ = round_width_and_height(width_f, height_f, number_to_int(step), mode)
+	return ResultSimple(width, height)
+
+
+def upscale_result_from_approx_wh(
+	width_f: float, height_f: _t_number, step: int,
+	priority: _t.Union[RoundingPriority, str], upscale: float, hd_step: int,
+	mode: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+	area_tolerance: float = None, aspect_tolerance: float = None,
+) -> ResultUpscaled:
+	"""The result of nodes with upscaling - when desired initial-width/height are already calculated."""
+	upscale = max(float(upscale), 1.0)
+	(width, _, height, _), (hd_width, _, hd_height, _) = upscale_rounded_pair(
+		float(width_f), height_f, number_to_int(step), priority, upscale, number_to_int(hd_step), mode,
+		area_tolerance, aspect_tolerance,
+	)
+	needs_resize, real_upscale_avg, _, _ = need_post_resize(width, height, hd_width, hd_height)
+	return ResultUpscaled(upscale if needs_resize else real_upscale_avg, width, height, hd_width, hd_height)
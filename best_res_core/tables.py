@@ -0,0 +1,194 @@
+# encoding: utf-8
+"""
+Precomputed resolution tables: the results of "area" node (in the default ``3-pass`` rounding mode)
+for presets of square sizes, steps and aspect ratios - stored in a compact binary file, looked up via ``mmap``.
+
+The file is an open-addressing hash table, so a lookup is O(1): hash the key, and probe a slot or two.
+Nothing is parsed on load: the file is just mapped into memory (and shared between processes by the OS).
+
+Format (little-endian), version 1:
+
+	• header: magic ``b'BRTB'``, u16 version, u16 slot size, u32 capacity (a power of 2), u32 number of entries;
+	• ``capacity`` slots. Key: u32 square size (0 - empty slot), u32 step, u8 landscape, 3 padding bytes,
+	  f64 bigger aspect, f64 smaller aspect (as normalized by ``aspect_ratios_sorted()``).
+	  Value: u32 width, u32 width in steps, u32 height, u32 height in steps.
+
+The slot is chosen by CRC32 of the key bytes (stable across processes, unlike Python's ``hash()``),
+with linear probing.
+
+Generate a table:
+
+	python -m best_res_core.tables table.brtb --square-sizes 512 768 1024 1536 --steps 8 16 48 64 144
+"""
+
+import typing as _t
+
+from argparse import ArgumentParser as _ArgumentParser
+from itertools import product as _product
+from pathlib import Path as _Path
+from zlib import crc32 as _crc32
+import mmap as _mmap
+import os as _os
+import struct as _struct
+
+from .rounding import (
+	aspect_ratios_sorted as _aspect_ratios_sorted,
+	float_width_height_from_area as _float_width_height_from_area,
+	round_width_and_height_closest_to_the_ratio as _round_width_and_height_closest_to_the_ratio,
+)
+
+# Bump whenever either the format or the rounding math changes - so outdated tables are never used:
+version = 1
+
+default_square_sizes: _t.Tuple[int, ...] = (512, 768, 1024, 1536)
+default_steps: _t.Tuple[int, ...] = (8, 16, 48, 64, 144)
+default_aspects: _t.Tuple[_t.Tuple[float, float], ...] = (
+	(1.0, 1.0), (5.0, 4.0), (4.0, 3.0), (3.0, 2.0), (16.0, 10.0), (16.0, 9.0), (2.0, 1.0), (21.0, 9.0),
+)
+
+_magic = b'BRTB'
+_header = _struct.Struct('<4sHHII')
+_key = _struct.Struct('<IIB3xdd')
+_value = _struct.Struct('<IIII')
+_slot_size = _key.size + _value.size
+# The table is kept at most this full, so probe sequences stay short:
+_max_load = 0.5
+
+_t_rounded = _t.Tuple[int, int, int, int]
+
+
+class TableFormatError(ValueError):
+	"""The file isn't a resolution table of the supported version."""
+
+
+def _pack_key(square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float) -> bytes:
+	aspect_big, aspect_small = _aspect_ratios_sorted(aspect_a, aspect_b)
+	return _key.pack(int(square_size), int(step), bool(landscape), float(aspect_big), float(aspect_small))
+
+
+def compute_entry(square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float) -> _t_rounded:
+	"""The value for the table: exactly what "area" node computes in ``3-pass`` mode."""
+	width_f, height_f = _float_width_height_from_area(square_size, landscape, aspect_a, aspect_b)
+	return _round_width_and_height_closest_to_the_ratio(width_f, height_f, step)
+
+
+def _capacity_for(n_entries: int) -> int:
+	capacity = 8
+	while capacity * _max_load < n_entries:
+		capacity *= 2
+	return capacity
+
+
+def build_table(
+	path: _t.Union[str, _os.PathLike],
+	square_sizes: _t.Iterable[int] = default_square_sizes,
+	steps: _t.Iterable[int] = default_steps,
+	aspects: _t.Iterable[_t.Tuple[float, float]] = default_aspects,
+) -> int:
+	"""
+	Precompute the table for all the combinations (both orientations of each aspect ratio),
+	and write it to the file - atomically, so a reader never sees a partial one. Returns the number of entries.
+	"""
+	entries: _t.Dict[bytes, _t_rounded] = dict()
+	for square_size, step, (aspect_a, aspect_b), landscape in _product(square_sizes, steps, aspects, (True, False)):
+		key = _pack_key(square_size, step, landscape, aspect_a, aspect_b)
+		if key not in entries:
+			entries[key] = compute_entry(square_size, step, landscape, aspect_a, aspect_b)
+
+	capacity = _capacity_for(len(entries))
+	mask = capacity - 1
+	data = bytearray(_header.size + capacity * _slot_size)
+	_header.pack_into(data, 0, _magic, version, _slot_size, capacity, len(entries))
+	for key, rounded in entries.items():
+		slot = _crc32(key) & mask
+		offset = _header.size + slot * _slot_size
+		while data[offset:offset + 4] != b'\0\0\0\0':
+			slot = (slot + 1) & mask
+			offset = _header.size + slot * _slot_size
+		data[offset:offset + _key.size] = key
+		_value.pack_into(data, offset + _key.size, *rounded)
+
+	path = _Path(path)
+	tmp_path = path.with_name(path.name + '.tmp')
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with open(tmp_path, 'wb') as f:
+		f.write(data)
+	_os.replace(tmp_path, path)
+	return len(entries)
+
+
+class ResolutionTable:
+	"""A memory-mapped table. Raises ``TableFormatError`` on open, if the file isn't a valid one."""
+
+	def __init__(self, path: _t.Union[str, _os.PathLike]):
+		self.path = _Path(path)
+		with open(self.path, 'rb') as f:
+			try:
+				self._mm = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+			except ValueError:
+				# An empty file can't be mapped:
+				raise TableFormatError(f"Empty resolution table: {self.path}") from None
+		try:
+			magic, file_version, slot_size, capacity, n_entries = _header.unpack_from(self._mm, 0)
+		except _struct.error:
+			self.close()
+			raise TableFormatError(f"Not a resolution table: {self.path}") from None
+		if (
+			magic != _magic or file_version != version or slot_size != _slot_size
+			or capacity & (capacity - 1) or len(self._mm) != _header.size + capacity * slot_size
+		):
+			self.close()
+			raise TableFormatError(f"Not a resolution table of version {version}: {self.path}")
+		self._mask = capacity - 1
+		self.n_entries: int = n_entries
+
+	def __len__(self):
+		return self.n_entries
+
+	def close(self):
+		self._mm.close()
+
+	def lookup(
+		self, square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float,
+	) -> _t.Optional[_t_rounded]:
+		"""``(width, n_steps_x, height, n_steps_y)`` for the inputs, or ``None`` if they're not in the table."""
+		try:
+			key = _pack_key(square_size, step, landscape, aspect_a, aspect_b)
+		except _struct.error:
+			# Out of the key's range (e.g., a square size beyond u32): such inputs are never in the table.
+			return None
+		mm = self._mm
+		slot = _crc32(key) & self._mask
+		for _ in range(self._mask + 1):
+			offset = _header.size + slot * _slot_size
+			slot_key = mm[offset:offset + _key.size]
+			if slot_key == key:
+				return _value.unpack_from(mm, offset + _key.size)
+			if slot_key[:4] == b'\0\0\0\0':
+				return None
+			slot = (slot + 1) & self._mask
+		return None
+
+
+def _aspect_arg(value: str) -> _t.Tuple[float, float]:
+	a, _, b = value.partition(':')
+	return float(a), float(b or 1.0)
+
+
+def main(args: _t.Sequence[str] = None) -> int:
+	parser = _ArgumentParser(description="Precompute a resolution table for \"area\" node.")
+	parser.add_argument('path', help="Output file.")
+	parser.add_argument('--square-sizes', type=int, nargs='+', default=default_square_sizes)
+	parser.add_argument('--steps', type=int, nargs='+', default=default_steps)
+	parser.add_argument(
+		'--aspects', type=_aspect_arg, nargs='+', default=default_aspects, help="Aspect ratios as A:B (e.g., 16:9)."
+	)
+	parsed = parser.parse_args(args)
+	n_entries = build_table(parsed.path, parsed.square_sizes, parsed.steps, parsed.aspects)
+	print(f"{n_entries} entries -> {parsed.path} ({_Path(parsed.path).stat().st_size} bytes)")
+	return 0
+
+
+if __name__ == '__main__':
+	import sys as _sys
+	_sys.exit(main())
@@ -0,0 +1,196 @@
+# encoding: utf-8
+"""
+Tile geometry for tiled processing of an image (like ``comfy.utils.tiled_scale()`` does for upscale models).
+
+The usual fixed 512px tiles with 32px overlap rarely fit an image well: some sides are split into more tiles
+than needed, and each extra tile adds one more overlap processed twice. Here, tile width/height are chosen
+for the actual image size instead - to process the fewest pixels, while each tile fits into the given area
+(memory) limit and neighbour tiles overlap by the given amount.
+
+The plan models the tile layout of ``tiled_scale()`` exactly: tiles go from the start with ``tile - overlap``
+stride, and the last one is cut by the far edge (i.e., it's partial - not shifted back to be a whole tile).
+So along a side, tiles have ``size + (n - 1) * overlap`` pixels in total - only their number matters, and for
+a given number, the smallest tiles are picked: they take the least memory and leave no thin sliver at the edge.
+
+Also, when the target size is much smaller than what the model outputs, the planned tile pixels tell whether
+it's worth shrinking the image before the model.
+"""
+
+import typing as _t
+
+from math import ceil as _ceil
+
+default_tile: int = 512
+default_overlap: int = 32
+# Tile sides are multiples of this (unless the entire side fits into a single tile):
+default_align: int = 8
+
+# Tiles aren't made smaller than this many overlaps (otherwise, most of the tile is overlap):
+_min_tile_to_overlap = 2
+# Sanity limit on tiles per axis:
+_max_tiles_per_axis = 256
+
+
+class TilePlan(_t.NamedTuple):
+	"""
+	Tile size, overlap (the same for both axes, as ``tiled_scale()`` expects), the number of tiles,
+	and the size of the image they're for.
+	"""
+	tile_w: int
+	tile_h: int
+	overlap: int
+	n_x: int
+	n_y: int
+	width: int
+	height: int
+
+	@property
+	def n_tiles(self) -> int:
+		return self.n_x * self.n_y
+
+	@property
+	def pixels(self) -> int:
+		"""The total number of pixels in all tiles (for a single image) - i.e., what the model actually processes."""
+		return axis_pixels(self.width, self.tile_w, self.overlap) * axis_pixels(self.height, self.tile_h, self.overlap)
+
+	def __str__(self):
+		if self.n_tiles == 1:
+			return f"a single {self.tile_w}×{self.tile_h} tile"
+		return f"{self.n_x}×{self.n_y} tiles of {self.tile_w}×{self.tile_h}, overlap {self.overlap}"
+
+
+def tile_spans(size: int, tile: int, overlap: int) -> _t.List[_t.Tuple[int, int]]:
+	"""``(position, length)`` of tiles along one axis - exactly as ``tiled_scale()`` places them."""
+	if size <= tile:
+		return [(0, size)]
+	spans = list()
+	for start in range(0, size - overlap, tile - overlap):
+		pos = max(0, min(size - overlap, start))
+		spans.append((pos, min(tile, size - pos)))
+	return spans
+
+
+def n_tiles_along(size: int, tile: int, overlap: int) -> int:
+	"""The number of tiles ``tiled_scale()`` would use along one axis (the same as ``len(tile_spans(...))``)."""
+	if size <= tile:
+		return 1
+	stride = tile - overlap
+	return (size - overlap + stride - 1) // stride
+
+
+def axis_pixels(size: int, tile: int, overlap: int) -> int:
+	"""The total length of the tiles along one axis (the same as the sum of ``tile_spans()`` lengths)."""
+	return size + (n_tiles_along(size, tile, overlap) - 1) * overlap
+
+
+def fixed_tile_plan(width: int, height: int, tile: int = default_tile, overlap: int = default_overlap) -> TilePlan:
+	"""The layout of the square fixed-size tiles - the way ``tiled_scale()`` is usually called."""
+	return TilePlan(
+		min(tile, width), min(tile, height), overlap,
+		n_tiles_along(width, tile, overlap), n_tiles_along(height, tile, overlap),
+		width, height,
+	)
+
+
+def _axis_options(size: int, overlap: int, align: int) -> _t.List[int]:
+	"""
+	Possible tile sizes for one axis: for each number of tiles, the smallest aligned tile with which
+	``tiled_scale()`` covers the side with no more tiles than that.
+	"""
+	options = [size]
+	min_tile = max(_min_tile_to_overlap * overlap, align)
+	for n in range(2, _max_tiles_per_axis + 1):
+		tile = -(-(size - overlap) // n) + overlap
+		tile = -(-tile // align) * align
+		if tile < min_tile:
+			break
+		if tile < options[-1]:
+			options.append(tile)
+	return options
+
+
+def plan_tiles(
+	width: int, height: int,
+	max_tile_area: int = default_tile * default_tile,
+	min_overlap: int = default_overlap,
+	align: int = default_align,
+) -> TilePlan:
+	"""
+	Tile geometry for the image, processing the fewest pixels in total. Each tile is no bigger
+	than ``max_tile_area`` (i.e., needs no more memory than a square tile of this area would), and tiles overlap
+	by ``min_overlap`` (any more would only add pixels). On ties, fewer tiles (i.e., model calls) win,
+	then smaller ones (less memory).
+	"""
+	width = max(int(width), 1)
+	height = max(int(height), 1)
+	max_tile_area = max(int(max_tile_area), 1)
+	overlap = max(int(min_overlap), 0)
+	align = max(int(align), 1)
+
+	def axis(size: int) -> _t.List[_t.Tuple[int, int, int]]:
+		return [
+			(tile, n_tiles_along(size, tile, overlap), axis_pixels(size, tile, overlap))
+			for tile in _axis_options(size, overlap, align)
+		]
+
+	best: _t.Optional[TilePlan] = None
+	best_key = None
+	options_y = axis(height)
+	for tile_w, n_x, pixels_x in axis(width):
+		for tile_h, n_y, pixels_y in options_y:
+			if tile_w * tile_h > max_tile_area:
+				continue
+			key = (pixels_x * pixels_y, n_x * n_y, tile_w * tile_h)
+			if best_key is None or key < best_key:
+				best_key = key
+				best = TilePlan(tile_w, tile_h, overlap, n_x, n_y, width, height)
+
+	if best is None:
+		# The limit is too small for any tile with this overlap: fall back to square tiles within the area.
+		side = max(int(max_tile_area ** 0.5) // align * align, overlap + align)
+		return fixed_tile_plan(width, height, side, overlap)
+	return best
+
+
+class PreDownscalePlan(_t.NamedTuple):
+	"""
+	The size to shrink the image to before the upscale model, so that the model's output is still no smaller
+	than the target size. If ``do_pre_downscale`` is off, the model gets the original image.
+	"""
+	do_pre_downscale: bool
+	in_width: int
+	in_height: int
+	model_pixels: int
+	full_model_pixels: int
+
+	@property
+	def saved_ratio(self) -> float:
+		"""The part of model-processed pixels saved by the plan (compared to feeding the original image)."""
+		return 1.0 - self.model_pixels / self.full_model_pixels if self.full_model_pixels > 0 else 0.0
+
+
+def plan_pre_downscale(
+	width: int, height: int, target_width: int, target_height: int, model_scale: float,
+	min_saving: float = 0.25,
+	max_tile_area: int = default_tile * default_tile,
+	min_overlap: int = default_overlap,
+) -> PreDownscalePlan:
+	"""
+	Whether it's worth shrinking the image before the model: the smallest input size for which the model output
+	still covers the target size, if it saves at least ``min_saving`` of the pixels processed by the model
+	(counted over the planned tiles). Shrinking does lose some detail, so it's not done for small savings.
+	"""
+	full_pixels = plan_tiles(width, height, max_tile_area, min_overlap).pixels
+	model_scale = max(float(model_scale), 1e-6)
+	# The smallest input, model output from which is at least the target size:
+	# (A tiny epsilon prevents float error from adding a whole pixel when the division is exact.)
+	in_width = min(max(_ceil(target_width / model_scale - 1e-9), 1), width)
+	in_height = min(max(_ceil(target_height / model_scale - 1e-9), 1), height)
+	if (in_width, in_height) == (width, height):
+		return PreDownscalePlan(False, width, height, full_pixels, full_pixels)
+
+	pre_pixels = plan_tiles(in_width, in_height, max_tile_area, min_overlap).pixels
+	if pre_pixels > full_pixels * (1.0 - min_saving):
+		return PreDownscalePlan(False, width, height, full_pixels, full_pixels)
+	return PreDownscalePlan(True, in_width, in_height, pre_pixels, full_pixels)
+
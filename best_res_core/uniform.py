@@ -0,0 +1,114 @@
+# encoding: utf-8
+"""
+"exact-uniform" priority: initial and HD resolutions such that HD is EXACTLY the initial one scaled by the same
+factor along both axes - so no crop or out-paint is ever needed after the upscale.
+
+For a factor ``k = p/q`` (in lowest terms), ``k * width`` is a multiple of ``HD_step`` only if ``width`` is
+a multiple of ``q * HD_step / gcd(p, HD_step)``. So, for each rational factor close enough to the desired upscale,
+both initial sides must be multiples of a single unit - its LCM with ``step``. The best initial resolution on this
+coarser lattice is then found with the lattice index (see ``lattice.py``), and the best factor wins. A single index
+of step-multiples is built per call: each factor's lattice is a subset of it.
+
+"Best" is the smallest sum of squared log-deviations: of the aspect ratio, of the initial area and of the HD area.
+"""
+
+import typing as _t
+
+from math import (
+	ceil as _ceil, exp as _exp, floor as _floor, gcd as _gcd, log as _log, log1p as _log1p, sqrt as _sqrt,
+)
+
+from .lattice import ResolutionLattice as _ResolutionLattice
+
+# Relative deviations (of the initial/HD area, and of the aspect ratio) allowed by default:
+default_area_tolerance: float = 0.1
+default_aspect_tolerance: float = 0.02
+# The most complex upscale factor considered: up to x/16.
+default_max_denominator: int = 16
+
+_t_rounded = _t.Tuple[int, int, int, int]
+
+
+def _lcm(a: int, b: int) -> int:
+	return a * b // _gcd(a, b)
+
+
+def uniform_unit(step: int, hd_step: int, p: int, q: int) -> int:
+	"""
+	The smallest number, each multiple of which is divisible by ``step`` and becomes divisible by ``hd_step``
+	when scaled by ``p/q`` (lowest terms).
+	"""
+	return _lcm(step, q * hd_step // _gcd(p, hd_step))
+
+
+def exact_uniform_pair(
+	width_f: float, height_f: float, step: int, upscale: float, hd_step: int,
+	area_tolerance: float = default_area_tolerance,
+	aspect_tolerance: float = default_aspect_tolerance,
+	max_denominator: int = default_max_denominator,
+) -> _t.Optional[_t.Tuple[_t_rounded, _t_rounded]]:
+	"""
+	Rounded initial and HD resolutions (both as ``(width, n_steps_x, height, n_steps_y)``), with HD being exactly
+	the initial one scaled by a rational factor - or ``None`` if there's no such pair within the tolerances.
+
+	Both the initial and HD areas are kept within ``±area_tolerance`` of the desired ones, and the aspect ratio -
+	within ``±aspect_tolerance`` (both relative, e.g. ``0.1`` for 10%). The factor itself may differ from
+	the desired ``upscale``, as much as the HD area tolerance allows.
+	"""
+	area_f = float(width_f) * height_f
+	log_aspect_f = _log(width_f / height_f)
+	max_log_aspect_delta = _log1p(max(float(aspect_tolerance), 0.0))
+	area_low = 1.0 - min(max(float(area_tolerance), 0.0), 0.99)
+	area_high = 2.0 - area_low
+	hd_area_f = area_f * upscale * upscale
+	# Both areas within the band limits the factor, too:
+	k_min = max(upscale * _sqrt(area_low / area_high), 1.0)
+	k_max = upscale * _sqrt(area_high / area_low)
+	max_aspect = _exp(abs(log_aspect_f) + max_log_aspect_delta)
+
+	# A single index for all the factors: each one's lattice (multiples of its unit, within its area band)
+	# is a subset of this one, so its candidates are just filtered out of the step-multiples.
+	index = _ResolutionLattice(step, area_f * area_low, area_f * area_high, max_aspect)
+
+	best: _t.Optional[_t.Tuple[_t_rounded, _t_rounded]] = None
+	best_cost = float('inf')
+	for q in range(1, max(int(max_denominator), 1) + 1):
+		for p in range(_ceil(k_min * q - 1e-9), _floor(k_max * q + 1e-9) + 1):
+			if _gcd(p, q) != 1:
+				continue
+			k = p / q
+			# With init area deviating by ``d_init`` (in log), the HD one deviates by ``d_init + 2*c``:
+			c = _log(k / upscale)
+			if 2.0 * c * c >= best_cost:
+				# Even the perfect initial resolution wouldn't beat the best one.
+				continue
+			unit = uniform_unit(step, hd_step, p, q)
+			init_min = max(area_f * area_low, hd_area_f * area_low / (k * k))
+			init_max = min(area_f * area_high, hd_area_f * area_high / (k * k))
+			if init_min > init_max or unit * unit > init_max:
+				continue
+
+			# ``aspect² + d_init² + (d_init + 2c)²`` = ``aspect² + 2 * (d_init + c)² + 2c²``: so it's the lattice
+			# distance (with sqrt(2) area weight) to the desired resolution with the area scaled by ``exp(-c)``.
+			side_scale = _sqrt(upscale / k)
+			log_target_area = _log(area_f * side_scale * side_scale)
+			max_log_area_delta = max(_log(init_max) - log_target_area, log_target_area - _log(init_min))
+			# Nothing further than this is within both the aspect tolerance and this factor's area band:
+			max_distance = _sqrt(max_log_aspect_delta ** 2 + 2.0 * max_log_area_delta ** 2) + 1e-9
+			for width, height, distance in index.iter_nearest(width_f * side_scale, height_f * side_scale, _sqrt(2.0)):
+				cost = distance * distance + 2.0 * c * c
+				if cost >= best_cost or distance > max_distance:
+					break
+				if width % unit or height % unit or not init_min <= width * height <= init_max:
+					continue
+				if abs(_log(width / height) - log_aspect_f) > max_log_aspect_delta + 1e-12:
+					continue
+				hd_width, hd_height = width * p // q, height * p // q
+				best_cost = cost
+				best = (
+					(width, width // step, height, height // step),
+					(hd_width, hd_width // hd_step, hd_height, hd_height // hd_step),
+				)
+				break
+	return best
+
@@ -0,0 +1,110 @@
+# encoding: utf-8
+"""
+"Best-Res (budget)" node: resolution and batch size for a memory budget.
+"""
+
+import typing as _t
+
+from inspect import cleandoc as _cleandoc
+
+from frozendict import deepfreeze as _deepfreeze
+
+from comfy.comfy_types.node_typing import IO as _IO
+
+from ._funcs import node_output as _node_output, _report_wanted, _show_text_on_node
+from . import _budget, _meta
+from .best_res_core.budget import solve_budget as _solve_budget
+from .best_res_core.enums import *
+from .best_res_core.rounding import number_to_int as _number_to_int
+from .docstring_formatter import format_docstring as _format_docstring
+from .nodes_prims import _rounding_mode_verify
+from .nodes_simple import _input_types_area
+
+_gb = float(1 << 30)
+
+_input_types = _deepfreeze({
+	'required': dict(
+		_input_types_area['required'],
+		memory_budget=(_IO.FLOAT, {
+			'default': 0.0, 'min': 0.0, 'max': 1e6, 'step': 0.5, 'round': 0.01,
+			'tooltip': (
+				"Memory budget, in GB: the batch (together with the model itself) must fit into it.\n\n"
+				f"0 - auto: {_budget.safety_ratio:.0%} of the total memory of ComfyUI's main device."
+			),
+		}),
+		max_batch_size=(_IO.INT, {
+			'default': 64, 'min': 1, 'max': 4096, 'step': 1,
+			'tooltip': "The batch size won't be bigger than this, even if more images fit.",
+		}),
+	),
+	'hidden': dict(_input_types_area['hidden']),
+	'optional': dict(
+		_input_types_area['optional'],
+		area_tolerance=(_IO.FLOAT, {
+			'default': 0.0, 'min': 0.0, 'max': 50.0, 'step': 0.5, 'round': 0.01,
+			'tooltip': (
+				"How far (in %) the total resolution may deviate from the desired one, for more images per second.\n\n"
+				"0 - the resolution is exactly the one of \"Best-Res (area)\": only the batch size is picked."
+			),
+		}),
+	),
+})
+
+
+class BestResolutionBudget:
+	"""
+	Resolution and batch size for a memory budget: the largest batch which fits - and, if the resolution
+	is allowed to deviate from the desired one (see `area_tolerance`), the resolution giving the most images
+	per second.
+
+
+	Memory and time are estimated with a cost model, calibrated for your machine with
+	`benchmarks/budget_calibration.py` (see README).
+	"""
+	NODE_NAME = 'BestResolutionBudget'
+	CATEGORY = _meta.category
+	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
+
+	OUTPUT_NODE = not _meta.ui_report
+
+	FUNCTION = 'main'
+	RETURN_TYPES = (_IO.INT, _IO.INT, _IO.INT)
+	RETURN_NAMES = ('width', 'height', 'batch_size')
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return _input_types
+
+	def main(
+		self,
+		square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float,
+		memory_budget: float, max_batch_size: int,
+		unique_id: str = None,
+		rounding: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+		area_tolerance: float = 0.0,
+	):
+		cost_model = _budget.load_cost_model()
+		if cost_model is None:
+			raise ValueError(
+				f"No calibrated cost model at {_budget.default_path()}\n"
+				f"Run `python benchmarks/budget_calibration.py --comfy /path/to/ComfyUI` from the pack's folder first."
+			)
+		budget = memory_budget * _gb if memory_budget > 0.0 else _budget.default_memory_budget()
+		square_size: int = _number_to_int(square_size)
+		result = _solve_budget(
+			square_size, landscape, aspect_a, aspect_b, step, budget, cost_model,
+			area_tolerance / 100.0, max_batch_size, _rounding_mode_verify(rounding),
+		)
+		if result is None:
+			raise ValueError(
+				f"Not even a single image of ~{square_size}² fits into {budget / _gb:.2f} GB "
+				f"(the model alone takes ~{cost_model.memory_fixed / _gb:.2f} GB)."
+			)
+
+		if _report_wanted(unique_id):
+			_show_text_on_node(
+				f"{result.width}/{result.height} × {result.batch_size}\n"
+				f"~{result.images_per_second:.3g} img/s, ~{result.memory / _gb:.2f} / {budget / _gb:.2f} GB",
+				unique_id
+			)
+		return _node_output((result.width, result.height, result.batch_size), unique_id)
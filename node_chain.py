@@ -0,0 +1,132 @@
+# encoding: utf-8
+"""
+"Upscale Chain" node: plans the whole chain of upscales (latent, model, tiled...) at once.
+"""
+
+import typing as _t
+
+from inspect import cleandoc as _cleandoc
+
+from frozendict import deepfreeze as _deepfreeze
+
+from comfy.comfy_types.node_typing import IO as _IO
+
+from ._funcs import node_output as _node_output, _report_wanted, _show_text_on_node
+from . import _meta
+from .best_res_core.chain import parse_stages as _parse_stages, plan_chain as _plan_chain
+from .best_res_core.rounding import number_to_int as _number_to_int
+from .docstring_formatter import format_docstring as _format_docstring
+from .nodes_simple import _input_types_area
+from .slot_types import type_dict_res as _type_dict_res
+
+_default_stages = (
+	"# factors; step; cost per pixel\n"
+	"1.5, 1.25; 16; 4\n"
+	"2; 8; 0.5\n"
+	"1, 1.5, 2; 64; 1\n"
+)
+
+_input_types = _deepfreeze({
+	'required': {
+		'final_width': (_IO.INT, dict(_type_dict_res, **{'default': 3840, 'tooltip': "Approximate final width."})),
+		'final_height': (_IO.INT, dict(_type_dict_res, **{'default': 2160, 'tooltip': "Approximate final height."})),
+		'square_size': (_IO.INT, dict(_type_dict_res, **{'tooltip': (
+			"The model's native resolution, as a side of a square: the initial image should have about the same area."
+		)})),
+		'step': (_IO.INT, dict(_input_types_area['required']['step'][1], **{
+			'tooltip': "Both initial width and height will be divisible by this value.",
+		})),
+		'stages': (_IO.STRING, {
+			'default': _default_stages, 'multiline': True,
+			'tooltip': (
+				"Upscale stages, in order - one per line, as `factors; step; cost`:\n"
+				"- factors: allowed upscale factors for the stage (comma-separated);\n"
+				"- step: the resolution after this stage will be divisible by it;\n"
+				"- cost: relative cost of processing a single pixel at this stage (optional, 1 by default).\n\n"
+				"`#` starts a comment."
+			),
+		}),
+	},
+	'hidden': {
+		'unique_id': 'UNIQUE_ID',
+	},
+	'optional': {
+		'init_area_tolerance': (_IO.FLOAT, {
+			'default': 25.0, 'min': 0.0, 'max': 99.0, 'step': 1.0, 'round': 0.01,
+			'tooltip': "How far (in %) the initial area may deviate from the native one (`square_size` squared).",
+		}),
+		'init_cost': (_IO.FLOAT, {
+			'default': 1.0, 'min': 0.0, 'max': 1e9, 'step': 0.1, 'round': 0.001,
+			'tooltip': "Relative cost of processing a single pixel of the initial generation.",
+		}),
+	},
+})
+
+
+class BestResolutionUpscaleChain:
+	"""
+	Plans a chain of upscales - e.g., latent x1.5, then model x2, then tiled sampling - each with its own allowed
+	factors, step and cost per pixel.
+
+
+	Outputs the initial resolution, plus the resolution after each stage (as lists), such that the whole chain
+	processes the fewest pixels (weighted by the cost of each stage), while every resolution is divisible
+	by its stage's step and the last one is as close to the final target as this step allows.
+	"""
+	NODE_NAME = 'BestResolutionUpscaleChain'
+	CATEGORY = _meta.category
+	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
+
+	OUTPUT_NODE = not _meta.ui_report
+
+	FUNCTION = 'main'
+	RETURN_TYPES = (_IO.INT, _IO.INT, _IO.INT, _IO.INT, _IO.FLOAT)
+	RETURN_NAMES = ('init_width', 'init_height', 'widths', 'heights', 'scales')
+	OUTPUT_TOOLTIPS = (
+		"Width for the initial generation.",
+		"Height for the initial generation.",
+		"Width after each stage (a list).",
+		"Height after each stage (a list).",
+		"The actual (average) upscale of each stage (a list).",
+	)
+	OUTPUT_IS_LIST = (False, False, True, True, True)
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return _input_types
+
+	def main(
+		self,
+		final_width: int, final_height: int, square_size: int, step: int, stages: str,
+		unique_id: str = None,
+		init_area_tolerance: float = 25.0,
+		init_cost: float = 1.0,
+	):
+		parsed_stages = _parse_stages(stages)
+		final_width, final_height = _number_to_int(final_width), _number_to_int(final_height)
+		plan = _plan_chain(
+			final_width, final_height, step, parsed_stages,
+			_number_to_int(square_size), init_area_tolerance / 100.0, init_cost,
+		)
+		if plan is None:
+			raise ValueError(
+				f"No chain of the given stages gets from ~{square_size}² (±{init_area_tolerance:g}%) "
+				f"to {final_width}x{final_height}: change the factors or increase the tolerance."
+			)
+
+		(init_width, init_height), following = plan.resolutions[0], plan.resolutions[1:]
+		scales = [
+			(float(w) / prev_w + float(h) / prev_h) * 0.5
+			for (prev_w, prev_h), (w, h) in zip(plan.resolutions, following)
+		]
+		result = (init_width, init_height, [w for w, _ in following], [h for _, h in following], scales)
+
+		if _report_wanted(unique_id):
+			lines = [f"{init_width}/{init_height}"]
+			lines.extend(
+				f"x{factor:g} → {w}/{h} (x{scale:.3f})"
+				for factor, (w, h), scale in zip(plan.factors, following, scales)
+			)
+			lines.append(f"Cost: {plan.cost / 1e6:.3f} MPix")
+			_show_text_on_node('\n'.join(lines), unique_id)
+		return _node_output(result, unique_id)
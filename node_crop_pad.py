@@ -11,20 +11,32 @@
 
 from comfy.comfy_types.node_typing import IO as _IO
 
+from ._funcs import node_output as _node_output, _report_wanted, _show_text_on_node
 from ._funcs_crop_pad import upscaled_crop_pad as _upscaled_crop_pad
 from . import _meta
 from .docstring_formatter import format_docstring as _format_docstring
-from .enums import *
+from .best_res_core.crop_pad import (
+	CropPadCosts as _CropPadCosts,
+	crop_pad_layout as _crop_pad_layout,
+	latent_crop_pad_layout as _latent_crop_pad_layout,
+)
+from .best_res_core.enums import *
+from .best_res_core.return_tuples import ResultUpscaledCropPad as _ResultUpscaledCropPad
 from .nodes_prims import _up_strategy_in_type, _up_strategy_verify
 from .nodes_upscale import _return_ttips_upscale
 from .slot_types import (
 	type_dict_res as _type_dict_res,
 	rel_pos_in_type as _rel_pos_in_type,
-	upscale_in_type as _upscale_in_type
+	upscale_in_type as _upscale_in_type,
+	upscale_methods as _upscale_methods,
+	latent_upscale_methods as _latent_upscale_methods,
 )
 
 # ----------------------------------------------------------
 
+# The whole crop/pad plan, as a single value - to connect to "Apply Crop/Pad" node:
+crop_pad_type = 'BEST_RES_CROP_PAD'
+
 _return_ttips_crop_pad = _frozendict({
 	'upscale': "The actual uniform upscale value to do.",
 
@@ -39,6 +51,8 @@
 	'pad_top': "Top padding for the post-upscale out-paint.",
 	'pad_right': "Right padding for the post-upscale out-paint.",
 	'pad_bottom': "Bottom padding for the post-upscale out-paint.",
+
+	'crop_pad': "All of the above, together - for \"Apply Crop/Pad (Best-Res)\" node.",
 })
 _input_types_crop_pad = _deepfreeze({
 	'required': {
@@ -71,7 +85,31 @@
 	'hidden': {
 		'unique_id': 'UNIQUE_ID',
 	},
-	# 'optional': {},
+	'optional': {
+		'crop_cost': (_IO.FLOAT, {
+			'default': _CropPadCosts._field_defaults['crop_pixel'], 'min': 0.0, 'max': 1e9, 'step': 0.1, 'round': 0.001,
+			'tooltip': (
+				f"Only used when {UpscaledCropPadStrategy.MIN_COST!r} strategy selected.\n"
+				"The cost of a single cropped pixel (it's generated by upscale, only to be discarded)."
+			),
+		}),
+		'pad_cost': (_IO.FLOAT, {
+			'default': _CropPadCosts._field_defaults['pad_pixel'], 'min': 0.0, 'max': 1e9, 'step': 0.1, 'round': 0.001,
+			'tooltip': (
+				f"Only used when {UpscaledCropPadStrategy.MIN_COST!r} strategy selected.\n"
+				"The cost of a single padded pixel (it needs out-painting). "
+				"Usually, way higher than the one of a cropped pixel."
+			),
+		}),
+		'operation_cost': (_IO.FLOAT, {
+			'default': _CropPadCosts._field_defaults['operation'], 'min': 0.0, 'max': 1e12, 'step': 1.0, 'round': 0.001,
+			'tooltip': (
+				f"Only used when {UpscaledCropPadStrategy.MIN_COST!r} strategy selected.\n"
+				"The fixed cost of doing a crop or a pad at all (e.g., an extra out-paint pass), "
+				"in the same units as per-pixel costs."
+			),
+		}),
+	},
 })
 
 
@@ -84,13 +122,14 @@ class BestResolutionUpscaledCropPad:
 	CATEGORY = _meta.category
 	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
 
-	OUTPUT_NODE = True
+	OUTPUT_NODE = not _meta.ui_report
 
 	FUNCTION = 'main'
 	RETURN_TYPES = (
 		_IO.FLOAT,
 		_IO.BOOLEAN, _IO.INT, _IO.INT, _IO.INT, _IO.INT,
 		_IO.BOOLEAN, _IO.INT, _IO.INT, _IO.INT, _IO.INT,
+		crop_pad_type,
 	)
 	RETURN_NAMES = tuple(_return_ttips_crop_pad.keys())
 	OUTPUT_TOOLTIPS = tuple(_return_ttips_crop_pad.values())
@@ -106,13 +145,197 @@ def main(
 		strategy: _t.Union[UpscaledCropPadStrategy, str],
 		align_x: float, align_y: float,
 		# show: bool,
-		unique_id: str = None
+		unique_id: str = None,
+		crop_cost: float = _CropPadCosts._field_defaults['crop_pixel'],
+		pad_cost: float = _CropPadCosts._field_defaults['pad_pixel'],
+		operation_cost: float = _CropPadCosts._field_defaults['operation'],
 	):
-		return _upscaled_crop_pad(
+		result = _upscaled_crop_pad(
 			upscale,
 			init_width, init_height, HD_width, HD_height,
 			_up_strategy_verify(strategy),
 			align_x, align_y,
 			# show,
-			unique_id=unique_id
+			unique_id=unique_id,
+			costs=_CropPadCosts(crop_cost, pad_cost, operation_cost),
 		)
+		return _node_output(tuple(result) + (result, ), unique_id)
+
+
+def _crop_pad_verify(crop_pad) -> _ResultUpscaledCropPad:
+	if isinstance(crop_pad, _ResultUpscaledCropPad):
+		return crop_pad
+	try:
+		return _ResultUpscaledCropPad(*crop_pad)
+	except TypeError:
+		raise TypeError(
+			f"Invalid crop/pad plan: {crop_pad!r}\n"
+			f"Expected the `crop_pad` output of \"Upscaled Crop/Pad (Best-Res)\" node"
+		) from None
+
+
+_input_types_apply_crop_pad = _deepfreeze({
+	'required': {
+		'image': (_IO.IMAGE, ),
+		'crop_pad': (crop_pad_type, {'tooltip': _return_ttips_crop_pad['crop_pad']}),
+		'upscale_method': (list(_upscale_methods), {'default': 'bicubic'}),
+		'pad_value': (_IO.FLOAT, {
+			'default': 0.5, 'min': 0.0, 'max': 1.0, 'step': 0.01,
+			'tooltip': "The color of the padded area (0.5 - gray, like \"Pad Image for Outpainting\" node does).",
+		}),
+	},
+})
+
+
+class BestResolutionApplyCropPad:
+	"""
+	Upscales, crops and pads the image - all according to the plan from "Upscaled Crop/Pad" node.
+
+	Does the same as a chain of scale, crop and pad nodes, but in a single pass: the output is allocated once,
+	and each image is written straight into it. No full-size intermediate images.
+	"""
+	NODE_NAME = 'BestResolutionApplyCropPad'
+	CATEGORY = _meta.category
+	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
+
+	FUNCTION = 'main'
+	RETURN_TYPES = (_IO.IMAGE, )
+	RETURN_NAMES = ('image', )
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return _input_types_apply_crop_pad
+
+	@staticmethod
+	def main(image, crop_pad, upscale_method: str, pad_value: float = 0.5):
+		from . import _crop_pad_impl as _impl
+
+		crop_pad = _crop_pad_verify(crop_pad)
+		layout = _crop_pad_layout(crop_pad, image.shape[2], image.shape[1])
+		return (_impl.apply_crop_pad(image, layout, upscale_method, pad_value), )
+
+
+_input_types_apply_crop_pad_latent = _deepfreeze({
+	'required': {
+		'samples': (_IO.LATENT, ),
+		'crop_pad': (crop_pad_type, {'tooltip': _return_ttips_crop_pad['crop_pad']}),
+		'upscale_method': (list(_latent_upscale_methods), {'default': 'bislerp'}),
+		'latent_factor': (_IO.INT, {
+			'default': 8, 'min': 1, 'max': 64, 'step': 1,
+			'tooltip': "How many pixels a single latent pixel corresponds to (8 for most of the image models).",
+		}),
+		'snap': (_IO.BOOLEAN, {
+			'default': True, 'label_on': 'to latent grid', 'label_off': 'no (error)',
+			'tooltip': (
+				"The plan is in pixels. When a crop offset or padding isn't divisible by the latent factor:\n"
+				"- snap: round it to the latent grid (the output may differ from HD size by a few pixels - "
+				"up to half the latent factor per value; the status and the console tell by how much);\n"
+				"- no: raise an error.\n"
+				"Choose `step`/`HD_step` which are multiples of the latent factor to avoid this entirely."
+			),
+		}),
+	},
+	'hidden': {
+		'unique_id': 'UNIQUE_ID',
+	},
+})
+
+
+class BestResolutionApplyCropPadLatent:
+	"""
+	Upscales, crops and pads the latent - all according to the plan from "Upscaled Crop/Pad" node.
+
+	The same as "Apply Crop/Pad", but right in the latent space: no VAE decode/encode round-trip.
+	Padding is filled with zero latent, and a matching noise mask is set (the padded area is to be out-painted).
+	"""
+	NODE_NAME = 'BestResolutionApplyCropPadLatent'
+	CATEGORY = _meta.category
+	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
+
+	FUNCTION = 'main'
+	RETURN_TYPES = (_IO.LATENT, )
+	RETURN_NAMES = ('samples', )
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return _input_types_apply_crop_pad_latent
+
+	@staticmethod
+	def main(
+		samples: _t.Dict[str, _t.Any], crop_pad, upscale_method: str, latent_factor: int = 8, snap: bool = True,
+		unique_id: str = None,
+	):
+		from . import _crop_pad_impl as _impl
+
+		crop_pad = _crop_pad_verify(crop_pad)
+		latent = samples['samples']
+		layout, snapped = _latent_crop_pad_layout(crop_pad, latent.shape[-1], latent.shape[-2], latent_factor, snap)
+		noise_mask = samples.get('noise_mask')
+		out_latent, out_mask = _impl.apply_crop_pad_latent(latent, layout, upscale_method, noise_mask)
+
+		out = dict(samples, samples=out_latent)
+		out.pop('noise_mask', None)
+		# With no padding and no mask before, no mask is set: the whole latent is denoised, as usual.
+		if noise_mask is not None or (layout.out_width, layout.out_height) != (layout.crop_width, layout.crop_height):
+			out['noise_mask'] = out_mask
+
+		snap_text = ''
+		if snapped:
+			# How far the snapped geometry is from the plan's pixel one (i.e., from what "Apply Crop/Pad" would do):
+			factor = max(int(latent_factor), 1)
+			px = _crop_pad_layout(crop_pad, latent.shape[-1] * factor, latent.shape[-2] * factor)
+			max_shift = max(abs(x * factor - y) for x, y in zip(layout, px))
+			snap_text = (
+				f"snapped to the latent grid: {layout.out_width * factor}×{layout.out_height * factor} px "
+				f"instead of {px.out_width}×{px.out_height}, sizes/offsets moved by up to {max_shift} px"
+			)
+			print(f"[Best Resolution] Apply Crop/Pad (latent): {snap_text}")
+
+		if _report_wanted(unique_id):
+			text = f"{layout.out_width}×{layout.out_height} latent ({layout.out_width * latent_factor}×{layout.out_height * latent_factor} px)"
+			if snap_text:
+				text = f"{text}\n⚠️ {snap_text}"
+			_show_text_on_node(text, unique_id)
+		return _node_output((out, ), unique_id)
+
+
+_input_types_outpaint_mask = _deepfreeze({
+	'required': {
+		'crop_pad': (crop_pad_type, {'tooltip': _return_ttips_crop_pad['crop_pad']}),
+		'feathering': (_IO.INT, {
+			'default': 40, 'min': 0, 'max': 16384, 'step': 1,
+			'tooltip': "The same as in \"Pad Image for Outpainting\" node.",
+		}),
+		'batch_size': (_IO.INT, {'default': 1, 'min': 1, 'max': 4096, 'step': 1}),
+	},
+})
+
+
+class BestResolutionOutpaintMask:
+	"""
+	The out-paint mask for the padding from "Upscaled Crop/Pad" node - the same as "Pad Image for Outpainting"
+	would give, but without padding the image itself.
+
+	Memory-light: the mask is built from a row and a column, so it doesn't take a full-resolution tensor
+	per image (or at all, when the padding is only on one axis).
+	"""
+	NODE_NAME = 'BestResolutionOutpaintMask'
+	CATEGORY = _meta.category
+	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
+
+	FUNCTION = 'main'
+	RETURN_TYPES = (_IO.MASK, )
+	RETURN_NAMES = ('mask', )
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return _input_types_outpaint_mask
+
+	@staticmethod
+	def main(crop_pad, feathering: int = 40, batch_size: int = 1):
+		from . import _crop_pad_impl as _impl
+
+		crop_pad = _crop_pad_verify(crop_pad)
+		# The padding doesn't depend on the image size, only on the plan:
+		layout = _crop_pad_layout(crop_pad, 0, 0)
+		return (_impl.outpaint_mask(layout, batch_size, feathering), )
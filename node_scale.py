@@ -11,7 +11,10 @@
 
 from comfy.comfy_types.node_typing import IO as _IO
 
-from ._funcs import simple_result_from_approx_wh as _simple_result_from_approx_wh
+from ._funcs import (
+	node_output as _node_output,
+	simple_result_from_approx_wh as _simple_result_from_approx_wh
+)
 from . import _meta
 from .docstring_formatter import format_docstring as _format_docstring
 from .slot_types import (
@@ -49,7 +52,7 @@ class BestResolutionScale:
 	CATEGORY = _meta.category
 	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
 
-	OUTPUT_NODE = True
+	OUTPUT_NODE = not _meta.ui_report
 
 	FUNCTION = 'main'
 	RETURN_TYPES = _return_types
@@ -64,7 +67,7 @@ def main(
 		width: int, height: int, step: int, scale: float, direction: bool,
 		# show: bool,
 		unique_id: str = None
-	) -> _t.Tuple[int, int, float]:
+	) -> _t.Union[_t.Tuple[int, int, float], _t.Dict[str, _t.Any]]:
 		scale = float(scale)
 		if not direction:
 			scale = 1.0 / scale
@@ -76,4 +79,4 @@ def main(
 			unique_id=unique_id, target_square_size=_sqrt(width_f * height_f),
 			status_suffix=f"\n({width}/{height}) * {scale:.3f} scale"
 		)
-		return out_width, out_height, scale
+		return _node_output((out_width, out_height, scale), unique_id)
@@ -15,105 +15,29 @@
 from . import _meta
 from .docstring_formatter import format_docstring as _format_docstring
 from .node_scale import _scale_type_dict as __scale_type_dict_base
-from ._funcs import _show_text_on_node
-
-
-# ==========================================================
-# Copy of built-in ComfyUI nodes with v1 schema,
-# as a temporary workaround
-
-
-import torch
-
-from comfy import model_management
-import comfy.utils
-
-
-class _ImageUpscaleWithModel:
-	@classmethod
-	def INPUT_TYPES(s):
-		return {"required": {
-			"upscale_model": ("UPSCALE_MODEL",), "image": ("IMAGE",),
-		}}
-	RETURN_TYPES = ("IMAGE",)
-	FUNCTION = "upscale"
-
-	CATEGORY = "image/upscaling"
-
-	def upscale(self, upscale_model, image):
-		device = model_management.get_torch_device()
-
-		memory_required = model_management.module_size(upscale_model.model)
-		memory_required += (512 * 512 * 3) * image.element_size() * max(upscale_model.scale, 1.0) * 384.0 #The 384.0 is an estimate of how much some of these models take, TODO: make it more accurate
-		memory_required += image.nelement() * image.element_size()
-		model_management.free_memory(memory_required, device)
-
-		upscale_model.to(device)
-		in_img = image.movedim(-1,-3).to(device)
-
-		tile = 512
-		overlap = 32
-
-		oom = True
-		while oom:
-			try:
-				steps = in_img.shape[0] * comfy.utils.get_tiled_scale_steps(in_img.shape[3], in_img.shape[2], tile_x=tile, tile_y=tile, overlap=overlap)
-				pbar = comfy.utils.ProgressBar(steps)
-				s = comfy.utils.tiled_scale(in_img, lambda a: upscale_model(a), tile_x=tile, tile_y=tile, overlap=overlap, upscale_amount=upscale_model.scale, pbar=pbar)
-				oom = False
-			except model_management.OOM_EXCEPTION as e:
-				tile //= 2
-				if tile < 128:
-					raise e
-
-		upscale_model.to("cpu")
-		s = torch.clamp(s.movedim(-3,-1), min=0, max=1.0)
-		return (s,)
-
-
-class _ImageScaleBy:
-	upscale_methods = ["nearest-exact", "bilinear", "area", "bicubic", "lanczos"]
-
-	@classmethod
-	def INPUT_TYPES(s):
-		return {"required": {
-			"image": ("IMAGE",), "upscale_method": (s.upscale_methods,),
-			"scale_by": ("FLOAT", {"default": 1.0, "min": 0.01, "max": 8.0, "step": 0.01}),
-		}}
-	RETURN_TYPES = ("IMAGE",)
-	FUNCTION = "upscale"
-
-	CATEGORY = "image/upscaling"
-
-	def upscale(self, image, upscale_method, scale_by):
-		samples = image.movedim(-1,1)
-		width = round(samples.shape[3] * scale_by)
-		height = round(samples.shape[2] * scale_by)
-		s = comfy.utils.common_upscale(samples, width, height, upscale_method, "disabled")
-		s = s.movedim(1,-1)
-		return (s,)
-
-
-# ==========================================================
-
-
-_ImageUpscaleWithModel_instance = _ImageUpscaleWithModel()
-__ImageUpscaleWithModel_input_types: _t.Dict[str, dict] = _ImageUpscaleWithModel_instance.INPUT_TYPES()
-__ImageUpscaleWithModel_input_types_required = __ImageUpscaleWithModel_input_types.get('required', dict())
-
-_ImageScaleBy_instance = _ImageScaleBy()
+from ._funcs import node_output as _node_output, _report_wanted, _show_text_on_node
+from .best_res_core.tiling import (
+	PreDownscalePlan as _PreDownscalePlan,
+	TilePlan as _TilePlan,
+	fixed_tile_plan as _fixed_tile_plan,
+	plan_pre_downscale as _plan_pre_downscale,
+)
+from .slot_types import inference_precisions as _inference_precisions, upscale_methods as _upscale_methods
+
+# The actual implementation (with torch and the copies of built-in nodes) is in `_upscale_impl` module.
+# It's imported only when the node is executed, so registering the pack doesn't import torch.
 
 __scale_type_dict: _t.Dict[str, _t.Any] = dict(__scale_type_dict_base, round=0.00001)
 
 _input_types = _deepfreeze({
 	'required': {
-		'upscale_model': __ImageUpscaleWithModel_input_types_required.get('upscale_model', (_IO.UPSCALE_MODEL, )),
-		'image': __ImageUpscaleWithModel_input_types_required.get('image', (_IO.IMAGE, )),
+		'upscale_model': (_IO.UPSCALE_MODEL, ),
+		'image': (_IO.IMAGE, ),
 		'model_scale': (
 			_IO.FLOAT,
 			dict(__scale_type_dict, default=2.0, tooltip='The upscale factor a model natively increases image by'),
 		),
-		'scale_method': (_ImageScaleBy.upscale_methods, {'default': 'bicubic'}),
+		'scale_method': (list(_upscale_methods), {'default': 'bicubic'}),
 		'scale': (
 			_IO.FLOAT,
 			dict(__scale_type_dict, default=1.5, tooltip='The actual factor you want to upscale by'),
@@ -126,7 +50,71 @@ def upscale(self, image, upscale_method, scale_by):
 			},
 		),
 	},
-	# 'optional': {},
+	'optional': {
+		'fused': (
+			_IO.BOOLEAN,
+			{
+				'default': False, 'label_on': 'per tile', 'label_off': 'after model',
+				'tooltip': (
+					"When to do the second scale:\n"
+					"- after model: the regular way, the entire image upscaled by model is scaled at once;\n"
+					"- per tile: each tile is scaled right after the model processes it, and blended directly "
+					"into the final image. The huge model-sized image never exists, so peak memory is MUCH lower "
+					"(for x1.5 with x4 model - about 7 times). Results are almost identical, with slight differences "
+					"at tile borders."
+				),
+			},
+		),
+		'pre_downscale': (
+			_IO.BOOLEAN,
+			{
+				'default': False, 'label_on': 'when it saves', 'label_off': 'never',
+				'tooltip': (
+					"When the target scale is much lower than the model's native one (say, x1.25 with a x4 model), "
+					"most of the model output is thrown away by the second scale.\n\n"
+					"When enabled, the image is shrunk first - just enough for the model output to still cover "
+					"the target size. So the model processes MUCH fewer pixels (and is that much faster), "
+					"at the cost of some detail lost. Only done if it saves at least a quarter of the model's work."
+				),
+			},
+		),
+		'batch_chunk': (
+			_IO.INT,
+			{
+				'default': 0, 'min': 0, 'max': 4096, 'step': 1,
+				'tooltip': (
+					"How many images of the batch to process at once. Each part is written into the output "
+					"right away, so peak memory depends on this number, not on the batch size.\n"
+					"0 = auto: as many as fit into a half of the free RAM."
+				),
+			},
+		),
+		'precision': (
+			list(_inference_precisions),
+			{
+				'default': 'as loaded',
+				'tooltip': (
+					"The dtype the upscale model runs in (the model is converted back afterwards):\n"
+					"- as loaded: whatever the model already has;\n"
+					"- auto: fp16 or bf16, if both the device and the model support it - otherwise, fp32;\n"
+					"- fp32 / bf16 / fp16: this one (fp32 if the model doesn't support it).\n"
+					"Half precisions are faster on modern GPUs and take less memory, with a barely noticeable "
+					"difference. If they overflow (inf/NaN, or values far outside of [0, 1] in the output), "
+					"it's re-done in fp32. Smaller precision losses within that range aren't detected."
+				),
+			},
+		),
+		'channels_last': (
+			_IO.BOOLEAN,
+			{
+				'default': False, 'label_on': 'channels last', 'label_off': 'default',
+				'tooltip': (
+					"Memory layout for the model and tiles. Channels-last is often faster for convolutional models "
+					"on GPUs with tensor cores (especially with fp16/bf16). The result is the same."
+				),
+			},
+		),
+	},
 	'hidden': {
 		'unique_id': 'UNIQUE_ID',  # used for text display at the bottom of the node
 	},
@@ -139,13 +127,56 @@ def upscale(self, image, upscale_method, scale_by):
 _half_upper_threshold = 0.5 + _epsilon * 0.5
 
 
-def _status_message(no_model_scale: bool, do_downscale: bool, model_scale: float, scale: float, second_downscale: float):
+def _tiles_message(tile_plan: _TilePlan, width: int, height: int) -> str:
+	"""The tiles the model processed, and what this saved compared to the usual fixed 512px tiles."""
+	fixed_plan = _fixed_tile_plan(width, height)
+	saved = 1.0 - tile_plan.pixels / fixed_plan.pixels if fixed_plan.pixels > 0 else 0.0
+	savings = [f"-{saved:.0%} pixels"] if saved >= 0.005 else []
+	if tile_plan.n_tiles < fixed_plan.n_tiles:
+		savings.append(f"{tile_plan.n_tiles} tiles instead of {fixed_plan.n_tiles}")
+	return f"🧩 {tile_plan}" + (f" ({', '.join(savings)})" if savings else '')
+
+
+def _pre_downscale_message(pre_plan: _PreDownscalePlan, width: int, height: int) -> str:
+	if not pre_plan.do_pre_downscale:
+		return "⏬ no pre-downscale (not worth it)"
+	return (
+		f"⏬ pre-downscale {width}×{height} → {pre_plan.in_width}×{pre_plan.in_height}: "
+		f"-{pre_plan.saved_ratio:.0%} model pixels"
+	)
+
+
+def _frame_memory(
+	in_size: _t.Tuple[int, int], model_in_size: _t.Tuple[int, int], out_size: _t.Tuple[int, int],
+	model_scale: float, n_channels: int, element_size: int,
+	use_model: bool, fused: bool,
+) -> int:
+	"""
+	Rough host memory, taken by processing of a single image from the batch. With the regular model upscale,
+	it's dominated by the model output: ``tiled_scale()`` keeps both the sum and the weights, plus a clamped copy.
+	"""
+	in_pixels = in_size[0] * in_size[1]
+	out_pixels = out_size[0] * out_size[1]
+	if not use_model:
+		return (in_pixels + 2 * out_pixels) * n_channels * element_size
+	if fused:
+		return (in_pixels + out_pixels) * n_channels * element_size + out_pixels * element_size
+	model_pixels = round(model_in_size[0] * model_scale) * round(model_in_size[1] * model_scale)
+	return (in_pixels + 3 * model_pixels + out_pixels) * n_channels * element_size
+
+
+def _status_message(
+	no_model_scale: bool, do_downscale: bool, model_scale: float, scale: float, second_downscale: float,
+	fused: bool = False,
+):
 	if no_model_scale:
 		return f"🤔❔ x{scale:.3f} (no model)"
 	if not do_downscale:
 		return f"x{scale:.3f} (no second scale)"
 
 	base_msg = f"x{scale:.3f} = x{model_scale:.3f} → <strong>x{second_downscale:.3f}</strong>"
+	if fused:
+		base_msg += " (per tile)"
 	if scale > model_scale:
 		return f"‼️ <strong>VERY</strong> blurry output\n{base_msg}"
 	if scale > (model_scale - 0.5 + _epsilon):
@@ -177,27 +208,94 @@ def main(
 		upscale_model, image, model_scale: float, scale_method, scale: float,
 		show_status: bool = False,
 		unique_id: str = None,
+		fused: bool = False,
+		pre_downscale: bool = False,
+		batch_chunk: int = 0,
+		precision: str = 'as loaded',
+		channels_last: bool = False,
 	) -> _t.Tuple[str]:
 		"""
 		A simple wrapper over ``ImageUpscaleWithModel`` and ``ImageScaleBy``.
 
 		First, up-scales with model. Then, (down)scales to get to the desired scale factor.
 		"""
+		from . import _upscale_impl as _impl
+
 		second_downscale = scale / model_scale
 		do_downscale = abs(second_downscale - 1.0) > _epsilon
 		no_model_scale = (
 			scale <= _half_upper_threshold
 			or abs(model_scale - 1.0) <= _epsilon
 		)
-		if no_model_scale:
-			out_image = _ImageScaleBy_instance.upscale(image, scale_method, scale)[0]
-		else:
-			out_image = _ImageUpscaleWithModel_instance.upscale(upscale_model, image)[0]
-			if do_downscale:
-				out_image = _ImageScaleBy_instance.upscale(out_image, scale_method, second_downscale)[0]
+		fused = bool(fused) and do_downscale and not no_model_scale
+		n_frames, in_height, in_width, n_channels = image.shape
+		model_in_size = (in_width, in_height)
+
+		actual_model_scale = float(getattr(upscale_model, 'scale', model_scale))
+		# The same final size as ``ImageScaleBy`` gives for the model output:
+		out_size: _t.Tuple[int, int] = (
+			(round(in_width * scale), round(in_height * scale)) if no_model_scale else (
+				round(round(in_width * actual_model_scale) * second_downscale),
+				round(round(in_height * actual_model_scale) * second_downscale),
+			)
+		)
 
-		if show_status and unique_id:
-			msg = _status_message(no_model_scale, do_downscale, model_scale, scale, second_downscale)
+		fmt = None if no_model_scale else _impl.inference_format(upscale_model, precision, channels_last)
+
+		pre_plan: _t.Optional[_PreDownscalePlan] = None
+		if pre_downscale and do_downscale and not no_model_scale:
+			# Tile pixels are counted for the same tiles the model will actually be run with:
+			pre_plan = _plan_pre_downscale(
+				in_width, in_height, *out_size, actual_model_scale,
+				max_tile_area=_impl.max_tile_area(upscale_model, fmt, fused),
+			)
+			if pre_plan.do_pre_downscale:
+				model_in_size = (pre_plan.in_width, pre_plan.in_height)
+
+		def process(frames) -> _t.Tuple[_t.Any, _t.Tuple[_t.Optional[_TilePlan], _t.Any]]:
+			"""The whole pipeline, for a part of the batch. Also returns the tile plan and the format actually used."""
+			if no_model_scale:
+				return _impl.ImageScaleBy_instance.upscale(frames, scale_method, scale)[0], (None, None)
+			if pre_plan is not None and pre_plan.do_pre_downscale:
+				model_in = _impl.scale_to_size(frames, 'area', *model_in_size)
+				if fused:
+					out_frames, plan, used_fmt = _impl.ImageUpscaleByWithModelFused_instance.upscale_with_plan(
+						upscale_model, model_in, scale_method, out_size=out_size, fmt=fmt
+					)
+					return out_frames, (plan, used_fmt)
+				out_frames, plan, used_fmt = _impl.ImageUpscaleWithModel_instance.upscale_with_plan(
+					upscale_model, model_in, fmt
+				)
+				return _impl.scale_to_size(out_frames, scale_method, *out_size), (plan, used_fmt)
+			if fused:
+				out_frames, plan, used_fmt = _impl.ImageUpscaleByWithModelFused_instance.upscale_with_plan(
+					upscale_model, frames, scale_method, second_downscale, fmt=fmt
+				)
+				return out_frames, (plan, used_fmt)
+			out_frames, plan, used_fmt = _impl.ImageUpscaleWithModel_instance.upscale_with_plan(
+				upscale_model, frames, fmt
+			)
+			if do_downscale:
+				out_frames = _impl.ImageScaleBy_instance.upscale(out_frames, scale_method, second_downscale)[0]
+			return out_frames, (plan, used_fmt)
+
+		if batch_chunk < 1:
+			batch_chunk = _impl.auto_batch_chunk(_frame_memory(
+				(in_width, in_height), model_in_size, out_size, actual_model_scale, n_channels, image.element_size(),
+				not no_model_scale, fused,
+			))
+		out_image, (tile_plan, used_fmt) = _impl.process_in_chunks(image, batch_chunk, process)
+
+		if show_status and _report_wanted(unique_id):
+			msg = _status_message(no_model_scale, do_downscale, model_scale, scale, second_downscale, fused)
+			if pre_plan is not None:
+				msg = f"{msg}\n{_pre_downscale_message(pre_plan, in_width, in_height)}"
+			if tile_plan is not None:
+				msg = f"{msg}\n{_tiles_message(tile_plan, *model_in_size)}"
+			if used_fmt is not None and (used_fmt.dtype is not None or used_fmt.channels_last):
+				msg = f"{msg}\n⚙️ {used_fmt}"
+			if batch_chunk < n_frames:
+				msg = f"{msg}\n📦 {n_frames} images, by {batch_chunk}"
 			_show_text_on_node(msg, unique_id)
 
-		return (out_image, )
+		return _node_output((out_image, ), unique_id)
@@ -14,7 +14,7 @@
 	format_docstring as _format_docstring,
 	format_object_docstring as _format_object_docstring
 )
-from .enums import *
+from .best_res_core.enums import *
 
 # ----------------------------------------------------------
 
@@ -72,6 +72,24 @@ def main(
 
 # ----------------------------------------------------------
 
+_rounding_mode_data_type = RoundingMode.all_values()
+_rounding_mode_data_type_set = set(_rounding_mode_data_type)
+_rounding_mode_in_type = (
+	_rounding_mode_data_type,
+	{
+		'default': RoundingMode.HEURISTIC,
+		'tooltip': _format_object_docstring(RoundingMode),
+	}
+)
+
+
+def _rounding_mode_verify(mode: _t.Union[RoundingMode, str]) -> str:
+	if mode not in _rounding_mode_data_type_set:
+		raise ValueError(f"Invalid value for rounding mode: {mode!r}\nExpected one of: {_rounding_mode_data_type!r}")
+	return str(mode)
+
+# ----------------------------------------------------------
+
 _up_strategy_data_type = UpscaledCropPadStrategy.all_values()
 _up_strategy_data_type_set = set(_up_strategy_data_type)
 _up_strategy_in_type = (
@@ -14,13 +14,21 @@
 from comfy.comfy_types.node_typing import IO as _IO
 
 from ._funcs import (
+	node_output as _node_output,
+	simple_result_from_approx_wh as _simple_result_from_approx_wh,
+	_report_wanted,
+	_show_text_on_node,
+)
+from . import _meta, _resolution_tables
+from .best_res_core.enums import *
+from .best_res_core.lattice import nearest_resolutions as _nearest_resolutions
+from .best_res_core.rounding import (
 	aspect_ratios_sorted as _aspect_ratios_sorted,
 	number_to_int as _number_to_int,
 	float_width_height_from_area as _float_width_height_from_area,
-	simple_result_from_approx_wh as _simple_result_from_approx_wh
 )
-from . import _meta
 from .docstring_formatter import format_docstring as _format_docstring
+from .nodes_prims import _rounding_mode_in_type, _rounding_mode_verify
 from .slot_types import (
 	type_dict_res as _type_dict_res,
 	type_dict_step_init as _type_dict_step_init
@@ -70,7 +78,7 @@ class BestResolutionSimple:
 	CATEGORY = _meta.category
 	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
 
-	OUTPUT_NODE = True
+	OUTPUT_NODE = not _meta.ui_report
 
 	FUNCTION = 'main'
 	RETURN_TYPES = _return_types_simple
@@ -86,11 +94,12 @@ def main(
 		# show: bool,
 		unique_id: str = None
 	):
-		return _simple_result_from_approx_wh(
+		result = _simple_result_from_approx_wh(
 			float(width), height, step,
 			# show,
 			unique_id=unique_id, target_square_size=_sqrt(width * height)
 		)
+		return _node_output(result, unique_id)
 
 # ----------------------------------------------------------
 
@@ -144,7 +153,7 @@ class BestResolutionFromAspectRatio:
 	CATEGORY = _meta.category
 	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
 
-	OUTPUT_NODE = True
+	OUTPUT_NODE = not _meta.ui_report
 
 	FUNCTION = 'main'
 	RETURN_TYPES = _return_types_simple
@@ -172,11 +181,12 @@ def main(
 			# The opposite: height is bigger
 			width_f, height_f = height_f, width_f
 
-		return _simple_result_from_approx_wh(
+		result = _simple_result_from_approx_wh(
 			width_f, height_f, step,
 			# show,
 			unique_id=unique_id, target_square_size=_sqrt(width_f * height_f)
 		)
+		return _node_output(result, unique_id)
 
 # ----------------------------------------------------------
 
@@ -198,7 +208,31 @@ def main(
 	'hidden': {
 		'unique_id': 'UNIQUE_ID',
 	},
-	# 'optional': {},
+	'optional': {
+		'rounding': _rounding_mode_in_type,
+	},
+})
+
+
+_tooltip_area_tolerance = (
+	"How far (in %) the total resolution may deviate from the desired one.\n\n"
+	"All the step-multiples within this area band are considered, and the closest ones to the desired "
+	"resolution are picked - by both aspect ratio and area (relative differences, in log scale)."
+)
+
+_input_types_area_node = _deepfreeze({
+	'required': dict(_input_types_area['required']),
+	'hidden': dict(_input_types_area['hidden']),
+	'optional': dict(
+		_input_types_area['optional'],
+		area_tolerance=(_IO.FLOAT, {
+			'default': 0.0, 'min': 0.0, 'max': 50.0, 'step': 0.5, 'round': 0.01,
+			'tooltip': _tooltip_area_tolerance + (
+				"\n\n0 - disabled: width and height are just rounded (with the selected `rounding` mode). "
+				"Otherwise, `rounding` is only used if the band has no step-multiples at all."
+			),
+		}),
+	),
 })
 
 
@@ -221,7 +255,7 @@ class BestResolutionFromArea:
 	CATEGORY = _meta.category
 	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
 
-	OUTPUT_NODE = True
+	OUTPUT_NODE = not _meta.ui_report
 
 	FUNCTION = 'main'
 	RETURN_TYPES = _return_types_simple
@@ -229,18 +263,107 @@ class BestResolutionFromArea:
 
 	@classmethod
 	def INPUT_TYPES(cls):
-		return _input_types_area
+		return _input_types_area_node
 
 	def main(
 		self,
 		square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float,
 		# show: bool,
-		unique_id: str = None
+		unique_id: str = None,
+		rounding: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+		area_tolerance: float = 0.0,
 	):
 		square_size: int = _number_to_int(square_size)
+		step: int = _number_to_int(step)
+		rounding = _rounding_mode_verify(rounding)
 		width_f, height_f = _float_width_height_from_area(square_size, landscape, aspect_a, aspect_b)
-		return _simple_result_from_approx_wh(
+
+		rounded = None
+		status_suffix = ''
+		if area_tolerance > 0.0:
+			# The closest step-multiple within the area band (if the band isn't too narrow for the step):
+			nearest = _nearest_resolutions(width_f, height_f, step, area_tolerance / 100.0, k=1)
+			if nearest:
+				width, height, _ = nearest[0]
+				rounded = (width, width // step, height, height // step)
+				status_suffix = f"\n±{area_tolerance:g}% area: nearest in the band (`rounding` not used)"
+			else:
+				status_suffix = f"\n±{area_tolerance:g}% area: no step-multiples in the band, rounded"
+		elif rounding == RoundingMode.HEURISTIC:
+			# The common presets are precomputed (only for the default mode, which the table is made with):
+			rounded = _resolution_tables.lookup(square_size, step, landscape, aspect_a, aspect_b)
+
+		result = _simple_result_from_approx_wh(
 			width_f, height_f, step,
 			# show,
-			unique_id=unique_id, target_square_size=square_size
+			unique_id=unique_id, target_square_size=square_size, mode=rounding, rounded=rounded,
+			status_suffix=status_suffix,
 		)
+		return _node_output(result, unique_id)
+
+# ----------------------------------------------------------
+
+_input_types_alternatives = _deepfreeze({
+	'required': dict(
+		_input_types_area['required'],
+		count=(_IO.INT, {
+			'default': 5, 'min': 1, 'max': 64, 'step': 1,
+			'tooltip': "How many alternative resolutions to output (at most).",
+		}),
+		area_tolerance=(_IO.FLOAT, {
+			'default': 10.0, 'min': 0.5, 'max': 50.0, 'step': 0.5, 'round': 0.01,
+			'tooltip': _tooltip_area_tolerance,
+		}),
+	),
+	'hidden': dict(_input_types_area['hidden']),
+})
+
+
+class BestResolutionAlternatives:
+	"""
+	The alternatives to "Best-Res (area)" result: the step-multiple resolutions closest to the desired one
+	(by both aspect ratio and area), the closest first.
+
+	Outputs lists - so everything downstream is executed once per resolution (e.g., to try a few of them at once).
+	"""
+	NODE_NAME = 'BestResolutionAlternatives'
+	CATEGORY = _meta.category
+	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
+
+	OUTPUT_NODE = not _meta.ui_report
+
+	FUNCTION = 'main'
+	RETURN_TYPES = _return_types_simple
+	RETURN_NAMES = _return_names_simple
+	OUTPUT_IS_LIST = (True, True)
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return _input_types_alternatives
+
+	def main(
+		self,
+		square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float,
+		count: int, area_tolerance: float,
+		unique_id: str = None,
+	):
+		square_size: int = _number_to_int(square_size)
+		step: int = _number_to_int(step)
+		width_f, height_f = _float_width_height_from_area(square_size, landscape, aspect_a, aspect_b)
+		nearest = _nearest_resolutions(width_f, height_f, step, area_tolerance / 100.0, k=count)
+		if not nearest:
+			raise ValueError(
+				f"No resolution divisible by {step} has the area within ±{area_tolerance:g}% of {square_size}²: "
+				f"increase the tolerance."
+			)
+		result = ([x.width for x in nearest], [x.height for x in nearest])
+
+		if _report_wanted(unique_id):
+			aspect_f = width_f / height_f
+			area_f = width_f * height_f
+			_show_text_on_node('\n'.join(
+				f"{x.width}/{x.height}: AR {x.width / x.height:.3f} ({x.width / x.height / aspect_f - 1.0:+.1%}), "
+				f"area {x.width * x.height / area_f - 1.0:+.1%}"
+				for x in nearest
+			), unique_id)
+		return _node_output(result, unique_id)
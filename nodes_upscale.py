@@ -12,15 +12,18 @@
 from comfy.comfy_types.node_typing import IO as _IO
 
 from ._funcs import (
-	number_to_int as _number_to_int,
-	float_width_height_from_area as _float_width_height_from_area,
+	node_output as _node_output,
 	upscale_result_from_approx_wh as _upscale_result_from_approx_wh
 )
 from . import _meta
+from .best_res_core.enums import *
+from .best_res_core.rounding import (
+	number_to_int as _number_to_int,
+	float_width_height_from_area as _float_width_height_from_area,
+)
 from .docstring_formatter import format_docstring as _format_docstring
-from .enums import *
 from .nodes_simple import _input_types_area
-from .nodes_prims import _res_priority_in_type, _res_priority_verify
+from .nodes_prims import _res_priority_in_type, _res_priority_verify, _rounding_mode_verify
 from .slot_types import (
 	type_dict_step_upscale1 as _type_dict_step_upscale1,
 	upscale_in_type as _upscale_in_type
@@ -63,7 +66,23 @@
 	'hidden': {
 		'unique_id': 'UNIQUE_ID',
 	},
-	# 'optional': {},
+	'optional': dict(
+		_input_types_area['optional'],
+		area_tolerance=(_IO.FLOAT, {
+			'default': 10.0, 'min': 0.0, 'max': 50.0, 'step': 0.5, 'round': 0.01,
+			'tooltip': (
+				"Only for `exact-uniform` priority.\n"
+				"How far (in %) both the initial and the HD total resolution may deviate from the desired ones."
+			),
+		}),
+		aspect_tolerance=(_IO.FLOAT, {
+			'default': 2.0, 'min': 0.0, 'max': 50.0, 'step': 0.5, 'round': 0.01,
+			'tooltip': (
+				"Only for `exact-uniform` priority.\n"
+				"How far (in %) the aspect ratio may deviate from the desired one."
+			),
+		}),
+	),
 })
 
 
@@ -88,7 +107,7 @@ class BestResolutionFromAreaUpscale:
 	CATEGORY = _meta.category
 	DESCRIPTION = _format_docstring(_cleandoc(__doc__))
 
-	OUTPUT_NODE = True
+	OUTPUT_NODE = not _meta.ui_report
 
 	FUNCTION = 'main'
 	RETURN_TYPES = _return_types_upscale
@@ -103,13 +122,24 @@ def main(
 		self, square_size: int, step: int, landscape: bool, aspect_a: float, aspect_b: float,
 		priority: _t.Union[RoundingPriority, str], upscale: float, HD_step:int,
 		# show: bool,
-		unique_id: str = None
+		unique_id: str = None,
+		rounding: _t.Union[RoundingMode, str] = RoundingMode.HEURISTIC,
+		area_tolerance: float = 10.0,
+		aspect_tolerance: float = 2.0,
 	):
 		square_size: int = _number_to_int(square_size)
+		priority = _res_priority_verify(priority)
 		width_f, height_f = _float_width_height_from_area(square_size, landscape, aspect_a, aspect_b)
-		return _upscale_result_from_approx_wh(
+		# Tolerances only affect (and are only in the cache key of) the priority which uses them:
+		tolerances = (
+			(area_tolerance / 100.0, aspect_tolerance / 100.0)
+			if priority == RoundingPriority.EXACT_UNIFORM else (None, None)
+		)
+		result = _upscale_result_from_approx_wh(
 			width_f, height_f, step,
-			_res_priority_verify(priority), upscale, HD_step,
+			priority, upscale, HD_step,
 			# show,
-			unique_id=unique_id, target_square_size=square_size
+			unique_id=unique_id, target_square_size=square_size, mode=_rounding_mode_verify(rounding),
+			area_tolerance=tolerances[0], aspect_tolerance=tolerances[1],
 		)
+		return _node_output(result, unique_id)
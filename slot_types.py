@@ -22,6 +22,13 @@ def number_type_dict(default: int = 512, min: int = 1, max: int = _sys.maxsize,
 	}
 
 
+# The same as in built-in "Upscale Image By" node:
+upscale_methods = ("nearest-exact", "bilinear", "area", "bicubic", "lanczos")
+# The same as in built-in "Upscale Latent" node:
+latent_upscale_methods = ("nearest-exact", "bilinear", "area", "bicubic", "bislerp")
+# Upscale model inference precision: "as loaded" keeps the model's own dtype, "auto" picks the fastest safe one:
+inference_precisions = ("as loaded", "auto", "fp32", "bf16", "fp16")
+
 type_dict_res = number_type_dict(1024)
 type_dict_step_default = number_type_dict(8)
 type_dict_step_init = number_type_dict(8*2*3)
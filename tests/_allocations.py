@@ -0,0 +1,37 @@
+# encoding: utf-8
+"""
+Counting tensor allocations: every op's output which doesn't share storage with any of its inputs is a new tensor.
+Works the same on any device - unlike ``torch.cuda.max_memory_allocated()``.
+"""
+
+import typing as _t
+
+import torch
+from torch.utils._python_dispatch import TorchDispatchMode as _TorchDispatchMode
+from torch.utils._pytree import tree_flatten as _tree_flatten
+
+
+def _tensors(value) -> _t.List[torch.Tensor]:
+	return [x for x in _tree_flatten(value)[0] if isinstance(x, torch.Tensor)]
+
+
+class AllocationCounter(_TorchDispatchMode):
+	"""Within ``with``, records ``(op name, bytes)`` of each newly allocated tensor (views aren't counted)."""
+
+	def __init__(self):
+		super().__init__()
+		self.allocations: _t.List[_t.Tuple[str, int]] = list()
+
+	def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+		kwargs = kwargs or dict()
+		in_storages = {x.untyped_storage().data_ptr() for x in _tensors((args, kwargs))}
+		out = func(*args, **kwargs)
+		for x in _tensors(out):
+			storage = x.untyped_storage()
+			if storage.data_ptr() not in in_storages:
+				self.allocations.append((str(func), storage.nbytes()))
+		return out
+
+	def at_least(self, n_bytes: int) -> _t.List[_t.Tuple[str, int]]:
+		"""The allocations of this size or bigger."""
+		return [x for x in self.allocations if x[1] >= n_bytes]
@@ -0,0 +1,199 @@
+# encoding: utf-8
+"""
+Stand-ins for the torch-dependent ComfyUI modules (``comfy.model_management``, ``comfy.utils``) and ``folder_paths``,
+registered only if the real ones aren't importable.
+
+``get_tiled_scale_steps()`` and ``tiled_scale()`` are copied from ComfyUI's ``comfy/utils.py`` (only the parts
+for a plain numeric ``upscale_amount`` are kept) - the tile layout is what the pack's tile planning has to match.
+"""
+
+from importlib import import_module as _import_module
+from pathlib import Path as _Path
+import itertools as _itertools
+import math as _math
+import sys as _sys
+import types as _types
+
+import torch
+
+
+def _new_module(name: str, **attrs) -> _types.ModuleType:
+	module = _types.ModuleType(name)
+	module.__dict__.update(attrs)
+	_sys.modules[name] = module
+	if '.' in name:
+		parent, _, child = name.rpartition('.')
+		setattr(_sys.modules[parent], child, module)
+	return module
+
+
+# ==========================================================
+# comfy.model_management
+
+
+def _get_torch_device():
+	return torch.device('cpu')
+
+
+def _get_free_memory(dev=None, torch_free_too=False):
+	return (8 << 30, 8 << 30) if torch_free_too else 8 << 30
+
+
+def _get_total_memory(dev=None, torch_total_too=False):
+	return (16 << 30, 16 << 30) if torch_total_too else 16 << 30
+
+
+def _free_memory(memory_required, device, keep_loaded=()):
+	pass
+
+
+def _module_size(module):
+	return sum(x.nelement() * x.element_size() for x in module.state_dict().values())
+
+
+def _should_use_half(device=None, model_params=0, prioritize_performance=True, manual_cast=False):
+	return False
+
+
+# ==========================================================
+# comfy.utils
+
+
+class _ProgressBar:
+	def __init__(self, total):
+		self.total = total
+		self.current = 0
+
+	def update(self, value):
+		self.current += value
+
+	def update_absolute(self, value, total=None, preview=None):
+		self.current = value
+
+
+def _common_upscale(samples, width, height, upscale_method, crop):
+	mode = 'bicubic' if upscale_method == 'lanczos' else upscale_method
+	kwargs = dict() if mode in ('nearest-exact', 'area') else {'align_corners': False}
+	return torch.nn.functional.interpolate(samples, size=(height, width), mode=mode, **kwargs)
+
+
+def _get_tiled_scale_steps(width, height, tile_x, tile_y, overlap):
+	rows = 1 if height <= tile_y else _math.ceil((height - overlap) / (tile_y - overlap))
+	cols = 1 if width <= tile_x else _math.ceil((width - overlap) / (tile_x - overlap))
+	return rows * cols
+
+
+@torch.inference_mode()
+def _tiled_scale_multidim(
+	samples, function, tile=(64, 64), overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", pbar=None,
+):
+	dims = len(tile)
+	upscale_amount = [upscale_amount] * dims
+	overlap = [overlap] * dims
+
+	def get_upscale(dim, val):
+		return upscale_amount[dim] * val
+
+	def mult_list_upscale(a):
+		return [round(get_upscale(i, a[i])) for i in range(len(a))]
+
+	output = torch.empty([samples.shape[0], out_channels] + mult_list_upscale(samples.shape[2:]), device=output_device)
+
+	for b in range(samples.shape[0]):
+		s = samples[b:b+1]
+
+		# handle entire input fitting in a single tile
+		if all(s.shape[d+2] <= tile[d] for d in range(dims)):
+			output[b:b+1] = function(s).to(output_device)
+			if pbar is not None:
+				pbar.update(1)
+			continue
+
+		out = torch.zeros([s.shape[0], out_channels] + mult_list_upscale(s.shape[2:]), device=output_device)
+		out_div = torch.zeros([s.shape[0], out_channels] + mult_list_upscale(s.shape[2:]), device=output_device)
+
+		positions = [range(0, s.shape[d+2] - overlap[d], tile[d] - overlap[d]) if s.shape[d+2] > tile[d] else [0] for d in range(dims)]
+
+		for it in _itertools.product(*positions):
+			s_in = s
+			upscaled = []
+
+			for d in range(dims):
+				pos = max(0, min(s.shape[d + 2] - overlap[d], it[d]))
+				l = min(tile[d], s.shape[d + 2] - pos)
+				s_in = s_in.narrow(d + 2, pos, l)
+				upscaled.append(round(get_upscale(d, pos)))
+
+			ps = function(s_in).to(output_device)
+			mask = torch.ones_like(ps)
+
+			for d in range(2, dims + 2):
+				feather = round(get_upscale(d - 2, overlap[d - 2]))
+				if feather >= mask.shape[d]:
+					continue
+				for t in range(feather):
+					a = (t + 1) / feather
+					mask.narrow(d, t, 1).mul_(a)
+					mask.narrow(d, mask.shape[d] - 1 - t, 1).mul_(a)
+
+			o = out
+			o_d = out_div
+			for d in range(dims):
+				o = o.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+				o_d = o_d.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+
+			o.add_(ps * mask)
+			o_d.add_(mask)
+
+			if pbar is not None:
+				pbar.update(1)
+
+		output[b:b+1] = out/out_div
+	return output
+
+
+def _tiled_scale(
+	samples, function, tile_x=64, tile_y=64, overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", pbar=None,
+):
+	return _tiled_scale_multidim(
+		samples, function, (tile_y, tile_x), overlap=overlap, upscale_amount=upscale_amount,
+		out_channels=out_channels, output_device=output_device, pbar=pbar,
+	)
+
+
+# ==========================================================
+
+
+def _importable(name: str) -> bool:
+	try:
+		_import_module(name)
+	except ImportError:
+		return False
+	return True
+
+
+def install(user_dir: _Path):
+	"""Register the stand-ins (for those modules which aren't importable). User files go to ``user_dir``."""
+	if not _importable('folder_paths'):
+		_new_module('folder_paths', get_user_directory=lambda: str(user_dir))
+	if not _importable('comfy.model_management'):
+		_new_module(
+			'comfy.model_management',
+			OOM_EXCEPTION=torch.cuda.OutOfMemoryError,
+			get_torch_device=_get_torch_device,
+			get_free_memory=_get_free_memory,
+			get_total_memory=_get_total_memory,
+			free_memory=_free_memory,
+			module_size=_module_size,
+			should_use_fp16=_should_use_half,
+			should_use_bf16=_should_use_half,
+		)
+	if not _importable('comfy.utils'):
+		_new_module(
+			'comfy.utils',
+			ProgressBar=_ProgressBar,
+			common_upscale=_common_upscale,
+			get_tiled_scale_steps=_get_tiled_scale_steps,
+			tiled_scale_multidim=_tiled_scale_multidim,
+			tiled_scale=_tiled_scale,
+		)
@@ -0,0 +1,25 @@
+# encoding: utf-8
+"""
+The pack is imported the way ComfyUI does it - as a package (see ``benchmarks/_stubs.py``), with stand-ins
+for the ComfyUI modules which aren't importable. With ComfyUI's folder on ``PYTHONPATH``, the real ones are used.
+
+Files the pack stores in ComfyUI's user directory go to a temporary one.
+"""
+
+from pathlib import Path as _Path
+from tempfile import mkdtemp as _mkdtemp
+import atexit as _atexit
+import shutil as _shutil
+import sys as _sys
+
+_sys.path.insert(0, str(_Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+import _stubs
+import _comfy_fakes
+
+user_dir = _Path(_mkdtemp(prefix='best_resolution_tests_'))
+_atexit.register(_shutil.rmtree, user_dir, True)
+
+_stubs.install_comfy_stubs()
+_comfy_fakes.install(user_dir)
+pack = _stubs.import_pack()
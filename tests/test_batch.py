@@ -0,0 +1,98 @@
+# encoding: utf-8
+"""
+NumPy batch functions (``best_res_core.batch``) vs the scalar ones, element by element: the results must be
+bit-identical.
+"""
+
+import typing as _t
+
+import numpy as np
+import pytest
+
+from best_resolution.best_res_core import batch as _batch
+from best_resolution.best_res_core import rounding as _rounding
+from best_resolution.best_res_core.enums import RoundingPriority
+
+_steps = (1, 2, 3, 7, 8, 16, 48, 64, 144, 1024)
+
+
+def _random_inputs(seed: int, n: int) -> _t.Dict[str, np.ndarray]:
+	rng = np.random.default_rng(seed)
+	# Tiny (smaller than the step), usual and huge sizes:
+	n_tiny, n_usual = n // 4, n // 2
+	square_size = np.concatenate([
+		rng.uniform(0.5, 16.0, n_tiny),
+		rng.uniform(256.0, 4096.0, n_usual),
+		10.0 ** rng.uniform(5.0, 9.0, n - n_tiny - n_usual),
+	])
+	rng.shuffle(square_size)
+	return dict(
+		square_size=square_size,
+		landscape=rng.integers(0, 2, n).astype(bool),
+		# Including values below the clamp (1.0), and exact ties of both aspects:
+		aspect_a=np.where(rng.random(n) < 0.1, 1.0, rng.uniform(0.5, 21.0, n)),
+		aspect_b=np.where(rng.random(n) < 0.1, 1.0, rng.uniform(0.5, 9.0, n)),
+		step=rng.choice(_steps, n),
+		hd_step=rng.choice(_steps, n),
+		# Including upscales below 1.0 (clamped to it):
+		upscale=np.where(rng.random(n) < 0.1, rng.uniform(0.5, 1.0, n), rng.uniform(1.0, 4.0, n)),
+	)
+
+
+def _float_width_height(inputs) -> _t.Tuple[np.ndarray, np.ndarray]:
+	return _batch.float_width_height_from_area_batch(
+		inputs['square_size'], inputs['landscape'], inputs['aspect_a'], inputs['aspect_b'],
+	)
+
+
+def test_float_width_height_from_area():
+	inputs = _random_inputs(0, 2000)
+	width_f, height_f = _float_width_height(inputs)
+	for i in range(len(width_f)):
+		expected = _rounding.float_width_height_from_area(
+			float(inputs['square_size'][i]), bool(inputs['landscape'][i]),
+			float(inputs['aspect_a'][i]), float(inputs['aspect_b'][i]),
+		)
+		assert (width_f[i], height_f[i]) == expected
+
+
+def test_round_width_and_height_closest_to_the_ratio():
+	inputs = _random_inputs(1, 2000)
+	width_f, height_f = _float_width_height(inputs)
+	step = inputs['step']
+	batch = _batch.round_width_and_height_closest_to_the_ratio_batch(width_f, height_f, step)
+	for i in range(len(width_f)):
+		expected = _rounding.round_width_and_height_closest_to_the_ratio(
+			float(width_f[i]), float(height_f[i]), int(step[i]),
+		)
+		assert tuple(int(x[i]) for x in batch) == expected
+
+
+@pytest.mark.parametrize('priority', list(RoundingPriority))
+def test_upscale_result_from_approx_wh(priority):
+	n = 200 if priority == RoundingPriority.EXACT_UNIFORM else 2000
+	inputs = _random_inputs(2, n)
+	if priority == RoundingPriority.EXACT_UNIFORM:
+		# It's a search over the lattice: huge sizes with small steps would take forever.
+		inputs['square_size'] = np.minimum(inputs['square_size'], 4096.0)
+	width_f, height_f = _float_width_height(inputs)
+	step, upscale, hd_step = inputs['step'], inputs['upscale'], inputs['hd_step']
+	batch = _batch.upscale_result_from_approx_wh_batch(width_f, height_f, step, priority, upscale, hd_step)
+	for i in range(n):
+		expected = _rounding.upscale_result_from_approx_wh(
+			float(width_f[i]), float(height_f[i]), int(step[i]), priority, float(upscale[i]), int(hd_step[i]),
+		)
+		actual = tuple(x[i] for x in batch)
+		assert actual == expected
+		# Bit-identical, not just equal:
+		assert float(actual[0]).hex() == float(expected[0]).hex()
+
+
+def test_broadcasting():
+	# A single step/upscale for the whole batch:
+	width_f, height_f = _batch.float_width_height_from_area_batch([512, 1024, 1536], True, 16.0, 9.0)
+	batch = _batch.upscale_result_from_approx_wh_batch(width_f, height_f, 64, RoundingPriority.DESIRED, 1.5, 8)
+	for i in range(3):
+		assert tuple(x[i] for x in batch) == _rounding.upscale_result_from_approx_wh(
+			float(width_f[i]), float(height_f[i]), 64, RoundingPriority.DESIRED, 1.5, 8,
+		)
@@ -0,0 +1,97 @@
+# encoding: utf-8
+"""
+Memory-budget planning (``best_res_core.budget``): fitting the cost model, and solving for the batch size.
+"""
+
+from itertools import product as _product
+import random as _random
+
+import pytest
+
+from _stubs import import_pack_module
+
+from best_resolution.best_res_core import budget as _budget
+
+nodes_simple = import_pack_module('nodes_simple')
+
+_gb = float(1 << 30)
+
+_model = _budget.CostModel(
+	memory_fixed=2.5 * _gb, memory_per_image=64e6, memory_per_pixel=1200.0,
+	time_fixed=0.05, time_per_image=0.01, time_per_pixel=2e-7,
+)
+
+
+def _samples(model: _budget.CostModel, noise: float = 0.0):
+	rnd = _random.Random(42)
+	return [
+		_budget.CalibrationSample(
+			batch_size, side * side,
+			model.memory(batch_size, side * side) * (1.0 + rnd.uniform(-noise, noise)),
+			model.time(batch_size, side * side) * (1.0 + rnd.uniform(-noise, noise)),
+		)
+		for batch_size, side in _product((1, 2, 4), (512, 768, 1024))
+	]
+
+
+def test_fit_exact():
+	fitted = _budget.fit_cost_model(_samples(_model))
+	assert tuple(fitted) == pytest.approx(tuple(_model), rel=1e-6)
+
+
+def test_fit_noisy():
+	fitted = _budget.fit_cost_model(_samples(_model, noise=0.01))
+	for batch_size, side in _product((1, 3, 8), (640, 1024, 1536)):
+		pixels = side * side
+		assert fitted.memory(batch_size, pixels) == pytest.approx(_model.memory(batch_size, pixels), rel=0.05)
+		assert fitted.time(batch_size, pixels) == pytest.approx(_model.time(batch_size, pixels), rel=0.05)
+
+
+def test_fit_too_few_samples():
+	with pytest.raises(ValueError):
+		_budget.fit_cost_model(_samples(_model)[:2])
+
+
+@pytest.mark.parametrize('budget_gb', (3.0, 4.0, 6.5, 12.0, 24.0))
+@pytest.mark.parametrize('area_tolerance', (0.0, 0.1, 0.3))
+@pytest.mark.parametrize('square_size, step', ((1024, 64), (768, 8), (1536, 16)))
+def test_batch_within_budget(budget_gb, area_tolerance, square_size, step):
+	budget = budget_gb * _gb
+	result = _budget.solve_budget(square_size, True, 16.0, 9.0, step, budget, _model, area_tolerance, 64)
+	if result is None:
+		# Every candidate is either the resolution of "area" node, or has at least this area:
+		exact = _budget.solve_budget(square_size, True, 16.0, 9.0, step, 1e6 * _gb, _model)
+		min_pixels = min(exact.width * exact.height, square_size * square_size * (1.0 - area_tolerance))
+		assert _model.memory(1, min_pixels) > budget
+		return
+	pixels = result.width * result.height
+	assert 1 <= result.batch_size <= 64
+	assert result.memory == _model.memory(result.batch_size, pixels) <= budget
+	if result.batch_size < 64:
+		# The largest one which fits:
+		assert _model.memory(result.batch_size + 1, pixels) > budget
+	assert result.width % step == 0 and result.height % step == 0
+
+
+def test_single_image_does_not_fit():
+	budget = _model.memory(1, 1024 * 1024) * 0.99
+	assert _budget.solve_budget(1024, True, 1.0, 1.0, 64, budget, _model) is None
+	# Even the model alone doesn't fit:
+	assert _budget.solve_budget(1024, True, 1.0, 1.0, 64, _model.memory_fixed * 0.5, _model, 0.5) is None
+
+
+@pytest.mark.parametrize('rounding', ('3-pass', 'optimal'))
+@pytest.mark.parametrize('square_size, step, landscape, aspect_a, aspect_b', (
+	(1024, 64, True, 16.0, 9.0),
+	(1000, 48, False, 4.0, 3.0),
+	(768, 8, True, 21.0, 9.0),
+	(1623, 64, True, 1.0, 1.0),
+))
+def test_no_tolerance_same_as_area_node(square_size, step, landscape, aspect_a, aspect_b, rounding):
+	result = _budget.solve_budget(
+		square_size, landscape, aspect_a, aspect_b, step, 24.0 * _gb, _model, 0.0, 64, rounding,
+	)
+	expected = nodes_simple.BestResolutionFromArea().main(
+		square_size, step, landscape, aspect_a, aspect_b, rounding=rounding,
+	)
+	assert (result.width, result.height) == tuple(expected)
@@ -0,0 +1,119 @@
+# encoding: utf-8
+"""
+Memoization (``_cache``): the LRU bound, hit/miss/eviction counters, and status reports cached per inputs - not per node.
+"""
+
+import typing as _t
+
+import pytest
+
+from _stubs import import_pack_module
+
+_cache = import_pack_module('_cache')
+_funcs = import_pack_module('_funcs')
+_report_sink = import_pack_module('_report_sink')
+nodes_simple = import_pack_module('nodes_simple')
+
+
+class _RecordingSink(_report_sink.ReportSink):
+	def __init__(self):
+		self.sent: _t.List[_t.Tuple[str, _t.Optional[str]]] = list()
+
+	def send(self, text: _t.Optional[str], unique_id: str):
+		self.sent.append((unique_id, text))
+
+
+@pytest.fixture
+def sink():
+	prev_sink = _report_sink.get_sink()
+	recording = _RecordingSink()
+	_report_sink.set_sink(recording)
+	_cache.clear(reset_stats=True)
+	yield recording
+	_report_sink.set_sink(prev_sink)
+	_cache.clear(reset_stats=True)
+
+
+def test_lru_bound():
+	cache = _cache.LRUCache(3)
+	for key in 'abc':
+		cache.put(key, key.upper())
+	assert cache.get('a') == 'A'  # Now, 'b' is the least recently used one.
+	cache.put('d', 'D')
+	cache.put('c', 'C2')  # Updating doesn't evict anything.
+	assert len(cache) == 3
+	assert cache.get('b') is None
+	assert [cache.get(x) for x in 'acd'] == ['A', 'C2', 'D']
+
+	cache.put('e', 'E')
+	assert cache.get('a') is None
+	assert len(cache) == 3
+
+	cache.max_size = 1
+	assert len(cache) == 1 and cache.get('e') == 'E'
+
+
+def test_stats():
+	cache = _cache.LRUCache(2)
+	assert cache.stats() == _cache.CacheStats(0, 0, 0, 0, 2)
+	cache.get('a')
+	cache.put('a', 1)
+	cache.put('b', 2)
+	cache.get('a')
+	cache.get('a')
+	cache.put('c', 3)  # Evicts 'b'.
+	cache.get('b')
+	assert cache.stats() == _cache.CacheStats(hits=2, misses=2, evictions=1, size=2, max_size=2)
+
+	cache.clear()
+	assert cache.stats() == _cache.CacheStats(2, 2, 1, 0, 2)
+	cache.clear(reset_stats=True)
+	assert cache.stats() == _cache.CacheStats(0, 0, 0, 0, 2)
+
+
+def test_disabled():
+	cache = _cache.LRUCache(0)
+	cache.put('a', 1)
+	assert cache.get('a') is None
+	assert cache.stats() == _cache.CacheStats(hits=0, misses=1, evictions=0, size=0, max_size=0)
+
+	prev_sizes = _cache.results.max_size, _cache.reports.max_size
+	try:
+		_cache.results.put('a', 1)
+		_cache.set_max_size(0)
+		assert len(_cache.results) == 0 and _cache.stats()['results'].evictions >= 1
+	finally:
+		_cache.results.max_size, _cache.reports.max_size = prev_sizes
+		_cache.clear(reset_stats=True)
+
+
+def test_reports_per_node(sink):
+	node = nodes_simple.BestResolutionFromArea()
+	assert tuple(node.main(1024, 64, True, 16.0, 9.0, unique_id='1')) == (1344, 768)
+	assert tuple(node.main(1024, 64, True, 16.0, 9.0, unique_id='2')) == (1344, 768)
+	# The same inputs: the report is rendered once, but sent to each node.
+	assert [x[0] for x in sink.sent] == ['1', '2']
+	assert sink.sent[0][1] and sink.sent[0][1] == sink.sent[1][1]
+	assert _cache.reports.stats().hits == 1
+
+	# Another node with other inputs gets its own report - and the cached one for the first node stays intact:
+	node.main(1024, 64, False, 16.0, 9.0, unique_id='3')
+	node.main(1024, 64, True, 16.0, 9.0, unique_id='1')
+	assert sink.sent[2][1] != sink.sent[0][1]
+	assert sink.sent[3] == sink.sent[0]
+
+	# No node to report to: nothing is rendered or sent.
+	n_reports = len(_cache.reports)
+	node.main(1536, 64, True, 16.0, 9.0)
+	assert len(_cache.reports) == n_reports
+	assert len(sink.sent) == 4
+
+
+def test_report_follows_given_result(sink):
+	# The rounded resolution given by the caller (e.g., from the table or the lattice) is what's reported:
+	width_f, height_f = 1365.33, 768.0
+	_funcs.simple_result_from_approx_wh(width_f, height_f, 64, unique_id='1')
+	result = _funcs.simple_result_from_approx_wh(width_f, height_f, 64, unique_id='2', rounded=(1280, 20, 832, 13))
+	assert tuple(result) == (1280, 832)
+	assert sink.sent[0][1] != sink.sent[1][1]
+	assert '1280' in sink.sent[1][1] and '832' in sink.sent[1][1]
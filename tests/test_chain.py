@@ -0,0 +1,116 @@
+# encoding: utf-8
+"""
+Upscale chain planning (``best_res_core.chain``) vs a brute-force enumeration of all the factor sequences.
+"""
+
+import typing as _t
+
+from itertools import product as _product
+from math import log as _log, sqrt as _sqrt
+
+import pytest
+
+from best_resolution.best_res_core import chain as _chain
+from best_resolution.best_res_core import rounding as _rounding
+
+_t_resolution = _t.Tuple[int, int]
+
+_stage_sets = (
+	(_chain.ChainStage((1.5, 1.25, 2.0), 16, 4.0), _chain.ChainStage((2.0, 4.0), 8, 0.5)),
+	(
+		_chain.ChainStage((1.25, 1.5), 64, 2.0),
+		_chain.ChainStage((2.0, 1.5), 8, 0.25),
+		_chain.ChainStage((1.0, 1.5, 2.0), 32, 1.0),
+	),
+	(_chain.ChainStage((1.5, 1.5, 2.0), 8), _chain.ChainStage((1.25, ), 8, 0.0)),
+)
+_finals = ((3840, 2160), (2160, 3840), (4096, 4096), (2560, 1080), (3000, 2000))
+
+
+def _rounded(width_f: float, height_f: float, step: int, target_ratio: float) -> _t_resolution:
+	area_f = width_f * height_f
+	width, _, height, _ = _rounding.round_width_and_height_closest_to_the_ratio(
+		_sqrt(area_f * target_ratio), _sqrt(area_f / target_ratio), step
+	)
+	return width, height
+
+
+def _brute_force(
+	final_width_f: float, final_height_f: float, init_step: int, stages: _t.Sequence[_chain.ChainStage],
+	init_square_size: float, init_area_tolerance: float,
+) -> _t.Optional[_t.Tuple[float, float]]:
+	"""The best ``(cost, initial area deviation)`` among all the factor sequences - each one back-tracked on its own."""
+	target_ratio = float(final_width_f) / final_height_f
+	native_area = float(init_square_size) ** 2
+	best = None
+	for factors in _product(*(x.factors for x in stages)):
+		resolution = _rounded(final_width_f, final_height_f, stages[-1].step, target_ratio)
+		cost = 0.0
+		for i_stage in range(len(stages) - 1, -1, -1):
+			cost += stages[i_stage].cost * resolution[0] * resolution[1]
+			prev_step = stages[i_stage - 1].step if i_stage > 0 else init_step
+			factor = factors[i_stage]
+			resolution = _rounded(resolution[0] / factor, resolution[1] / factor, prev_step, target_ratio)
+		area = resolution[0] * resolution[1]
+		if abs(area / native_area - 1.0) > init_area_tolerance + 1e-12:
+			continue
+		key = (cost + area, abs(_log(area / native_area)))
+		if best is None or key < best:
+			best = key
+	return best
+
+
+@pytest.mark.parametrize('stages', _stage_sets)
+@pytest.mark.parametrize('final', _finals)
+@pytest.mark.parametrize('init_square_size', (512, 1024))
+def test_plan_vs_brute_force(stages, final, init_square_size):
+	init_step, tolerance = 8, 0.25
+	plan = _chain.plan_chain(*final, init_step, stages, init_square_size, tolerance)
+	expected = _brute_force(*final, init_step, stages, init_square_size, tolerance)
+	if expected is None:
+		assert plan is None
+		return
+
+	assert plan is not None
+	(init_width, init_height) = plan.resolutions[0]
+	assert (plan.cost, abs(_log(init_width * init_height / init_square_size ** 2))) == pytest.approx(expected)
+	assert plan.cost == pytest.approx(
+		init_width * init_height + sum(s.cost * w * h for s, (w, h) in zip(stages, plan.resolutions[1:]))
+	)
+	assert len(plan.resolutions) == len(stages) + 1
+	assert len(plan.factors) == len(stages)
+	for stage, factor in zip(stages, plan.factors):
+		assert factor in stage.factors
+
+	# Each resolution is divisible by its own stage's step:
+	for (width, height), step in zip(plan.resolutions, [init_step] + [x.step for x in stages]):
+		assert width % step == 0 and height % step == 0
+
+
+def test_initial_area_out_of_tolerance():
+	stages = (_chain.ChainStage((2.0, ), 8), )
+	# x2 of 1024² is way too big for the final 4K: the initial one can't be within ±10% of 1024².
+	assert _chain.plan_chain(3840, 2160, 8, stages, 1024, 0.1) is None
+	plan = _chain.plan_chain(3840, 2160, 8, stages, 1400, 0.1)
+	assert plan is not None and plan.resolutions[-1] == (3840, 2160)
+
+
+@pytest.mark.parametrize('text, i_line', (
+	("2; 8\n1.5, x; 16", 2),
+	("# comment\n\n2; 8; 1\n0.5; 8", 4),
+	("2; 8\n2", 2),
+	("2; 0", 1),
+	("2; 8; -1", 1),
+	("2; 8; 1; 1", 1),
+	("; 8", 1),
+))
+def test_parse_stages_errors(text, i_line):
+	with pytest.raises(ValueError, match=f"line {i_line} "):
+		_chain.parse_stages(text)
+
+
+def test_parse_stages():
+	assert _chain.parse_stages("1.5, 1.25; 16; 4   # latent upscale + sampling\n\n2 4; 8\n") == (
+		_chain.ChainStage((1.5, 1.25), 16, 4.0),
+		_chain.ChainStage((2.0, 4.0), 8, 1.0),
+	)
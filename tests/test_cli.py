@@ -0,0 +1,157 @@
+# encoding: utf-8
+"""
+Command-line batch planner (``best_res_core.cli``): record processing, order, errors, CSV/JSONL I/O, image folders.
+"""
+
+import typing as _t
+
+import csv as _csv
+import json as _json
+import struct as _struct
+import zlib as _zlib
+
+import pytest
+
+from best_resolution.best_res_core import cli as _cli
+from best_resolution.best_res_core import rounding as _rounding
+
+
+def _png(width: int, height: int) -> bytes:
+	ihdr = _struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+	chunk = _struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr + _struct.pack('>I', _zlib.crc32(b'IHDR' + ihdr))
+	return b'\x89PNG\r\n\x1a\n' + chunk
+
+
+def _jpeg(width: int, height: int, orientation: int = None) -> bytes:
+	data = b'\xFF\xD8'
+	# APP0 (JFIF), to be skipped:
+	app0 = b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+	data += b'\xFF\xE0' + _struct.pack('>H', len(app0) + 2) + app0
+	if orientation is not None:
+		# APP1 with EXIF: a single IFD entry - the orientation tag (SHORT):
+		tiff = b'II*\x00' + _struct.pack('<I', 8) + _struct.pack('<H', 1)
+		tiff += _struct.pack('<HHIHH', 0x0112, 3, 1, orientation, 0) + _struct.pack('<I', 0)
+		app1 = b'Exif\x00\x00' + tiff
+		data += b'\xFF\xE1' + _struct.pack('>H', len(app1) + 2) + app1
+	# SOF0: precision, height, width, components (just 1 - the rest doesn't matter for the size):
+	sof = _struct.pack('>BHHB', 8, height, width, 1) + b'\x01\x11\x00'
+	data += b'\xFF\xC0' + _struct.pack('>H', len(sof) + 2) + sof
+	return data + b'\xFF\xDA'
+
+
+def _area_records(n: int) -> _t.List[_t.Dict[str, _t.Any]]:
+	return [
+		{'id': i, 'square_size': 512 + 8 * i, 'step': (8, 16, 64)[i % 3], 'aspect_a': 1.0 + (i % 7) * 0.25}
+		for i in range(n)
+	]
+
+
+def _expected_area(record) -> _t.Tuple[int, int]:
+	width_f, height_f = _rounding.float_width_height_from_area(
+		record['square_size'], True, record['aspect_a'], 9.0,
+	)
+	width, _, height, _ = _rounding.round_width_and_height(width_f, height_f, record['step'])
+	return width, height
+
+
+@pytest.mark.parametrize('jobs, chunk_size', ((1, 1024), (2, 7), (3, 1)))
+def test_order_kept(jobs, chunk_size):
+	records = _area_records(100)
+	output = list(_cli.process_stream('area', iter(records), jobs=jobs, chunk_size=chunk_size))
+	assert [x['id'] for x in output] == list(range(100))
+	for record, out in zip(records, output):
+		assert 'error' not in out
+		assert (out['width'], out['height']) == _expected_area(record)
+
+
+def test_per_record_errors():
+	records = [
+		{'square_size': 1024},
+		{'square_size': 'big'},
+		{'square_size': 1024, 'rounding': 'exact'},
+		{'square_size': 1024, 'landscape': 'sideways'},
+		{'line': 5, 'error': "Invalid JSON: ..."},
+		{'square_size': 768},
+	]
+	output = list(_cli.process_stream('area', records))
+	assert len(output) == len(records)
+	assert 'error' not in output[0] and 'error' not in output[-1]
+	assert 'square_size' in output[1]['error']
+	assert 'rounding' in output[2]['error']
+	assert 'landscape' in output[3]['error']
+	# Failed upstream: passed through as is.
+	assert output[4] == records[4]
+
+	crop_pad = list(_cli.process_stream('crop-pad', [{'upscale': 2}]))
+	assert crop_pad[0]['error'] == "Missing field: init_width"
+
+
+def test_unknown_operation():
+	with pytest.raises(ValueError):
+		list(_cli.process_stream('resize', []))
+
+
+def test_csv_output(tmp_path, capsys):
+	in_path, out_path = tmp_path / 'in.jsonl', tmp_path / 'out.csv'
+	records = [{'name': 'a', 'square_size': 1024}, {'name': 'b', 'square_size': 'huge'}, {'name': 'c', 'step': 16}]
+	in_path.write_text(''.join(_json.dumps(x) + '\n' for x in records), encoding='utf-8')
+
+	assert _cli.main(['area-upscale', '-i', str(in_path), '-o', str(out_path), '-j', '1']) == 1
+	with open(out_path, encoding='utf-8', newline='') as f:
+		reader = _csv.DictReader(f)
+		rows = list(reader)
+	# The first record's fields, then the outputs, then the error:
+	assert reader.fieldnames == [
+		'name', 'square_size', 'upscale', 'init_width', 'init_height', 'HD_width', 'HD_height', 'error',
+	]
+	assert [x['name'] for x in rows] == ['a', 'b', 'c']
+	assert rows[0]['error'] == '' and rows[0]['init_width'] and rows[0]['HD_width']
+	assert rows[1]['error'] and rows[1]['init_width'] == ''
+	# Not in the first record: dropped from CSV.
+	assert 'step' not in rows[2]
+	assert "3 records, 1 errors" in capsys.readouterr().err
+
+
+def test_set_overrides(tmp_path):
+	in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.jsonl'
+	in_path.write_text("square_size,step\n1024,\n1024,8\n", encoding='utf-8')
+
+	args = ['area', '-i', str(in_path), '-o', str(out_path), '-j', '1', '--set', 'step=64', '-s', 'landscape=no']
+	assert _cli.main(args) == 0
+	output = [_json.loads(x) for x in out_path.read_text(encoding='utf-8').splitlines()]
+	# An empty CSV field is "missing": the override is used for it, but not for an explicit value.
+	assert (output[0]['width'], output[0]['height']) == (768, 1344)
+	assert (output[1]['width'], output[1]['height']) == _expected_area(
+		{'square_size': 1024, 'step': 8, 'aspect_a': 16.0}
+	)[::-1]
+
+	for bad in ('step', 'nonexistent=1', 'step=abc'):
+		with pytest.raises(SystemExit):
+			_cli.main(['area', '-i', str(in_path), '-o', str(out_path), '--set', bad])
+
+
+def test_read_images(tmp_path):
+	(tmp_path / 'a.png').write_bytes(_png(640, 480))
+	(tmp_path / 'b.jpg').write_bytes(_jpeg(1920, 1080))
+	(tmp_path / 'c.jpeg').write_bytes(_jpeg(1920, 1080, orientation=6))
+	(tmp_path / 'd.png').write_bytes(b'not an image')
+	(tmp_path / 'notes.txt').write_text('ignored')
+	(tmp_path / 'sub').mkdir()
+	(tmp_path / 'sub' / 'e.png').write_bytes(_png(100, 200))
+
+	records = list(_cli.read_images(str(tmp_path)))
+	assert [x['path'] for x in records] == [str(tmp_path / x) for x in ('a.png', 'b.jpg', 'c.jpeg', 'd.png')]
+	assert (records[0]['init_width'], records[0]['init_height']) == (640, 480)
+	assert (records[1]['init_width'], records[1]['init_height']) == (1920, 1080)
+	# Rotated by EXIF orientation:
+	assert (records[2]['init_width'], records[2]['init_height']) == (1080, 1920)
+	assert records[3]['error'].startswith("Can't read image size")
+
+	recursive = list(_cli.read_images(str(tmp_path), recursive=True))
+	assert recursive[-1]['path'] == str(tmp_path / 'sub' / 'e.png')
+	assert (recursive[-1]['init_width'], recursive[-1]['init_height']) == (100, 200)
+
+	# Images go straight into "crop-pad", their errors - through it:
+	planned = list(_cli.process_stream('crop-pad', records, {'upscale': '2', 'HD_step': '64'}))
+	assert planned[0]['HD_width'] % 64 == 0 and 'error' not in planned[0]
+	assert planned[3]['error'] == records[3]['error']
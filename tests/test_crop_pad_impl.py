@@ -0,0 +1,198 @@
+# encoding: utf-8
+"""
+Applying the crop/pad plan to images (``_crop_pad_impl``): results and memory allocations.
+"""
+
+import pytest
+import torch
+
+import comfy.utils
+
+from _allocations import AllocationCounter
+from _stubs import import_pack_module
+
+_impl = import_pack_module('_crop_pad_impl')
+_crop_pad = import_pack_module('best_res_core.crop_pad')
+
+CropPadLayout = _crop_pad.CropPadLayout
+
+_layouts = {
+	# Upscale x1.5, crop a few pixels, pad all around:
+	'crop+pad': CropPadLayout(144, 96, 4, 3, 136, 90, 150, 100, 6, 5),
+	'crop only': CropPadLayout(144, 96, 4, 3, 136, 90, 136, 90, 0, 0),
+	'pad only': CropPadLayout(144, 96, 0, 0, 144, 96, 160, 96, 10, 0),
+	'no scale': CropPadLayout(96, 64, 8, 0, 80, 64, 96, 80, 8, 8),
+}
+
+
+def _chain(image: torch.Tensor, layout: CropPadLayout, upscale_method: str, pad_value: float) -> torch.Tensor:
+	"""The same as a chain of scale, crop and pad nodes would do - each making a full-size copy of the batch."""
+	scaled = comfy.utils.common_upscale(
+		image.movedim(-1, 1), layout.scaled_width, layout.scaled_height, upscale_method, "disabled"
+	).movedim(1, -1)
+	cropped = scaled[
+		:, layout.crop_y:layout.crop_y + layout.crop_height, layout.crop_x:layout.crop_x + layout.crop_width
+	].clone()
+	out = torch.full(
+		(image.shape[0], layout.out_height, layout.out_width, image.shape[-1]), pad_value, dtype=image.dtype
+	)
+	out[:, layout.paste_y:layout.paste_y + layout.crop_height, layout.paste_x:layout.paste_x + layout.crop_width] = cropped
+	return out
+
+
+@pytest.mark.parametrize('name', list(_layouts))
+def test_apply_crop_pad(name):
+	layout = _layouts[name]
+	image = torch.rand(4, 64, 96, 3)
+	frame_bytes = max(
+		layout.scaled_width * layout.scaled_height, layout.out_width * layout.out_height
+	) * image.shape[-1] * image.element_size()
+
+	with AllocationCounter() as allocations:
+		out = _impl.apply_crop_pad(image, layout, 'bilinear', 0.25)
+	out_bytes = out.nelement() * out.element_size()
+	# The output is the only tensor bigger than a single image:
+	assert allocations.at_least(frame_bytes + 1) == [('aten.empty.memory_format', out_bytes)]
+
+	assert torch.equal(out, _chain(image, layout, 'bilinear', 0.25))
+
+
+def test_allocations_counted():
+	"""The counter does see the full-size intermediates of the usual node chain."""
+	layout = _layouts['crop+pad']
+	image = torch.rand(4, 64, 96, 3)
+	frame_bytes = layout.out_width * layout.out_height * 3 * image.element_size()
+	with AllocationCounter() as allocations:
+		_chain(image, layout, 'bilinear', 0.25)
+	assert len(allocations.at_least(frame_bytes * 2)) == 3
+
+
+def _builtin_outpaint_mask(layout: CropPadLayout, feathering: int) -> torch.Tensor:
+	"""The mask "Pad Image for Outpainting" (``ImagePadForOutpaint`` in ComfyUI's ``nodes.py``) makes."""
+	left, top = layout.paste_x, layout.paste_y
+	right = layout.out_width - left - layout.crop_width
+	bottom = layout.out_height - top - layout.crop_height
+	d2, d3 = layout.crop_height, layout.crop_width
+
+	mask = torch.ones((d2 + top + bottom, d3 + left + right), dtype=torch.float32)
+	t = torch.zeros((d2, d3), dtype=torch.float32)
+	if feathering > 0 and feathering * 2 < d2 and feathering * 2 < d3:
+		for i in range(d2):
+			for j in range(d3):
+				dt = i if top != 0 else d2
+				db = d2 - i if bottom != 0 else d2
+				dl = j if left != 0 else d3
+				dr = d3 - j if right != 0 else d3
+				d = min(dt, db, dl, dr)
+				if d >= feathering:
+					continue
+				v = (feathering - d) / feathering
+				t[i, j] = v * v
+	mask[top:top + d2, left:left + d3] = t
+	return mask
+
+
+_mask_layouts = {
+	'all sides': CropPadLayout(0, 0, 0, 0, 60, 40, 80, 56, 12, 6),
+	'left/right': CropPadLayout(0, 0, 0, 0, 60, 40, 80, 40, 12, 0),
+	'top only': CropPadLayout(0, 0, 0, 0, 60, 40, 60, 48, 0, 8),
+	'no padding': CropPadLayout(0, 0, 0, 0, 60, 40, 60, 40, 0, 0),
+}
+
+
+@pytest.mark.parametrize('feathering', [0, 10, 25])
+@pytest.mark.parametrize('name', list(_mask_layouts))
+def test_outpaint_mask_values(name, feathering):
+	layout = _mask_layouts[name]
+	mask = _impl.outpaint_mask(layout, 3, feathering)
+	assert mask.shape == (3, layout.out_height, layout.out_width)
+	reference = _builtin_outpaint_mask(layout, feathering)
+	for frame in mask:
+		assert torch.allclose(frame, reference, atol=1e-6)
+
+
+@pytest.mark.parametrize('name', list(_mask_layouts))
+def test_outpaint_mask_allocations(name):
+	layout = _mask_layouts[name]
+	frame_bytes = layout.out_width * layout.out_height * 4
+	with AllocationCounter() as allocations:
+		_impl.outpaint_mask(layout, 16, 10)
+	# Never a batch-sized tensor; a single full-resolution one only if there's padding along both axes:
+	assert not allocations.at_least(frame_bytes + 1)
+	n_full = 1 if name == 'all sides' else 0
+	assert len(allocations.at_least(frame_bytes)) == n_full
+
+
+def test_outpaint_mask_consumer_copy():
+	"""A downstream node modifying its own copy doesn't affect the mask (or the other images of the batch)."""
+	for layout in _mask_layouts.values():
+		mask = _impl.outpaint_mask(layout, 4, 10)
+		reference = mask[0].clone()
+
+		mask_copy = mask.clone()
+		mask_copy[1].fill_(0.5)
+		mask_copy[2, :4] = 1.0
+		assert torch.equal(mask_copy[0], reference)
+		assert torch.equal(mask_copy[3], reference)
+		for frame in mask:
+			assert torch.equal(frame, reference)
+
+		# The mask itself is an expanded view: an in-place write to it fails, rather than silently altering it.
+		with pytest.raises(RuntimeError):
+			mask.mul_(0.5)
+		for frame in mask:
+			assert torch.equal(frame, reference)
+
+
+_node_crop_pad = import_pack_module('node_crop_pad')
+_report_sink = import_pack_module('_report_sink')
+
+
+def _run_latent_node(samples, plan, snap: bool = True):
+	sink = _report_sink.get_sink()
+	_report_sink.set_sink(_report_sink.UIReportSink())
+	try:
+		returned = _node_crop_pad.BestResolutionApplyCropPadLatent().main(
+			samples, plan, 'nearest-exact', 8, snap, unique_id='5',
+		)
+	finally:
+		_report_sink.set_sink(sink)
+	text, = returned['ui']['text']
+	out, = returned['result']
+	return out, text
+
+
+@pytest.mark.parametrize('strategy, hd_size', (
+	('exact-upscale', (144, 80)),
+	('pad only', (160, 96)),
+	('crop only', (112, 96)),
+))
+def test_latent_same_as_pixel_apply(strategy, hd_size, capsys):
+	"""For a plan aligned to the latent grid, the latent node does exactly what "Apply Crop/Pad" does in pixels."""
+	plan = _crop_pad.upscaled_crop_pad(2.0, 64, 48, *hd_size, strategy, 0.5, 0.5)
+	latent = torch.rand(2, 4, 6, 8)
+	assert _crop_pad.latent_crop_pad_layout(plan, 8, 6, 8)[1] is False
+
+	# Each latent pixel is an 8×8 block of the image - so the pixel result, sampled once per block, is the latent one:
+	image = latent.repeat_interleave(8, dim=-2).repeat_interleave(8, dim=-1).movedim(1, -1)
+	px_out = _impl.apply_crop_pad(image, _crop_pad.crop_pad_layout(plan, 64, 48), 'nearest-exact', 0.0)
+	assert px_out.shape[1:3] == hd_size[::-1]
+
+	out, text = _run_latent_node({'samples': latent}, plan)
+	assert torch.equal(out['samples'], px_out[:, ::8, ::8].movedim(-1, 1))
+	assert "snapped" not in text
+	assert "[Best Resolution]" not in capsys.readouterr().out
+
+
+def test_latent_snap_reported(capsys):
+	# x1.5 gives 96×72, padded by 2 px per side to 100×76: not on the latent grid.
+	plan = _crop_pad.upscaled_crop_pad(1.5, 64, 48, 100, 76, 'pad only', 0.5, 0.5)
+	samples = {'samples': torch.rand(1, 4, 6, 8)}
+	out, text = _run_latent_node(samples, plan)
+	assert out['samples'].shape[-2:] == (10, 13)
+	assert "snapped to the latent grid: 104×80 px instead of 100×76" in text
+	assert "moved by up to 4 px" in text
+	assert "snapped to the latent grid" in capsys.readouterr().out
+
+	with pytest.raises(ValueError, match="latent factor 8"):
+		_run_latent_node(samples, plan, snap=False)
@@ -0,0 +1,13 @@
+# encoding: utf-8
+"""
+Registering the pack imports neither torch nor ``server`` (see ``benchmarks/import_time.py``).
+"""
+
+import import_time
+
+
+def test_no_heavy_imports():
+	result = import_time.measure_once()
+	assert result['n_nodes'] > 0
+	assert not result['torch_loaded']
+	assert not result['server_loaded']
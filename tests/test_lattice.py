@@ -0,0 +1,108 @@
+# encoding: utf-8
+"""
+The lattice index (``best_res_core.lattice``) vs a brute-force scan of all the step-aligned resolutions in the band.
+"""
+
+import typing as _t
+
+from math import log as _log, sqrt as _sqrt
+
+import pytest
+
+from _stubs import import_pack_module
+
+from best_resolution.best_res_core import lattice as _lattice
+
+_report_sink = import_pack_module('_report_sink')
+nodes_simple = import_pack_module('nodes_simple')
+
+# (square_size, aspect_a, aspect_b, step, area_tolerance)
+_queries = (
+	(1024, 1.0, 1.0, 8, 0.1),
+	(1024, 16.0, 9.0, 64, 0.1),
+	(1024, 16.0, 9.0, 8, 0.02),
+	(768, 3.0, 1.0, 16, 0.25),
+	(1024, 7.5, 1.0, 8, 0.1),
+	(1024, 16.0, 1.0, 8, 0.1),
+	(1024, 1.0, 16.0, 8, 0.1),
+	(512, 21.0, 1.0, 4, 0.05),
+	(1024, 40.0, 1.0, 8, 0.3),
+	(256, 5.0, 4.0, 1, 0.02),
+	(1000, 4.0, 3.0, 7, 0.1),
+)
+
+
+def _brute_force(
+	width_f: float, height_f: float, step: int, area_tolerance: float,
+) -> _t.List[_t.Tuple[float, int, int]]:
+	"""All the resolutions within the band (no aspect limit at all), as ``(distance, width, height)``, the closest first."""
+	area_f = width_f * height_f
+	log_aspect_f, log_area_f = _log(width_f / height_f), _log(area_f)
+	max_aspect = area_f * (1.0 + area_tolerance) / (step * step)
+	candidates = list()
+	for width, height in _lattice.iter_lattice(
+		step, area_f * (1.0 - area_tolerance), area_f * (1.0 + area_tolerance), max_aspect,
+	):
+		d_aspect = _log(width / height) - log_aspect_f
+		d_area = _log(width * height) - log_area_f
+		candidates.append((_sqrt(d_aspect * d_aspect + d_area * d_area), width, height))
+	candidates.sort()
+	return candidates
+
+
+@pytest.mark.parametrize('square_size, aspect_a, aspect_b, step, area_tolerance', _queries)
+def test_nearest_vs_brute_force(square_size, aspect_a, aspect_b, step, area_tolerance):
+	width_f = square_size * _sqrt(aspect_a / aspect_b)
+	height_f = square_size * _sqrt(aspect_b / aspect_a)
+	expected = _brute_force(width_f, height_f, step, area_tolerance)
+	k = 10
+	found = _lattice.nearest_resolutions(width_f, height_f, step, area_tolerance, k=k)
+
+	assert len(found) == min(k, len(expected))
+	# Ties might come in any order - so the distances are compared, and each resolution is checked on its own:
+	assert [x.distance for x in found] == pytest.approx([x[0] for x in expected[:k]], abs=1e-12)
+	by_resolution = {(w, h): d for d, w, h in expected}
+	for x in found:
+		assert by_resolution[(x.width, x.height)] == pytest.approx(x.distance, abs=1e-12)
+	assert len({(x.width, x.height) for x in found}) == len(found)
+
+
+@pytest.mark.parametrize('step, min_area, max_area, max_aspect', (
+	(8, 1024 ** 2 * 0.9, 1024 ** 2 * 1.1, 8.0),
+	(1, 512 ** 2 * 0.95, 512 ** 2 * 1.05, 8.0),
+	(64, 1024 ** 2 * 0.5, 1024 ** 2 * 1.5, 32.0),
+	(8, 1024 ** 2, 1024 ** 2, 8.0),
+	(7, 1000.0, 1e6, 3.0),
+))
+def test_bins_cover_lattice(step, min_area, max_area, max_aspect):
+	index = _lattice.ResolutionLattice(step, min_area, max_area, max_aspect)
+	resolutions = list(index)
+	assert len(index) == len(resolutions)
+	assert sorted(resolutions) == list(_lattice.iter_lattice(step, min_area, max_area, max_aspect))
+
+
+def test_extreme_aspect_nodes():
+	# 16:1 is way past the default limit of the lattice - but it's exactly representable:
+	result = nodes_simple.BestResolutionFromArea().main(1024, 8, True, 16.0, 1.0, area_tolerance=10.0)
+	assert tuple(result) == (4096, 256)
+	widths, heights = nodes_simple.BestResolutionAlternatives().main(1024, 8.0, False, 16.0, 1.0, 3, 10.0)
+	assert (widths[0], heights[0]) == (256, 4096)
+	assert all(isinstance(x, int) and x % 8 == 0 for x in widths + heights)
+
+
+@pytest.mark.parametrize('area_tolerance, expected_status', (
+	(10.0, "nearest in the band (`rounding` not used)"),
+	# Nothing divisible by 64 has the area within ±0.01% of 1000²:
+	(0.01, "no step-multiples in the band, rounded"),
+))
+def test_status_tells_rounding_mode(area_tolerance, expected_status):
+	sink = _report_sink.get_sink()
+	_report_sink.set_sink(_report_sink.UIReportSink())
+	try:
+		returned = nodes_simple.BestResolutionFromArea().main(
+			1000, 64, True, 16.0, 9.0, unique_id='7', rounding='optimal', area_tolerance=area_tolerance,
+		)
+	finally:
+		_report_sink.set_sink(sink)
+	text, = returned['ui']['text']
+	assert expected_status in text
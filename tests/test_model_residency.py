@@ -0,0 +1,139 @@
+# encoding: utf-8
+"""
+``ResidencyManager``: upscale models kept on a (mock) device between runs, within a mock memory budget.
+"""
+
+import typing as _t
+
+import pytest
+
+from comfy import model_management
+
+from _stubs import import_pack_module
+
+_model_residency = import_pack_module('_model_residency')
+
+_device = 'mock:0'
+_total_memory = 100
+_budget = 50
+
+
+class _Model:
+	def __init__(self, name: str, size: int):
+		self.name = name
+		self.size = size
+		self.device = None
+
+	def __repr__(self):
+		return self.name
+
+
+class _MockDevice:
+	"""A device with a fixed amount of memory: only the models moved onto it take any."""
+
+	def __init__(self):
+		self.models: _t.List[_Model] = list()
+		self.moves: _t.List[_t.Tuple[str, _t.Optional[str]]] = list()
+		self.free_memory_calls: _t.List[float] = list()
+
+	def move(self, model: _Model, device):
+		if model.device == device:
+			return
+		self.moves.append((model.name, device))
+		model.device = device
+		if device is None:
+			self.models.remove(model)
+		else:
+			self.models.append(model)
+
+	def free_memory_of(self, device) -> float:
+		return _total_memory - sum(x.size for x in self.models)
+
+	def free_memory(self, memory_required: float, device):
+		"""ComfyUI's ``free_memory()`` stand-in: its own models take nothing here, so it only records the calls."""
+		self.free_memory_calls.append(memory_required)
+
+	def manager(self) -> '_model_residency.ResidencyManager':
+		return _model_residency.ResidencyManager(
+			size_of=lambda model: model.size,
+			budget_of=lambda device: _budget,
+			move=self.move,
+			free_memory_of=self.free_memory_of,
+		)
+
+
+@pytest.fixture
+def device():
+	return _MockDevice()
+
+
+def _run(manager, model: _Model, device: _MockDevice):
+	with manager.use(model, _device, device.free_memory):
+		assert model.device == _device
+
+
+def test_lru_eviction(device):
+	manager = device.manager()
+	a, b, c = _Model('a', 20), _Model('b', 20), _Model('c', 20)
+	_run(manager, a, device)
+	_run(manager, b, device)
+	_run(manager, a, device)  # Now, b is the least recently used one.
+	_run(manager, c, device)
+
+	assert manager.is_resident(a, _device) and manager.is_resident(c, _device)
+	assert not manager.is_resident(b)
+	assert b.device is None
+	assert manager.resident_size(_device) == 40 <= _budget
+	assert device.moves == [('a', _device), ('b', _device), ('c', _device), ('b', None)]
+
+
+def test_model_bigger_than_budget(device):
+	manager = device.manager()
+	big = _Model('big', _budget + 1)
+	_run(manager, big, device)
+	assert not manager.is_resident(big)
+	assert big.device is None
+	assert manager.resident_size() == 0
+	# Each run moves it again - and it never stays:
+	_run(manager, big, device)
+	assert device.moves == [('big', _device), ('big', None)] * 2
+
+
+def test_resident_model_reused(device):
+	manager = device.manager()
+	model = _Model('a', 20)
+	_run(manager, model, device)
+	_run(manager, model, device)
+	_run(manager, model, device)
+	assert device.moves == [('a', _device)]
+	assert manager.is_resident(model, _device)
+	# Only the first run frees the room for the model itself:
+	assert device.free_memory_calls == [20, 0, 0]
+
+
+def test_free_memory_hook(device, monkeypatch):
+	# The hook is installed once per function, so it goes on top of a fresh stand-in (restored after the test):
+	monkeypatch.setattr(model_management, 'free_memory', device.free_memory)
+	manager = device.manager()
+	_model_residency._install_free_memory_hook(manager)
+	assert model_management.free_memory.__wrapped__ == device.free_memory
+
+	a, b = _Model('a', 20), _Model('b', 20)
+	_run(manager, a, device)
+	_run(manager, b, device)
+	assert device.free_memory_of(_device) == 60
+
+	# Someone else needs 70: only the LRU one has to go.
+	model_management.free_memory(70, _device)
+	assert not manager.is_resident(a) and manager.is_resident(b)
+	assert device.free_memory_of(_device) == 80
+	assert device.free_memory_calls[-1] == 70
+
+	model_management.free_memory(90, _device)
+	assert manager.resident_size() == 0
+	assert device.free_memory_of(_device) == _total_memory
+
+	# Installing it again doesn't wrap it twice:
+	hooked = model_management.free_memory
+	_model_residency._install_free_memory_hook(device.manager())
+	assert model_management.free_memory is hooked
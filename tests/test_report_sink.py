@@ -0,0 +1,137 @@
+# encoding: utf-8
+"""
+Report sinks: ``PromptServerSink`` with a fake ``PromptServer`` (its event loop running in its own thread).
+"""
+
+import typing as _t
+
+from threading import Event as _Event, Thread as _Thread, get_ident as _get_ident
+import asyncio as _asyncio
+
+import pytest
+
+from _stubs import import_pack_module
+
+_report_sink = import_pack_module('_report_sink')
+_funcs = import_pack_module('_funcs')
+nodes_simple = import_pack_module('nodes_simple')
+
+
+class _FakePromptServer:
+	def __init__(self, connected: bool = True):
+		self.loop = _asyncio.new_event_loop()
+		self.sockets: _t.Dict[str, _t.Any] = {'client-1': object()} if connected else dict()
+		self.client_id = 'client-1' if connected else None
+		self.last_prompt_id = 'prompt-1'
+		# (text, node_id, client_id, thread)
+		self.sent: _t.List[_t.Tuple[str, str, str, int]] = list()
+		self._thread = _Thread(target=self.loop.run_forever, daemon=True)
+		self._thread.start()
+
+	@property
+	def loop_thread(self) -> int:
+		return self._thread.ident
+
+	def send_progress_text(self, text: str, node_id: str, sid: str = None):
+		self.sent.append((text, node_id, sid, _get_ident()))
+
+	def wait_idle(self):
+		"""Wait until everything already scheduled on the loop is done."""
+		for _ in range(2):
+			_asyncio.run_coroutine_threadsafe(_asyncio.sleep(0), self.loop).result(timeout=5)
+
+	def close(self):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self._thread.join(timeout=5)
+		self.loop.close()
+
+
+@pytest.fixture
+def server():
+	server = _FakePromptServer()
+	yield server
+	server.close()
+
+
+@pytest.fixture
+def sink(server):
+	sink = _report_sink.PromptServerSink(server)
+	prev_sink = _report_sink.get_sink()
+	_report_sink.set_sink(sink)
+	yield sink
+	_report_sink.set_sink(prev_sink)
+
+
+def test_coalesced_within_flush_window(server, sink):
+	# Keep the loop busy, so all the reports below get into the same flush window:
+	gate = _Event()
+	server.loop.call_soon_threadsafe(gate.wait, 5)
+	for i in range(3):
+		sink.send(f"first {i}", '1')
+	sink.send("second", '2')
+	sink.send("first 3", '1')
+	assert server.sent == []
+	gate.set()
+	server.wait_idle()
+
+	assert [(text, node_id, sid) for text, node_id, sid, _ in server.sent] == [
+		("first 3", '1', 'client-1'),
+		("second", '2', 'client-1'),
+	]
+
+
+def test_separate_flush_windows(server, sink):
+	sink.send("a", '1')
+	server.wait_idle()
+	sink.send("b", '1')
+	server.wait_idle()
+	assert [text for text, *_ in server.sent] == ["a", "b"]
+
+
+def test_sent_async_off_execution_thread(server, sink):
+	gate = _Event()
+	server.loop.call_soon_threadsafe(gate.wait, 5)
+	sink.send("text", '1')
+	# ``send()`` returned without sending anything from this (worker) thread:
+	assert server.sent == []
+	gate.set()
+	server.wait_idle()
+
+	assert len(server.sent) == 1
+	thread = server.sent[0][3]
+	assert thread == server.loop_thread
+	assert thread != _get_ident()
+
+
+def test_node_report_sent(server, sink):
+	nodes_simple.BestResolutionFromArea().main(1024, 64, True, 16.0, 9.0, unique_id='5')
+	server.wait_idle()
+	assert [(node_id, text.split('\n')[0]) for text, node_id, *_ in server.sent] == [('5', '1344/768~=1015.97🔳')]
+
+
+def test_nothing_sent_without_listeners(monkeypatch):
+	server = _FakePromptServer(connected=False)
+	sink = _report_sink.PromptServerSink(server)
+	prev_sink = _report_sink.get_sink()
+	_report_sink.set_sink(sink)
+
+	def no_formatting(*args, **kwargs):
+		raise AssertionError("The report is formatted with nobody listening")
+
+	monkeypatch.setattr(_funcs, 'format_report_simple', no_formatting)
+	try:
+		assert not sink.is_listening('5')
+		result = nodes_simple.BestResolutionFromArea().main(1024, 64, True, 16.0, 9.0, unique_id='5')
+		assert tuple(result) == (1344, 768)
+		server.wait_idle()
+		assert server.sent == []
+	finally:
+		_report_sink.set_sink(prev_sink)
+		server.close()
+
+
+def test_null_sink():
+	sink = _report_sink.NullSink()
+	assert not sink.is_listening('1')
+	sink.send("text", '1')
+	assert sink.node_output((1, 2), '1') == (1, 2)
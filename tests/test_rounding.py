@@ -0,0 +1,57 @@
+# encoding: utf-8
+"""
+"optimal" rounding mode (``best_res_core.rounding``) vs a brute-force scan of all the step-multiples.
+"""
+
+import typing as _t
+
+import random as _random
+
+import pytest
+
+from best_resolution.best_res_core import rounding as _rounding
+
+
+def _key(width_f: float, height_f: float, step: int, n_x: int, n_y: int) -> _t.Tuple[float, float]:
+	"""What the optimal mode minimizes: the aspect ratio error, then the area one - exactly as it computes them."""
+	return (
+		abs(n_x / n_y - float(width_f) / height_f),
+		abs(n_x * n_y * float(step * step) - float(width_f) * height_f),
+	)
+
+
+def _brute_force(width_f: float, height_f: float, step: int) -> _t.Tuple[float, float]:
+	_, n_x0, _, n_y0 = _rounding.round_width_and_height_closest_to_the_ratio(width_f, height_f, step)
+	max_key = _key(width_f, height_f, step, n_x0, n_y0)
+	best = max_key
+	for n_x in range(1, 2 * n_x0 + 3):
+		for n_y in range(1, 2 * n_y0 + 3):
+			key = _key(width_f, height_f, step, n_x, n_y)
+			# No worse than the 3-pass result by either of the errors:
+			if key[0] <= max_key[0] and key[1] <= max_key[1] and key < best:
+				best = key
+	return best
+
+
+def _random_cases(n: int) -> _t.List[_t.Tuple[float, float, int]]:
+	rnd = _random.Random(1234)
+	cases = list()
+	for _ in range(n):
+		step = rnd.choice((16, 32, 48, 64, 100, 144))
+		side = rnd.uniform(step, 2500.0)
+		aspect = rnd.uniform(1.0, 4.0) ** rnd.choice((-1, 1))
+		cases.append((side * aspect ** 0.5, side / aspect ** 0.5, step))
+	return cases
+
+
+@pytest.mark.parametrize('width_f, height_f, step', [(1623.9633, 1655.5783, 64)] + _random_cases(200))
+def test_optimal_vs_brute_force(width_f, height_f, step):
+	width, n_x, height, n_y = _rounding.round_width_and_height_optimal(width_f, height_f, step)
+	assert (width, height) == (n_x * step, n_y * step)
+	assert _key(width_f, height_f, step, n_x, n_y) == _brute_force(width_f, height_f, step)
+
+
+def test_optimal_when_closest_ratio_is_out_of_area_bounds():
+	# The 3-pass result is 25×25 steps. For 26 steps wide, the closest height by ratio is out of the area bounds,
+	# but 26×26 has the same ratio error and a smaller area one:
+	assert _rounding.round_width_and_height_optimal(1623.9633, 1655.5783, 64) == (1664, 26, 1664, 26)
@@ -0,0 +1,46 @@
+# encoding: utf-8
+"""
+Precomputed resolution tables (``best_res_core.tables``): lookups, and the fallback of "Best-Res (area)" node.
+"""
+
+import pytest
+
+from _stubs import import_pack_module
+
+from best_resolution.best_res_core import tables as _tables
+
+nodes_simple = import_pack_module('nodes_simple')
+
+
+@pytest.fixture
+def table(tmp_path):
+	path = tmp_path / 'table.brtb'
+	_tables.build_table(path, square_sizes=(512, 1024), steps=(8, 64), aspects=((1.0, 1.0), (16.0, 9.0)))
+	resolution_table = _tables.ResolutionTable(path)
+	yield resolution_table
+	resolution_table.close()
+
+
+def test_hit(table):
+	assert len(table) == 2 * 2 * 2 * 2
+	for args in ((1024, 64, True, 16.0, 9.0), (512, 8, False, 9.0, 16.0), (512, 8, True, 1.0, 1.0)):
+		assert table.lookup(*args) == _tables.compute_entry(*args)
+
+
+def test_miss(table):
+	assert table.lookup(768, 64, True, 16.0, 9.0) is None
+	assert table.lookup(1024, 48, True, 16.0, 9.0) is None
+	assert table.lookup(1024, 64, True, 4.0, 3.0) is None
+
+
+@pytest.mark.parametrize('square_size, step', ((2 ** 33, 48), (1024, 2 ** 32), (-1024, 64), (1024, -8)))
+def test_key_out_of_range(table, square_size, step):
+	assert table.lookup(square_size, step, True, 16.0, 9.0) is None
+
+
+def test_node_falls_back_to_computing():
+	# The default table doesn't have it - and it can't even be packed into the key:
+	result = nodes_simple.BestResolutionFromArea().main(2 ** 33, 48, True, 16.0, 9.0)
+	width, _, height, _ = _tables.compute_entry(2 ** 33, 48, True, 16.0, 9.0)
+	assert tuple(result) == (width, height)
+	assert tuple(nodes_simple.BestResolutionFromArea().main(1024, 64, True, 16.0, 9.0)) == (1344, 768)
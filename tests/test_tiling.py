@@ -0,0 +1,103 @@
+# encoding: utf-8
+"""
+Tile plans (``best_res_core.tiling``) vs the tiles ComfyUI's ``tiled_scale()`` actually processes.
+"""
+
+import typing as _t
+
+from itertools import product as _product
+import random as _random
+
+import pytest
+import torch
+
+import comfy.utils
+
+from best_resolution.best_res_core import tiling as _tiling
+
+_sizes = (
+	(1248, 832), (832, 1248), (1344, 768), (1024, 1024), (1536, 640), (2048, 1152),
+	(512, 512), (513, 300), (100, 2000), (3840, 2160),
+)
+
+
+def _plans(width: int, height: int) -> _t.List[_tiling.TilePlan]:
+	plans = [_tiling.fixed_tile_plan(width, height), _tiling.fixed_tile_plan(width, height, 256, 16)]
+	plans.extend(_tiling.plan_tiles(width, height, tile * tile) for tile in (256, 384, 512))
+	return plans
+
+
+@pytest.mark.parametrize('width, height', _sizes)
+def test_tile_count(width, height):
+	for plan in _plans(width, height):
+		assert plan.n_tiles == comfy.utils.get_tiled_scale_steps(width, height, plan.tile_w, plan.tile_h, plan.overlap)
+
+
+def _processed_tiles(width: int, height: int, plan: _tiling.TilePlan) -> _t.List[_t.Tuple[int, int]]:
+	"""``(height, width)`` of each tile ``tiled_scale()`` feeds to the model."""
+	tiles = list()
+
+	def model(tile: torch.Tensor) -> torch.Tensor:
+		tiles.append(tuple(tile.shape[2:]))
+		return tile
+
+	image = torch.zeros(1, 3, height, width)
+	comfy.utils.tiled_scale(
+		image, model, tile_x=plan.tile_w, tile_y=plan.tile_h, overlap=plan.overlap, upscale_amount=1,
+	)
+	return tiles
+
+
+def test_pixels_as_processed():
+	rnd = _random.Random(0)
+	sizes = [(rnd.randint(40, 400), rnd.randint(40, 400)) for _ in range(20)]
+	for width, height in sizes:
+		for tile, overlap in ((64, 8), (96, 16), (128, 8)):
+			plans = (
+				_tiling.fixed_tile_plan(width, height, tile, overlap),
+				_tiling.plan_tiles(width, height, tile * tile, overlap),
+			)
+			for plan in plans:
+				tiles = _processed_tiles(width, height, plan)
+				assert len(tiles) == plan.n_tiles
+				assert sum(h * w for h, w in tiles) == plan.pixels
+				spans = list(_product(
+					_tiling.tile_spans(height, plan.tile_h, plan.overlap),
+					_tiling.tile_spans(width, plan.tile_w, plan.overlap),
+				))
+				assert [(h, w) for (_, h), (_, w) in spans] == tiles
+
+
+def test_plan_within_limits():
+	rnd = _random.Random(1)
+	for _ in range(300):
+		width, height = rnd.randint(64, 4096), rnd.randint(64, 4096)
+		max_tile = rnd.choice((256, 384, 512, 768))
+		plan = _tiling.plan_tiles(width, height, max_tile * max_tile)
+		assert plan.tile_w * plan.tile_h <= max_tile * max_tile
+		assert plan.n_tiles == 1 or plan.overlap == _tiling.default_overlap
+		assert plan.pixels <= _tiling.fixed_tile_plan(width, height, max_tile).pixels
+
+
+def test_plan_is_optimal():
+	"""Against brute force over all the tile sizes (with the same alignment)."""
+	rnd = _random.Random(2)
+	align, overlap = 8, 32
+	for _ in range(40):
+		width, height = rnd.randint(300, 1600), rnd.randint(300, 1600)
+		max_area = rnd.choice((256, 384, 512)) ** 2
+		plan = _tiling.plan_tiles(width, height, max_area, overlap, align)
+
+		def tiles(size: int) -> _t.List[int]:
+			return [size] + list(range(2 * overlap // align * align, size, align))
+
+		best = min(
+			_tiling.TilePlan(
+				tile_w, tile_h, overlap,
+				_tiling.n_tiles_along(width, tile_w, overlap), _tiling.n_tiles_along(height, tile_h, overlap),
+				width, height,
+			).pixels
+			for tile_w in tiles(width) for tile_h in tiles(height)
+			if tile_w * tile_h <= max_area
+		)
+		assert plan.pixels == best
@@ -0,0 +1,148 @@
+# encoding: utf-8
+"""
+UI-report mode (``BEST_RESOLUTION_UI_REPORT=1``): nodes aren't output nodes, so a repeated identical prompt
+reuses their cached outputs - together with the status text in the "ui" part.
+"""
+
+import typing as _t
+
+from collections import Counter as _Counter
+
+import pytest
+
+from _stubs import import_pack_module
+
+_report_sink = import_pack_module('_report_sink')
+nodes_simple = import_pack_module('nodes_simple')
+nodes_upscale = import_pack_module('nodes_upscale')
+node_scale = import_pack_module('node_scale')
+node_crop_pad = import_pack_module('node_crop_pad')
+
+_nodes = (
+	nodes_simple.BestResolutionSimple,
+	nodes_simple.BestResolutionFromArea,
+	nodes_upscale.BestResolutionFromAreaUpscale,
+	node_scale.BestResolutionScale,
+	node_crop_pad.BestResolutionUpscaledCropPad,
+)
+
+
+class _Preview:
+	"""A downstream output node, like "Preview Any": the executor's target."""
+	OUTPUT_NODE = True
+	FUNCTION = 'main'
+
+	@classmethod
+	def INPUT_TYPES(cls):
+		return {'required': {'value': ('*', )}}
+
+	def main(self, value):
+		return {'ui': {'text': [str(value)]}, 'result': ()}
+
+
+class _StubExecutor:
+	"""
+	The caching logic of ComfyUI's executor, reduced to what matters here. Starting from output nodes, each node
+	is executed with its inputs evaluated first. A non-output node whose inputs are the same as in the previous
+	prompt isn't executed again: its cached outputs and "ui" part are reused. Output nodes always run.
+	"""
+
+	def __init__(self):
+		self.cache: _t.Dict[str, _t.Tuple[tuple, tuple, _t.Any]] = dict()
+		self.executions = _Counter()
+		self.ui: _t.Dict[str, _t.Any] = dict()
+
+	def run(self, prompt: _t.Dict[str, _t.Dict[str, _t.Any]]):
+		self.ui = dict()
+		outputs: _t.Dict[str, tuple] = dict()
+
+		def evaluate(node_id: str) -> tuple:
+			if node_id in outputs:
+				return outputs[node_id]
+			node = prompt[node_id]
+			cls = node['class']
+			inputs = {
+				name: evaluate(value[0])[value[1]] if isinstance(value, list) else value
+				for name, value in node['inputs'].items()
+			}
+			signature = (cls, tuple(sorted(inputs.items())))
+			cached = self.cache.get(node_id)
+			if cached is not None and cached[0] == signature and not cls.OUTPUT_NODE:
+				result, ui = cached[1:]
+			else:
+				self.executions[node_id] += 1
+				if 'unique_id' in cls.INPUT_TYPES().get('hidden', {}):
+					inputs['unique_id'] = node_id
+				returned = getattr(cls(), cls.FUNCTION)(**inputs)
+				if isinstance(returned, dict):
+					result, ui = tuple(returned.get('result', ())), returned.get('ui')
+				else:
+					result, ui = tuple(returned), None
+				self.cache[node_id] = (signature, result, ui)
+			if ui:
+				self.ui[node_id] = ui
+			outputs[node_id] = result
+			return result
+
+		for node_id, node in prompt.items():
+			if node['class'].OUTPUT_NODE:
+				evaluate(node_id)
+
+
+def _default_inputs(cls) -> _t.Dict[str, _t.Any]:
+	inputs = dict()
+	for name, (io_type, *options) in cls.INPUT_TYPES()['required'].items():
+		inputs[name] = options[0]['default'] if options else next(iter(io_type))
+	return inputs
+
+
+def _prompt(cls) -> _t.Dict[str, _t.Dict[str, _t.Any]]:
+	return {
+		'1': {'class': cls, 'inputs': _default_inputs(cls)},
+		'2': {'class': _Preview, 'inputs': {'value': ['1', 0]}},
+	}
+
+
+@pytest.fixture
+def ui_report_mode(monkeypatch):
+	"""What ``BEST_RESOLUTION_UI_REPORT=1`` sets up at import."""
+	for cls in _nodes:
+		monkeypatch.setattr(cls, 'OUTPUT_NODE', False)
+	sink = _report_sink.get_sink()
+	_report_sink.set_sink(_report_sink.UIReportSink())
+	yield
+	_report_sink.set_sink(sink)
+
+
+@pytest.mark.parametrize('cls', _nodes, ids=lambda cls: cls.__name__)
+def test_output_node_reexecuted(cls):
+	assert cls.OUTPUT_NODE
+	executor = _StubExecutor()
+	for _ in range(3):
+		executor.run(_prompt(cls))
+	assert executor.executions['1'] == 3
+
+
+@pytest.mark.parametrize('cls', _nodes, ids=lambda cls: cls.__name__)
+def test_ui_report_cached(cls, ui_report_mode):
+	executor = _StubExecutor()
+	executor.run(_prompt(cls))
+	first_ui = executor.ui.get('1')
+	assert first_ui and first_ui['text'] and first_ui['text'][0]
+
+	for _ in range(2):
+		executor.run(_prompt(cls))
+	assert executor.executions['1'] == 1
+	assert executor.executions['2'] == 3
+	# The status text is still there - replayed from cache:
+	assert executor.ui.get('1') == first_ui
+
+
+def test_ui_report_reexecuted_on_change(ui_report_mode):
+	executor = _StubExecutor()
+	prompt = _prompt(nodes_simple.BestResolutionFromArea)
+	executor.run(prompt)
+	prompt['1']['inputs']['square_size'] = 512
+	executor.run(prompt)
+	assert executor.executions['1'] == 2
+	assert executor.ui['1']['text'][0].startswith('672/384')
@@ -0,0 +1,94 @@
+# encoding: utf-8
+"""
+"exact-uniform" priority (``best_res_core.uniform``): no crop/pad needed, within the tolerances - or a fallback.
+"""
+
+import typing as _t
+
+from itertools import product as _product
+from math import ceil as _ceil, floor as _floor, gcd as _gcd, log as _log, log1p as _log1p
+
+import pytest
+
+from best_resolution.best_res_core import lattice as _lattice
+from best_resolution.best_res_core import rounding as _rounding
+from best_resolution.best_res_core import uniform as _uniform
+from best_resolution.best_res_core.enums import RoundingPriority
+
+_cases = [
+	_rounding.float_width_height_from_area(size, landscape, a, b) + (step, upscale, hd_step)
+	for size, (a, b), landscape, step, upscale, hd_step in _product(
+		(512, 1024), ((1.0, 1.0), (16.0, 9.0), (21.0, 9.0)), (True, False), (8, 64), (1.5, 2.37), (8, 64),
+	)
+]
+
+
+def _cost(
+	width_f: float, height_f: float, upscale: float, width: int, height: int, hd_width: int, hd_height: int,
+) -> float:
+	d_aspect = _log(width / height) - _log(width_f / height_f)
+	d_init = _log(width * height) - _log(width_f * height_f)
+	d_hd = _log(hd_width * hd_height) - _log(width_f * height_f * upscale * upscale)
+	return d_aspect * d_aspect + d_init * d_init + d_hd * d_hd
+
+
+def _brute_force(
+	width_f: float, height_f: float, step: int, upscale: float, hd_step: int,
+	area_tolerance: float = _uniform.default_area_tolerance,
+	aspect_tolerance: float = _uniform.default_aspect_tolerance,
+) -> _t.Optional[float]:
+	"""The smallest cost among all the exactly-uniform pairs within the tolerances: each factor, each resolution."""
+	area_f, hd_area_f = width_f * height_f, width_f * height_f * upscale * upscale
+	max_log_aspect_delta = _log1p(aspect_tolerance)
+	low, high = 1.0 - area_tolerance, 1.0 + area_tolerance
+	best = None
+	for q in range(1, _uniform.default_max_denominator + 1):
+		for p in range(max(q, _floor(upscale * 0.5 * q)), _ceil(upscale * 2.0 * q) + 1):
+			if _gcd(p, q) != 1:
+				continue
+			unit = _uniform.uniform_unit(step, hd_step, p, q)
+			for width, height in _lattice.iter_lattice(unit, area_f * low, area_f * high, 16.0):
+				hd_width, hd_height = width * p // q, height * p // q
+				if (
+					abs(_log(width / height / (width_f / height_f))) > max_log_aspect_delta + 1e-12
+					or not hd_area_f * low <= hd_width * hd_height <= hd_area_f * high
+				):
+					continue
+				cost = _cost(width_f, height_f, upscale, width, height, hd_width, hd_height)
+				if best is None or cost < best:
+					best = cost
+	return best
+
+
+@pytest.mark.parametrize('width_f, height_f, step, upscale, hd_step', _cases)
+def test_exact_uniform_pair(width_f, height_f, step, upscale, hd_step):
+	pair = _uniform.exact_uniform_pair(width_f, height_f, step, upscale, hd_step)
+	expected_cost = _brute_force(width_f, height_f, step, upscale, hd_step)
+	if pair is None:
+		assert expected_cost is None
+		return
+
+	(width, n_x, height, n_y), (hd_width, hd_n_x, hd_height, hd_n_y) = pair
+	assert (width, height) == (n_x * step, n_y * step)
+	assert (hd_width, hd_height) == (hd_n_x * hd_step, hd_n_y * hd_step)
+	assert _rounding.need_post_resize(width, height, hd_width, hd_height)[0] is False
+	assert hd_width * height == hd_height * width
+
+	area_f = width_f * height_f
+	tolerance = _uniform.default_area_tolerance
+	assert abs(width * height / area_f - 1.0) <= tolerance + 1e-9
+	assert abs(hd_width * hd_height / (area_f * upscale * upscale) - 1.0) <= tolerance + 1e-9
+	assert abs(_log(width / height / (width_f / height_f))) <= _log1p(_uniform.default_aspect_tolerance) + 1e-12
+
+	assert _cost(width_f, height_f, upscale, width, height, hd_width, hd_height) == pytest.approx(expected_cost)
+
+
+def test_fallback_to_desired():
+	width_f, height_f = _rounding.float_width_height_from_area(1000, True, 16.0, 9.0)
+	args = (width_f, height_f, 64, 1.37, 64)
+	# Nothing is exactly uniform with such steps, within ±0.1% of the area and ±0.01% of the aspect ratio:
+	assert _uniform.exact_uniform_pair(*args, area_tolerance=0.001, aspect_tolerance=0.0001) is None
+	fallback = _rounding.upscale_rounded_pair(
+		*args[:3], RoundingPriority.EXACT_UNIFORM, *args[3:], area_tolerance=0.001, aspect_tolerance=0.0001,
+	)
+	assert fallback == _rounding.upscale_rounded_pair(*args[:3], RoundingPriority.DESIRED, *args[3:])
@@ -0,0 +1,152 @@
+# encoding: utf-8
+"""
+"Upscale Image By (with Model)" with a stand-in x4 model, on CPU.
+"""
+
+import typing as _t
+
+import pytest
+import torch
+
+from _stubs import import_pack_module
+
+_impl = import_pack_module('_upscale_impl')
+_tile_memory = import_pack_module('_tile_memory')
+node_upscale_by = import_pack_module('node_upscale_by')
+
+
+class _StandInModel:
+	"""Mimics the interface of an upscale model from ComfyUI (which is a ``spandrel`` model descriptor)."""
+	supports_half = True
+	supports_bfloat16 = True
+
+	def __init__(self, scale: int = 4, seed: int = 0):
+		torch.manual_seed(seed)
+		self.scale = scale
+		self.model = torch.nn.Sequential(
+			torch.nn.Conv2d(3, 16, 3, padding=1),
+			torch.nn.LeakyReLU(0.2),
+			torch.nn.Conv2d(16, 3 * scale * scale, 3, padding=1),
+			torch.nn.PixelShuffle(scale),
+		)
+
+	def to(self, device):
+		self.model.to(device)
+		return self
+
+	def __call__(self, x):
+		with torch.no_grad():
+			return self.model(x)
+
+
+@pytest.fixture
+def tile_memory(monkeypatch):
+	monkeypatch.setattr(_tile_memory, 'store', _tile_memory.TileMemoryStore())
+	return _tile_memory.store
+
+
+def test_pre_downscale_uses_learned_tiles(tile_memory, monkeypatch):
+	model = _StandInModel()
+	fmt = _impl.inference_format(model)
+	key = _tile_memory.model_key(model, torch.device('cpu'), fmt.memory_kind(), fmt.dtype)
+	# Learned: only 256px tiles fit into free memory (the fake device has 8 GB free).
+	tile_memory.record(key, 256, 256, 1 << 30)
+	tile_memory.record(key, 512, 512, 20 << 30)
+	assert _impl.max_tile_area(model, fmt) == 256 * 256
+
+	pre_plans = list()
+	tile_plans = list()
+	plan_pre_downscale = node_upscale_by._plan_pre_downscale
+	plan_tiles = _impl._plan_tiles
+	monkeypatch.setattr(
+		node_upscale_by, '_plan_pre_downscale',
+		lambda *args, **kwargs: pre_plans.append(plan_pre_downscale(*args, **kwargs)) or pre_plans[-1],
+	)
+	monkeypatch.setattr(
+		_impl, '_plan_tiles', lambda *args, **kwargs: tile_plans.append(plan_tiles(*args, **kwargs)) or tile_plans[-1],
+	)
+
+	image = torch.rand(1, 1200, 1600, 3)
+	node_upscale_by.ImageUpscaleByWithModel.main(model, image, 4.0, 'bilinear', 1.25, pre_downscale=True)
+
+	(pre_plan, ), (tile_plan, ) = pre_plans, tile_plans
+	assert pre_plan.do_pre_downscale
+	assert tile_plan.tile_w * tile_plan.tile_h <= 256 * 256
+	# The pre-downscale was planned with the same tiles the model then actually ran with:
+	assert pre_plan.model_pixels == tile_plan.pixels
+
+
+def _state(model: _StandInModel) -> _t.Dict[str, torch.Tensor]:
+	return {name: tensor.clone() for name, tensor in model.model.state_dict().items()}
+
+
+@pytest.mark.parametrize('precision', ['bf16', 'fp16'])
+@pytest.mark.parametrize('channels_last', [False, True])
+def test_weights_intact_after_reduced_precision(tile_memory, precision, channels_last):
+	model = _StandInModel()
+	original = _state(model)
+	image = torch.rand(1, 64, 96, 3)
+
+	def upscale(precision: str, channels_last: bool = False) -> torch.Tensor:
+		return node_upscale_by.ImageUpscaleByWithModel.main(
+			model, image, 4.0, 'bilinear', 2.0, precision=precision, channels_last=channels_last,
+		)[0]
+
+	reference = upscale('fp32')
+	upscale(precision, channels_last)
+	after = upscale('fp32')
+
+	for name, tensor in model.model.state_dict().items():
+		assert tensor.dtype == original[name].dtype
+		assert tensor.is_contiguous()
+		assert torch.equal(tensor, original[name]), name
+	assert torch.equal(after, reference)
+
+
+class _OverflowingModel(_StandInModel):
+	"""Runs fine in fp32, but "overflows" in a reduced precision: to inf, NaN - or to huge, yet finite, values."""
+
+	def __init__(self, overflow: float):
+		super().__init__()
+		self.overflow = overflow
+		self.dtypes: _t.List[torch.dtype] = list()
+
+	def __call__(self, x):
+		self.dtypes.append(x.dtype)
+		out = super().__call__(x)
+		if x.dtype != torch.float32:
+			out[..., :2, :2] = self.overflow
+		return out
+
+
+@pytest.mark.parametrize('precision', ['bf16', 'fp16'])
+@pytest.mark.parametrize('overflow', [float('inf'), float('nan'), 60000.0, -500.0])
+def test_reduced_precision_fallback(tile_memory, precision, overflow):
+	model = _OverflowingModel(overflow)
+	original = _state(model)
+	image = torch.rand(1, 64, 96, 3)
+	upscale = _impl._ImageUpscaleWithModel().upscale_with_plan
+
+	reference, _, fmt = upscale(model, image, _impl.inference_format(model, 'fp32'))
+	assert not fmt.fallback
+	model.dtypes.clear()
+
+	result, _, fmt = upscale(model, image, _impl.inference_format(model, precision))
+	assert fmt.fallback and fmt.dtype == torch.float32
+	assert 'fallback' in str(fmt)
+	# Tried in the reduced precision first, then re-done in fp32 - the same as the plain fp32 run:
+	assert model.dtypes[0] == _impl._dtypes[precision] and model.dtypes[-1] == torch.float32
+	assert torch.equal(result, reference)
+
+	for name, tensor in model.model.state_dict().items():
+		assert tensor.dtype == original[name].dtype
+		assert torch.equal(tensor, original[name]), name
+
+
+@pytest.mark.parametrize('precision', ['bf16', 'fp16'])
+def test_reduced_precision_no_fallback(tile_memory, precision):
+	model = _StandInModel()
+	_, _, fmt = _impl._ImageUpscaleWithModel().upscale_with_plan(
+		model, torch.rand(1, 64, 96, 3), _impl.inference_format(model, precision),
+	)
+	assert not fmt.fallback and fmt.dtype == _impl._dtypes[precision]
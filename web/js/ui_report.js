@@ -0,0 +1,49 @@
+import { app } from "../../scripts/app.js";
+import { ComfyWidgets } from "../../scripts/widgets.js";
+
+// In "UI-report" mode (BEST_RESOLUTION_UI_REPORT=1 environment variable), the nodes of the pack don't push
+// their status out-of-band. Instead, it comes as "text" in the standard "executed" message,
+// which ComfyUI also replays for cached nodes. Display it in a read-only text widget.
+
+const CATEGORY = "Best Resolution";
+const WIDGET_NAME = "status";
+
+function stripHtml(text) {
+	return text.replace(/<[^>]*>/g, "");
+}
+
+app.registerExtension({
+	name: "BestResolution.UIReport",
+
+	async beforeRegisterNodeDef(nodeType, nodeData) {
+		if (nodeData.category !== CATEGORY) {
+			return;
+		}
+
+		const onExecuted = nodeType.prototype.onExecuted;
+		nodeType.prototype.onExecuted = function (message) {
+			onExecuted?.apply(this, arguments);
+			const text = message?.text;
+			if (!Array.isArray(text)) {
+				return;
+			}
+
+			let widget = this.widgets?.find((w) => w.name === WIDGET_NAME);
+			if (!widget) {
+				widget = ComfyWidgets["STRING"](this, WIDGET_NAME, ["STRING", { multiline: true }], app).widget;
+				widget.inputEl.readOnly = true;
+				widget.inputEl.style.opacity = 0.6;
+				widget.serialize = false;
+			}
+			widget.value = stripHtml(text.join("\n"));
+
+			requestAnimationFrame(() => {
+				const size = this.computeSize();
+				size[0] = Math.max(size[0], this.size[0]);
+				size[1] = Math.max(size[1], this.size[1]);
+				this.onResize?.(size);
+				app.graph.setDirtyCanvas(true, false);
+			});
+		};
+	},
+});